@@ -4,38 +4,166 @@ Real-time attention monitoring using Mediapipe and OpenCV
 """
 
 import asyncio
+import json
+import os
+import threading
+import time
 import cv2
 import socketio
 from datetime import datetime
+from typing import Optional
 
 # Use absolute imports when run as script, relative when imported as module
 try:
     from .face_detector import FaceDetector
     from .attention_analyzer import AttentionAnalyzer
+    from .inference_server import RemoteFaceDetector, ServerBusy
+    from .wire_format import encode_update
 except ImportError:
     from face_detector import FaceDetector
     from attention_analyzer import AttentionAnalyzer
+    from inference_server import RemoteFaceDetector, ServerBusy
+    from wire_format import encode_update
+
+class LatestSlot:
+    def __init__(self):
+        """Single-item, latest-wins handoff between pipeline stages"""
+        self._item = None
+        self._version = 0
+        self._closed = False
+        self._cond = threading.Condition()
+        self.overwritten = 0  # items replaced before anyone consumed them
+    
+    def put(self, item):
+        """Publish an item, replacing any unconsumed one"""
+        with self._cond:
+            if self._item is not None:
+                self.overwritten += 1
+            self._item = item
+            self._version += 1
+            self._cond.notify_all()
+    
+    def get(self, timeout: Optional[float] = None):
+        """Take the freshest item, waiting up to timeout. Returns None on timeout or close."""
+        with self._cond:
+            if self._item is None and not self._closed:
+                self._cond.wait(timeout)
+            item, self._item = self._item, None
+            return item
+    
+    def close(self):
+        """Wake up any waiting consumer"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+    
+    @property
+    def closed(self) -> bool:
+        return self._closed
+
+class EmissionPolicy:
+    def __init__(self, score_delta: float = 5.0, heartbeat_interval: float = 1.0, max_batch: int = 120):
+        """
+        Decide which frame results are worth sending to the backend
+        
+        Args:
+            score_delta: Send when the score moves at least this much since the last send
+            heartbeat_interval: Send at least this often (seconds) even if nothing changed
+            max_batch: Cap on suppressed scores carried in one message
+        """
+        self.score_delta = score_delta
+        self.heartbeat_interval = heartbeat_interval
+        self.max_batch = max_batch
+        
+        self.last_status = None
+        self.last_score = None
+        self.last_sent_at = 0.0
+        self.pending = []  # [(monotonic time, score)] suppressed since the last send
+        
+        self.observed = 0
+        self.sent = 0
+    
+    def observe(self, score: float, status: str, now: Optional[float] = None) -> Optional[dict]:
+        """
+        Record one frame result
+        
+        Returns:
+            Fields to merge into an ai_update message, or None to suppress this frame
+        """
+        now = time.monotonic() if now is None else now
+        self.observed += 1
+        
+        should_send = (
+            status != self.last_status
+            or self.last_score is None
+            or abs(score - self.last_score) >= self.score_delta
+            or now - self.last_sent_at >= self.heartbeat_interval
+            or len(self.pending) >= self.max_batch
+        )
+        
+        if not should_send:
+            self.pending.append((now, score))
+            return None
+        
+        message = {'attention_score': score, 'status': status}
+        if self.pending:
+            # Suppressed frames all shared the previously sent status
+            message['samples'] = [
+                [int((now - t) * 1000), round(s, 1)] for t, s in self.pending
+            ]
+            message['samples_status'] = self.last_status
+            self.pending = []
+        
+        self.last_status = status
+        self.last_score = score
+        self.last_sent_at = now
+        self.sent += 1
+        return message
+    
+    @property
+    def reduction(self) -> float:
+        """Frames observed per message sent"""
+        return self.observed / self.sent if self.sent else 0.0
 
 class StreamProcessor:
-    def __init__(self, student_id: str, session_id: str, backend_url: str = "http://localhost:8000"):
-        """Initialize stream processor"""
+    def __init__(self, student_id: str, session_id: str, backend_url: str = "http://localhost:8000",
+                 score_delta: float = 5.0, heartbeat_interval: float = 1.0, analysis_fps: float = 10.0,
+                 detector=None, binary: bool = False):
+        """
+        Initialize stream processor
+        
+        Args:
+            detector: Pass a RemoteFaceDetector to use a shared inference server
+            binary: Register once and send compact binary updates (see wire_format)
+        """
         self.student_id = student_id
         self.session_id = session_id
         self.backend_url = backend_url
         
         # Initialize components
-        self.detector = FaceDetector()
+        self.detector = detector or FaceDetector()
         self.analyzer = AttentionAnalyzer()
+        self.emission = EmissionPolicy(score_delta, heartbeat_interval)
+        
+        # Absence tracking (seconds, independent of the analysis rate)
+        self.absent_since = None
+        self.fps = 30  # camera capture rate
+        self.analysis_fps = analysis_fps  # inference rate; frames in between are skipped
+        self.absent_threshold = 2.0
+        self.left_class_threshold = 10.0
         
-        # Absence tracking
-        self.absent_timer = 0
-        self.fps = 30
-        self.absent_threshold = 60  # 2 seconds at 30fps
-        self.left_class_threshold = 300  # 10 seconds at 30fps
+        # Pipeline counters
+        self.frames_captured = 0
+        self.frames_analyzed = 0
         
         # WebSocket client
         self.sio = socketio.AsyncClient()
         self.connected = False
+        self.binary = binary
+        self.registered_at = None  # monotonic time of the last ai_register
+        self.bytes_sent = 0
+        # The server forgets the binding with the connection, including automatic reconnects
+        self.sio.on('connect', self._reset_registration)
     
     async def connect_websocket(self):
         """Connect to backend WebSocket"""
@@ -56,49 +184,145 @@ class StreamProcessor:
                 except:
                     continue
     
-    async def send_update(self, data: dict):
+    async def _reset_registration(self):
+        self.registered_at = None
+    
+    async def register(self):
+        """Bind this connection to the student so updates can omit the ids"""
+        try:
+            response = await self.sio.call('ai_register', {
+                'student_id': self.student_id,
+                'session_id': self.session_id
+            }, timeout=5)
+        except Exception as e:
+            response = {'error': str(e)}
+        if response and response.get('status') == 'registered':
+            self.registered_at = time.monotonic()
+        else:
+            # e.g. an older backend without ai_register
+            print(f"Binary registration failed, falling back to JSON: {response}")
+            self.binary = False
+    
+    async def send_update(self, data):
         """Send attention update to backend"""
         if not self.connected:
             await self.connect_websocket()
         
         try:
             await self.sio.emit('ai_update', data)
+            self.bytes_sent += len(data) if isinstance(data, bytes) else len(json.dumps(data))
         except Exception as e:
             print(f"Error sending update: {e}")
             self.connected = False
     
-    async def process_frame(self, frame):
-        """Process a single video frame"""
+    def analyze_frame(self, frame, captured_at: Optional[float] = None):
+        """Run face detection and attention analysis on one frame (blocking)"""
+        captured_at = time.monotonic() if captured_at is None else captured_at
+        
         # Detect face
         landmarks = self.detector.detect_face(frame)
         
-        if landmarks:
+        if landmarks is not None:
             # Face detected - analyze engagement
-            score, status = self.analyzer.analyze_engagement(landmarks)
-            self.absent_timer = 0
+            score, status = self.analyzer.analyze_engagement(landmarks, captured_at)
+            self.absent_since = None
         else:
             # No face detected
-            self.absent_timer += 1
+            if self.absent_since is None:
+                self.absent_since = captured_at
+            absent_for = captured_at - self.absent_since
             score = 0
             
-            if self.absent_timer > self.left_class_threshold:
+            if absent_for > self.left_class_threshold:
                 status = 'Left Class'
-            elif self.absent_timer > self.absent_threshold:
+            elif absent_for > self.absent_threshold:
                 status = 'Absent'
             else:
                 status = 'Present'  # Brief absence
         
-        # Send update to backend
-        await self.send_update({
-            'student_id': self.student_id,
-            'session_id': self.session_id,
-            'attention_score': score,
-            'status': status,
-            'timestamp': datetime.utcnow().isoformat()
-        })
-        
+        self.frames_analyzed += 1
+        return score, status
+    
+    async def emit_result(self, score: float, status: str):
+        """Send a result to the backend only on change or heartbeat"""
+        message = self.emission.observe(score, status)
+        if message and self.binary and self.connected and self.registered_at is None:
+            await self.register()
+        if message and self.registered_at is not None:
+            await self.send_update(encode_update(
+                message['attention_score'],
+                message['status'],
+                (time.monotonic() - self.registered_at) * 1000,
+                message.get('samples'),
+                message.get('samples_status')
+            ))
+        elif message:
+            message.update({
+                'student_id': self.student_id,
+                'session_id': self.session_id,
+                'timestamp': datetime.utcnow().isoformat()
+            })
+            await self.send_update(message)
+    
+    def stats(self) -> dict:
+        """Pipeline, emission and detector counters"""
+        stats = {
+            'frames_captured': self.frames_captured,
+            'frames_analyzed': self.frames_analyzed,
+            'frames_per_message': round(self.emission.reduction, 1),
+            'bytes_sent': self.bytes_sent
+        }
+        if hasattr(self.detector, 'stats'):
+            stats['detector'] = self.detector.stats()
+        return stats
+    
+    async def process_frame(self, frame):
+        """Process a single video frame"""
+        score, status = self.analyze_frame(frame)
+        await self.emit_result(score, status)
         return score, status
     
+    def _capture_loop(self, cap, frames: LatestSlot, stop: threading.Event):
+        """Stage 1: read camera frames as fast as they arrive"""
+        try:
+            while not stop.is_set():
+                ret, frame = cap.read()
+                if not ret:
+                    print("Failed to read frame")
+                    break
+                self.frames_captured += 1
+                frames.put((time.monotonic(), frame))
+        finally:
+            stop.set()
+            frames.close()
+    
+    def _inference_loop(self, frames: LatestSlot, results: LatestSlot, stop: threading.Event):
+        """Stage 2: analyze the freshest frame at analysis_fps, skipping the rest"""
+        interval = 1.0 / self.analysis_fps
+        next_tick = time.monotonic()
+        try:
+            while not stop.is_set():
+                delay = next_tick - time.monotonic()
+                if delay > 0:
+                    stop.wait(delay)
+                next_tick = max(next_tick + interval, time.monotonic())
+                
+                item = frames.get(timeout=1.0)
+                if item is None:
+                    if frames.closed:
+                        break
+                    continue
+                captured_at, frame = item
+                try:
+                    results.put(self.analyze_frame(frame, captured_at))
+                except ServerBusy:
+                    # Shared inference server is saturated; wait for a fresher frame
+                    continue
+        finally:
+            # A failing stage must not leave the emit loop waiting forever
+            stop.set()
+            results.close()
+    
     async def start_processing(self, video_source=0):
         """Start processing video stream"""
         print(f"Starting AI Engine for student {self.student_id} in session {self.session_id}")
@@ -110,28 +334,36 @@ class StreamProcessor:
         cap = cv2.VideoCapture(video_source)
         cap.set(cv2.CAP_PROP_FPS, self.fps)
         
+        # Capture and inference run in threads; emitting stays on the event loop
+        frames, results = LatestSlot(), LatestSlot()
+        stop = threading.Event()
+        capture = threading.Thread(target=self._capture_loop, args=(cap, frames, stop), daemon=True)
+        inference = threading.Thread(target=self._inference_loop, args=(frames, results, stop), daemon=True)
+        capture.start()
+        inference.start()
+        
         try:
-            frame_count = 0
             while True:
-                ret, frame = cap.read()
-                if not ret:
-                    print("Failed to read frame")
-                    break
-                
-                # Process every frame
-                score, status = await self.process_frame(frame)
+                # Stage 3: emit the newest result
+                result = await asyncio.to_thread(results.get, 1.0)
+                if result is None:
+                    if results.closed:
+                        break
+                    continue
                 
-                frame_count += 1
-                if frame_count % 30 == 0:  # Log every second
-                    print(f"Frame {frame_count}: Score={score:.1f}, Status={status}")
+                score, status = result
+                await self.emit_result(score, status)
                 
-                # Control frame rate
-                await asyncio.sleep(1.0 / self.fps)
+                if self.frames_analyzed % int(max(1, self.analysis_fps)) == 0:  # Log every second
+                    print(f"Score={score:.1f}, Status={status}, Stats={self.stats()}")
         
         except KeyboardInterrupt:
             print("Stopping AI Engine...")
         
         finally:
+            stop.set()
+            capture.join(timeout=2.0)
+            inference.join(timeout=2.0)
             cap.release()
             self.detector.close()
             if self.connected:
@@ -148,7 +380,17 @@ async def main():
     student_id = "test-student-123"
     session_id = "test-session-456"
     
-    processor = StreamProcessor(student_id, session_id)
+    # Optional shared inference server, e.g. INFERENCE_SERVER=127.0.0.1:8002
+    detector = None
+    inference_server = os.getenv("INFERENCE_SERVER")
+    if inference_server:
+        host, port = inference_server.rsplit(":", 1)
+        detector = RemoteFaceDetector(student_id, host, int(port))
+    
+    # BINARY_UPDATES=1 sends compact binary ai_update frames
+    binary = os.getenv("BINARY_UPDATES") == "1"
+    
+    processor = StreamProcessor(student_id, session_id, detector=detector, binary=binary)
     await processor.start_processing()
 
 if __name__ == "__main__":
@@ -2,30 +2,117 @@
 Attention Analysis Module
 Analyzes facial features to determine engagement status and attention score
 """
+import time
 import numpy as np
-from typing import Tuple
+from array import array
+from typing import Optional, Tuple
+
+try:
+    from .landmarks import EYE_INDICES, NOSE_INDICES
+except ImportError:
+    from landmarks import EYE_INDICES, NOSE_INDICES
+
+# EAR below this counts as eyes closed
+EAR_THRESHOLD = 0.2
+
+# Reported until the blink window has seen enough time to be meaningful
+NORMAL_BLINK_RATE = 17.5
+
+class BlinkWindow:
+    def __init__(self, window_seconds: float = 60.0, slot_seconds: float = 0.5):
+        """
+        Sliding time window of blink events
+        
+        A fixed ring of per-slot counts plus a running sum, so recording a blink
+        and reading the rate are constant-time whatever the window length.
+        """
+        self.window_seconds = window_seconds
+        self.slot_seconds = slot_seconds
+        self.slot_count = max(1, int(round(window_seconds / slot_seconds)))
+        self.counts = array('I', [0]) * self.slot_count
+        self.total = 0
+        self.head = None  # absolute slot number of the newest slot
+        self.started_at = None
+    
+    def advance(self, now: float):
+        """Expire slots that fell out of the window"""
+        slot = int(now // self.slot_seconds)
+        if self.head is None:
+            self.head = slot
+            self.started_at = now
+            return
+        
+        steps = slot - self.head
+        if steps <= 0:
+            return
+        if steps >= self.slot_count:
+            self.counts = array('I', [0]) * self.slot_count
+            self.total = 0
+        else:
+            for offset in range(1, steps + 1):
+                index = (self.head + offset) % self.slot_count
+                self.total -= self.counts[index]
+                self.counts[index] = 0
+        self.head = slot
+    
+    def add(self, now: float):
+        """Record one blink event"""
+        self.advance(now)
+        self.counts[self.head % self.slot_count] += 1
+        self.total += 1
+    
+    def elapsed(self, now: float) -> float:
+        """Seconds of history currently covered by the window"""
+        if self.started_at is None:
+            return 0.0
+        return min(self.window_seconds, now - self.started_at)
+    
+    def per_minute(self, now: float) -> float:
+        """Blinks per minute over the covered part of the window"""
+        self.advance(now)
+        elapsed = self.elapsed(now)
+        return self.total * 60.0 / elapsed if elapsed > 0 else 0.0
 
 class AttentionAnalyzer:
-    def __init__(self):
-        """Initialize attention analyzer"""
-        self.blink_counter = 0
-        self.blink_history = []
-        self.max_history = 30  # Track last 30 frames (1 second at 30fps)
+    def __init__(self, blink_window_seconds: float = 60.0, blink_warmup_seconds: float = 10.0):
+        """
+        Initialize attention analyzer
+        
+        Args:
+            blink_window_seconds: Length of the blink-rate window
+            blink_warmup_seconds: History needed before the measured blink rate is used
+        """
+        self.blink_counter = 0  # total blink events seen
+        self.blink_window = BlinkWindow(blink_window_seconds)
+        self.blink_warmup_seconds = blink_warmup_seconds
+        self._eyes_closed = False
+        
+        # Scratch buffers (and views into them) reused every frame so metric math allocates nothing
+        self._eye_indices = EYE_INDICES.ravel()
+        self._eye_points = np.empty((EYE_INDICES.size, 3), dtype=np.float32)
+        eyes = self._eye_points.reshape(2, 6, 3)
+        self._eye_upper = eyes[:, :3, :2]  # p2, p3, p1 per eye
+        self._eye_lower = eyes[:, 3:, :2]  # p6, p5, p4 per eye
+        self._eye_deltas = np.empty((2, 3, 2), dtype=np.float32)
+        self._eye_dx = self._eye_deltas[..., 0]
+        self._eye_dy = self._eye_deltas[..., 1]
+        self._eye_distances = np.empty((2, 3), dtype=np.float32)
     
-    def analyze_engagement(self, landmarks: dict) -> Tuple[float, str]:
+    def analyze_engagement(self, landmarks: np.ndarray, timestamp: Optional[float] = None) -> Tuple[float, str]:
         """
         Analyze engagement from facial landmarks
         
         Args:
-            landmarks: Dictionary containing facial landmarks
-            
+            landmarks: (N, 3) array of normalized FaceMesh landmarks
+            timestamp: Capture time in seconds (monotonic); defaults to now
+        
         Returns:
             Tuple of (attention_score, status)
         """
         # Calculate individual metrics
         ear = self._calculate_eye_aspect_ratio(landmarks)
         head_pose = self._estimate_head_pose(landmarks)
-        blink_rate = self._analyze_blink_rate(ear)
+        blink_rate = self._analyze_blink_rate(ear, time.monotonic() if timestamp is None else timestamp)
         
         # Determine status based on metrics
         status = self._classify_status(ear, head_pose, blink_rate)
@@ -40,41 +127,32 @@ class AttentionAnalyzer:
         
         return attention_score, status
     
-    def _calculate_eye_aspect_ratio(self, landmarks: dict) -> float:
+    def _calculate_eye_aspect_ratio(self, landmarks: np.ndarray) -> float:
         """
         Calculate Eye Aspect Ratio (EAR) for drowsiness detection
         EAR = (||p2-p6|| + ||p3-p5||) / (2 * ||p1-p4||)
         """
-        left_eye = landmarks['left_eye']
-        right_eye = landmarks['right_eye']
+        # Both eyes at once: (2 eyes, 6 points, xyz), ordered [p2, p3, p1, p6, p5, p4]
+        np.take(landmarks, self._eye_indices, axis=0, out=self._eye_points)
         
-        def eye_aspect_ratio(eye_points):
-            # Vertical distances
-            v1 = np.linalg.norm(np.array([eye_points[1].x, eye_points[1].y]) - 
-                               np.array([eye_points[5].x, eye_points[5].y]))
-            v2 = np.linalg.norm(np.array([eye_points[2].x, eye_points[2].y]) - 
-                               np.array([eye_points[4].x, eye_points[4].y]))
-            # Horizontal distance
-            h = np.linalg.norm(np.array([eye_points[0].x, eye_points[0].y]) - 
-                              np.array([eye_points[3].x, eye_points[3].y]))
-            
-            return (v1 + v2) / (2.0 * h) if h > 0 else 0
+        # (v1, v2, h) per eye on x/y only
+        np.subtract(self._eye_upper, self._eye_lower, out=self._eye_deltas)
+        np.hypot(self._eye_dx, self._eye_dy, out=self._eye_distances)
         
-        left_ear = eye_aspect_ratio(left_eye)
-        right_ear = eye_aspect_ratio(right_eye)
+        (lv1, lv2, lh), (rv1, rv2, rh) = self._eye_distances.tolist()
+        left_ear = (lv1 + lv2) / (2.0 * lh) if lh > 0 else 0
+        right_ear = (rv1 + rv2) / (2.0 * rh) if rh > 0 else 0
         
         return (left_ear + right_ear) / 2.0
     
-    def _estimate_head_pose(self, landmarks: dict) -> float:
+    def _estimate_head_pose(self, landmarks: np.ndarray) -> float:
         """
         Estimate head pose angle (looking away detection)
         Returns angle in degrees (0 = facing forward, >30 = looking away)
         """
-        nose = landmarks['nose']
-        
         # Simple estimation based on nose position relative to face center
         # In a real implementation, this would use more sophisticated 3D pose estimation
-        nose_x = nose[0].x
+        nose_x = float(landmarks[NOSE_INDICES[0], 0])
         
         # Nose should be around 0.5 when facing forward
         # Deviation indicates head turn
@@ -83,28 +161,27 @@ class AttentionAnalyzer:
         
         return angle
     
-    def _analyze_blink_rate(self, ear: float) -> float:
+    def _analyze_blink_rate(self, ear: float, now: float) -> float:
         """
         Analyze blink rate for engagement
         Normal blink rate: 15-20 blinks per minute
         """
-        # EAR threshold for blink detection
-        EAR_THRESHOLD = 0.2
-        
-        # Detect blink
+        # A blink is a closed-to-open transition, not a closed frame
         if ear < EAR_THRESHOLD:
-            self.blink_counter += 1
-        
-        # Track blink history
-        self.blink_history.append(1 if ear < EAR_THRESHOLD else 0)
-        if len(self.blink_history) > self.max_history:
-            self.blink_history.pop(0)
+            self._eyes_closed = True
+            self.blink_window.advance(now)
+        else:
+            if self._eyes_closed:
+                self.blink_counter += 1
+                self.blink_window.add(now)
+            else:
+                self.blink_window.advance(now)
+            self._eyes_closed = False
         
-        # Calculate blinks per minute
-        blinks_in_window = sum(self.blink_history)
-        blinks_per_minute = (blinks_in_window / len(self.blink_history)) * 30 * 60
+        if self.blink_window.elapsed(now) < self.blink_warmup_seconds:
+            return NORMAL_BLINK_RATE
         
-        return blinks_per_minute
+        return self.blink_window.per_minute(now)
     
     def _classify_status(self, ear: float, head_pose: float, blink_rate: float) -> str:
         """
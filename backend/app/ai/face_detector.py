@@ -6,29 +6,100 @@ import cv2
 import numpy as np
 from typing import Optional
 
+try:
+    from .landmarks import NUM_LANDMARKS, ANALYSIS_INDICES, TRACKING_INDICES, FACE_BOX_INDICES, fill_landmark_array
+except ImportError:
+    from landmarks import NUM_LANDMARKS, ANALYSIS_INDICES, TRACKING_INDICES, FACE_BOX_INDICES, fill_landmark_array
+
 class FaceDetector:
-    def __init__(self):
-        """Initialize Mediapipe FaceMesh"""
+    def __init__(self, static_image_mode: bool = False, extract_all: bool = False,
+                 track_roi: bool = True, roi_padding: float = 0.3, roi_max_side: int = 320,
+                 redetect_interval: int = 30):
+        """
+        Initialize Mediapipe FaceMesh
+        
+        Args:
+            static_image_mode: Treat every frame independently (no tracking between calls).
+                Needed when one detector serves frames from many students.
+            extract_all: Copy all landmarks per frame instead of only ANALYSIS_INDICES
+            track_roi: Run FaceMesh on a padded crop around the last face instead of the full frame
+            roi_padding: Padding added on each side of the face box, as a fraction of its size
+            roi_max_side: Crops larger than this (pixels) are downscaled before inference
+            redetect_interval: Force a full-frame pass every this many frames
+        """
         self.face_mesh = mp.solutions.face_mesh.FaceMesh(
+            static_image_mode=static_image_mode,
             max_num_faces=1,
             refine_landmarks=True,
             min_detection_confidence=0.5,
             min_tracking_confidence=0.5
         )
         self.mp_face_mesh = mp.solutions.face_mesh
+        
+        # Region-of-interest tracking (cross-frame state, so off in static mode)
+        self.track_roi = track_roi and not static_image_mode
+        self.roi_padding = roi_padding
+        self.roi_max_side = roi_max_side
+        self.redetect_interval = redetect_interval
+        self._roi = None  # (x0, y0, x1, y1) in pixels
+        self._frames_since_full = 0
+        
+        # Reused for every frame; callers that keep landmarks must copy them.
+        # The face box rows are only copied when tracking needs them.
+        self._points = np.zeros((NUM_LANDMARKS, 3), dtype=np.float32)
+        self._indices = None if extract_all else (TRACKING_INDICES if self.track_roi else ANALYSIS_INDICES)
+        
+        # Metrics
+        self.frames = 0
+        self.roi_frames = 0
+        self.full_frames = 0
+        self.tracking_lost = 0
     
-    def detect_face(self, frame: np.ndarray) -> Optional[dict]:
+    def detect_face(self, frame: np.ndarray) -> Optional[np.ndarray]:
         """
         Detect facial landmarks in a frame
         
         Args:
             frame: BGR image from OpenCV
-            
+        
         Returns:
-            Dictionary with landmarks or None if no face detected
+            (N, 3) float32 array of normalized x, y, z indexed by FaceMesh landmark index,
+            or None if no face detected. Only ANALYSIS_INDICES rows (plus FACE_BOX_INDICES when
+            tracking) are filled unless extract_all.
         """
+        self.frames += 1
+        
+        if self.track_roi and self._roi is not None and self._frames_since_full < self.redetect_interval:
+            points = self._detect_in_roi(frame)
+            if points is not None:
+                self._frames_since_full += 1
+                return points
+            # Tracking lost - fall back to the full frame right away
+            self.tracking_lost += 1
+            self._roi = None
+        
+        self.full_frames += 1
+        self._frames_since_full = 0
+        points = self._process(frame)
+        if points is not None and self.track_roi:
+            self._update_roi(points, frame.shape[1], frame.shape[0])
+        return points
+    
+    def stats(self) -> dict:
+        """How often the crop path and full-frame re-detection ran"""
+        return {
+            'frames': self.frames,
+            'roi_frames': self.roi_frames,
+            'full_frames': self.full_frames,
+            'tracking_lost': self.tracking_lost,
+            'crop_rate': round(self.roi_frames / self.frames, 3) if self.frames else 0.0,
+            'redetect_rate': round(self.full_frames / self.frames, 3) if self.frames else 0.0
+        }
+    
+    def _process(self, image: np.ndarray) -> Optional[np.ndarray]:
+        """Run FaceMesh on a BGR image and fill the landmark array"""
         # Convert BGR to RGB
-        rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+        rgb_frame = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
         
         # Process the frame
         results = self.face_mesh.process(rgb_frame)
@@ -37,41 +108,51 @@ class FaceDetector:
             return None
         
         # Get first face landmarks
-        face_landmarks = results.multi_face_landmarks[0]
-        
-        # Extract key landmarks
-        landmarks_dict = {
-            'all_landmarks': face_landmarks.landmark,
-            'left_eye': self._get_eye_landmarks(face_landmarks, 'left'),
-            'right_eye': self._get_eye_landmarks(face_landmarks, 'right'),
-            'nose': self._get_nose_landmarks(face_landmarks),
-            'mouth': self._get_mouth_landmarks(face_landmarks)
-        }
-        
-        return landmarks_dict
-    
-    def _get_eye_landmarks(self, face_landmarks, side: str) -> list:
-        """Extract eye landmarks"""
-        if side == 'left':
-            # Left eye indices in Mediapipe FaceMesh
-            indices = [33, 160, 158, 133, 153, 144]
-        else:
-            # Right eye indices
-            indices = [362, 385, 387, 263, 373, 380]
-        
-        return [face_landmarks.landmark[i] for i in indices]
+        return fill_landmark_array(results.multi_face_landmarks[0].landmark, self._points, self._indices)
     
-    def _get_nose_landmarks(self, face_landmarks) -> list:
-        """Extract nose landmarks"""
-        # Nose tip and bridge
-        indices = [1, 4, 5, 6]
-        return [face_landmarks.landmark[i] for i in indices]
+    def _detect_in_roi(self, frame: np.ndarray) -> Optional[np.ndarray]:
+        """Crop and downscale the tracked region, detect, and map landmarks back to the frame"""
+        height, width = frame.shape[:2]
+        x0, y0, x1, y1 = self._roi
+        crop = frame[y0:y1, x0:x1]
+        crop_w, crop_h = x1 - x0, y1 - y0
+        
+        scale = self.roi_max_side / max(crop_w, crop_h)
+        if scale < 1.0:
+            crop = cv2.resize(crop, (max(1, int(crop_w * scale)), max(1, int(crop_h * scale))),
+                              interpolation=cv2.INTER_AREA)
+        
+        self.roi_frames += 1
+        points = self._process(crop)
+        if points is None:
+            return None
+        
+        # Crop-normalized -> frame-normalized (z follows the x scale in FaceMesh)
+        sx, sy = crop_w / width, crop_h / height
+        points[:, 0] *= sx
+        points[:, 0] += x0 / width
+        points[:, 1] *= sy
+        points[:, 1] += y0 / height
+        points[:, 2] *= sx
+        
+        self._update_roi(points, width, height)
+        return points
     
-    def _get_mouth_landmarks(self, face_landmarks) -> list:
-        """Extract mouth landmarks"""
-        # Mouth corners and center
-        indices = [61, 291, 0, 17]
-        return [face_landmarks.landmark[i] for i in indices]
+    def _update_roi(self, points: np.ndarray, width: int, height: int):
+        """Padded face bounding box for the next frame"""
+        box = points[FACE_BOX_INDICES, :2]
+        min_x, min_y = box.min(axis=0)
+        max_x, max_y = box.max(axis=0)
+        pad_x = (max_x - min_x) * self.roi_padding
+        pad_y = (max_y - min_y) * self.roi_padding
+        
+        x0 = max(0, int((min_x - pad_x) * width))
+        y0 = max(0, int((min_y - pad_y) * height))
+        x1 = min(width, int((max_x + pad_x) * width) + 1)
+        y1 = min(height, int((max_y + pad_y) * height) + 1)
+        
+        # Degenerate or tiny boxes are not worth tracking
+        self._roi = (x0, y0, x1, y1) if x1 - x0 >= 32 and y1 - y0 >= 32 else None
     
     def close(self):
         """Clean up resources"""
@@ -0,0 +1,361 @@
+"""
+FocusMate Inference Server
+Serves FaceMesh landmark detection for a whole classroom from one machine.
+Frames from many students are scheduled across a pool of worker processes,
+each owning a single FaceMesh instance.
+"""
+
+import asyncio
+import argparse
+import itertools
+import json
+import multiprocessing as mp
+import os
+import queue
+import socket
+import struct
+import threading
+import time
+import numpy as np
+from typing import Optional
+
+HEADER = struct.Struct('<II')  # header length, body length
+
+class ServerBusy(Exception):
+    """Raised when every worker is saturated and the frame was not accepted"""
+
+def _decode_frame(header: dict, body: bytes) -> np.ndarray:
+    """Turn a request body back into a BGR frame"""
+    if header.get('encoding') == 'jpeg':
+        import cv2
+        return cv2.imdecode(np.frombuffer(body, dtype=np.uint8), cv2.IMREAD_COLOR)
+    return np.frombuffer(body, dtype=np.uint8).reshape(header['shape'])
+
+def _worker_main(worker_id: int, tasks, results):
+    """Worker process: one FaceMesh, frames in, landmark arrays out"""
+    try:
+        from .face_detector import FaceDetector
+    except ImportError:
+        from face_detector import FaceDetector
+    
+    # Frames from different students are interleaved, so no cross-frame tracking
+    detector = FaceDetector(static_image_mode=True)
+    try:
+        while True:
+            task = tasks.get()
+            if task is None:
+                break
+            request_id, student_id, header, body = task
+            started = time.perf_counter()
+            try:
+                points = detector.detect_face(_decode_frame(header, body))
+                error = None
+            except Exception as e:
+                points, error = None, str(e)
+            busy = time.perf_counter() - started
+            results.put((request_id, student_id, worker_id, points, busy, error))
+    finally:
+        detector.close()
+
+class InferenceServer:
+    def __init__(self, workers: Optional[int] = None, max_pending_per_worker: int = 2,
+                 request_timeout: float = 2.0):
+        """
+        Initialize the worker pool
+        
+        Args:
+            workers: Number of worker processes (defaults to CPU count)
+            max_pending_per_worker: Frames allowed in flight per worker before rejecting
+            request_timeout: Seconds a frame may wait for its result before its slot is freed
+                (a worker that died never answers)
+        """
+        self.worker_count = workers or os.cpu_count() or 1
+        self.capacity = self.worker_count * max_pending_per_worker
+        self.request_timeout = request_timeout
+        
+        ctx = mp.get_context('spawn')
+        self._ctx = ctx
+        self._tasks = ctx.Queue(maxsize=self.capacity)
+        self._results = ctx.Queue()
+        self._processes = []
+        self._collector = None
+        self._stopping = False
+        self._request_ids = itertools.count()
+        self._pending = {}  # {request_id: (loop, future)}
+        self._in_flight_students = {}  # {student_id: request_id}
+        self._lock = threading.Lock()
+        
+        # Metrics
+        self.started_at = None
+        self.submitted = 0
+        self.completed = 0
+        self.rejected = 0
+        self.errors = 0
+        self.timeouts = 0
+        self.restarts = 0
+        self.worker_frames = [0] * self.worker_count
+        self.worker_busy = [0.0] * self.worker_count
+    
+    def start(self):
+        """Spawn worker processes and the result collector"""
+        self.started_at = time.monotonic()
+        self._processes = [self._spawn(worker_id) for worker_id in range(self.worker_count)]
+        
+        self._collector = threading.Thread(target=self._collect_results, daemon=True)
+        self._collector.start()
+        print(f"Inference server started with {self.worker_count} workers")
+    
+    def _spawn(self, worker_id: int):
+        process = self._ctx.Process(
+            target=_worker_main,
+            args=(worker_id, self._tasks, self._results),
+            daemon=True
+        )
+        process.start()
+        return process
+    
+    def _restart_dead_workers(self):
+        """Replace worker processes that exited (e.g. a MediaPipe crash); their frames time out"""
+        for worker_id, process in enumerate(self._processes):
+            if self._stopping or process.is_alive():
+                continue
+            print(f"Inference worker {worker_id} exited with code {process.exitcode}, restarting")
+            process.join(timeout=0)
+            self._processes[worker_id] = self._spawn(worker_id)
+            self.restarts += 1
+    
+    def stop(self):
+        """Stop workers and the result collector"""
+        self._stopping = True
+        for _ in self._processes:
+            self._tasks.put(None)
+        for process in self._processes:
+            process.join(timeout=5)
+        self._processes = []
+        self._results.put(None)
+        if self._collector:
+            self._collector.join(timeout=5)
+    
+    async def submit(self, student_id: str, header: dict, body: bytes) -> Optional[np.ndarray]:
+        """
+        Schedule one frame for detection
+        
+        Returns:
+            (N, 3) float32 landmark array or None if no face was found
+        
+        Raises:
+            ServerBusy: The pool is saturated or this student already has a frame in flight
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        
+        with self._lock:
+            # Latest-frame-wins: a student never queues behind their own older frame
+            if student_id in self._in_flight_students or len(self._pending) >= self.capacity:
+                self.rejected += 1
+                raise ServerBusy()
+            request_id = next(self._request_ids)
+            self._pending[request_id] = (loop, future)
+            self._in_flight_students[student_id] = request_id
+            self.submitted += 1
+        
+        try:
+            self._tasks.put_nowait((request_id, student_id, header, body))
+        except queue.Full:
+            with self._lock:
+                self._release(request_id, student_id)
+                self.rejected += 1
+            raise ServerBusy()
+        
+        try:
+            return await asyncio.wait_for(future, self.request_timeout)
+        except asyncio.TimeoutError:
+            # Lost with a dead worker, or far too slow: free the slot, the caller skips the frame
+            with self._lock:
+                self._release(request_id, student_id)
+                self.timeouts += 1
+            raise ServerBusy()
+    
+    def _release(self, request_id: int, student_id: str):
+        """Forget a request (lock held); a late result for it is then ignored"""
+        self._pending.pop(request_id, None)
+        if self._in_flight_students.get(student_id) == request_id:
+            del self._in_flight_students[student_id]
+    
+    def _collect_results(self):
+        """Resolve request futures as workers finish, and restart dead workers (runs in a thread)"""
+        next_check = time.monotonic() + 1.0
+        while True:
+            try:
+                item = self._results.get(timeout=1.0)
+            except queue.Empty:
+                item = False
+            # Checked every second, also while the other workers keep answering
+            if time.monotonic() >= next_check:
+                self._restart_dead_workers()
+                next_check = time.monotonic() + 1.0
+            if item is None:
+                break
+            if item is False:
+                continue
+            request_id, student_id, worker_id, points, busy, error = item
+            with self._lock:
+                loop, future = self._pending.get(request_id, (None, None))
+                self._release(request_id, student_id)
+                self.completed += 1
+                self.worker_frames[worker_id] += 1
+                self.worker_busy[worker_id] += busy
+                if error:
+                    self.errors += 1
+            
+            if future is None:
+                continue
+            if error:
+                loop.call_soon_threadsafe(_set_exception, future, RuntimeError(error))
+            else:
+                loop.call_soon_threadsafe(_set_result, future, points)
+    
+    def stats(self) -> dict:
+        """Pool load and per-worker utilization"""
+        uptime = time.monotonic() - self.started_at if self.started_at else 0.0
+        with self._lock:
+            return {
+                'workers': self.worker_count,
+                'capacity': self.capacity,
+                'in_flight': len(self._pending),
+                'submitted': self.submitted,
+                'completed': self.completed,
+                'rejected': self.rejected,
+                'errors': self.errors,
+                'timeouts': self.timeouts,
+                'restarts': self.restarts,
+                'worker_utilization': [
+                    round(busy / uptime, 3) if uptime else 0.0 for busy in self.worker_busy
+                ],
+                'worker_frames': list(self.worker_frames)
+            }
+    
+    async def handle_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """Serve one client connection: request frames in, landmark frames out"""
+        try:
+            while True:
+                try:
+                    header, body = await _read_message(reader)
+                except asyncio.IncompleteReadError:
+                    break
+                
+                student_id = header.get('student_id')
+                if header.get('type') == 'stats':
+                    response, payload = {'status': 'ok', 'stats': self.stats()}, b''
+                else:
+                    try:
+                        points = await self.submit(student_id, header, body)
+                        if points is None:
+                            response, payload = {'status': 'no_face'}, b''
+                        else:
+                            response, payload = {'status': 'ok', 'count': len(points)}, points.tobytes()
+                    except ServerBusy:
+                        response, payload = {'status': 'busy'}, b''
+                    except RuntimeError as e:
+                        response, payload = {'status': 'error', 'detail': str(e)}, b''
+                
+                response['student_id'] = student_id
+                writer.write(_pack_message(response, payload))
+                await writer.drain()
+        finally:
+            writer.close()
+    
+    async def serve(self, host: str = '127.0.0.1', port: int = 8002):
+        """Accept classroom clients on a local TCP socket"""
+        server = await asyncio.start_server(self.handle_client, host, port)
+        print(f"Inference server listening on {host}:{port}")
+        async with server:
+            while True:
+                await asyncio.sleep(10)
+                print(f"Inference stats: {self.stats()}")
+
+def _set_result(future, value):
+    if not future.done():
+        future.set_result(value)
+
+def _set_exception(future, exc):
+    if not future.done():
+        future.set_exception(exc)
+
+def _pack_message(header: dict, body: bytes = b'') -> bytes:
+    encoded = json.dumps(header).encode()
+    return HEADER.pack(len(encoded), len(body)) + encoded + body
+
+async def _read_message(reader: asyncio.StreamReader):
+    header_len, body_len = HEADER.unpack(await reader.readexactly(HEADER.size))
+    header = json.loads(await reader.readexactly(header_len))
+    body = await reader.readexactly(body_len) if body_len else b''
+    return header, body
+
+def _recv_exactly(sock: socket.socket, size: int) -> bytes:
+    chunks = bytearray()
+    while len(chunks) < size:
+        chunk = sock.recv(size - len(chunks))
+        if not chunk:
+            raise ConnectionError("Inference server closed the connection")
+        chunks.extend(chunk)
+    return bytes(chunks)
+
+class RemoteFaceDetector:
+    def __init__(self, student_id: str, host: str = '127.0.0.1', port: int = 8002, jpeg_quality: int = 80):
+        """Drop-in FaceDetector replacement that delegates to an InferenceServer"""
+        self.student_id = student_id
+        self.jpeg_quality = jpeg_quality
+        self.sock = socket.create_connection((host, port))
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    
+    def detect_face(self, frame: np.ndarray) -> Optional[np.ndarray]:
+        """
+        Send one frame and wait for its landmarks (same contract as FaceDetector.detect_face)
+        
+        Raises:
+            ServerBusy: The server rejected the frame; the caller should skip it
+        """
+        import cv2
+        ok, encoded = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, self.jpeg_quality])
+        if not ok:
+            return None
+        
+        header = {'student_id': self.student_id, 'encoding': 'jpeg'}
+        self.sock.sendall(_pack_message(header, encoded.tobytes()))
+        
+        header_len, body_len = HEADER.unpack(_recv_exactly(self.sock, HEADER.size))
+        response = json.loads(_recv_exactly(self.sock, header_len))
+        body = _recv_exactly(self.sock, body_len) if body_len else b''
+        
+        if response['status'] == 'busy':
+            raise ServerBusy()
+        if response['status'] == 'error':
+            raise RuntimeError(response.get('detail'))
+        if response['status'] == 'no_face':
+            return None
+        return np.frombuffer(body, dtype=np.float32).reshape(-1, 3)
+    
+    def close(self):
+        """Clean up resources"""
+        self.sock.close()
+
+async def main():
+    """Main entry point for the inference server"""
+    parser = argparse.ArgumentParser(description="FocusMate multi-student inference server")
+    parser.add_argument('--host', default=os.getenv('INFERENCE_HOST', '127.0.0.1'))
+    parser.add_argument('--port', type=int, default=int(os.getenv('INFERENCE_PORT', '8002')))
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--max-pending-per-worker', type=int, default=2)
+    parser.add_argument('--request-timeout', type=float, default=2.0)
+    args = parser.parse_args()
+    
+    server = InferenceServer(args.workers, args.max_pending_per_worker, args.request_timeout)
+    server.start()
+    try:
+        await server.serve(args.host, args.port)
+    finally:
+        server.stop()
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,63 @@
+"""
+FaceMesh landmark layout shared by the detector and the analyzer
+Kept free of mediapipe so analysis code can run without it
+"""
+import numpy as np
+from itertools import chain, islice
+from operator import attrgetter
+
+# FaceMesh landmark count with refine_landmarks=True (468 mesh + 10 iris)
+NUM_LANDMARKS = 478
+
+# Eye landmarks ordered for EAR: three "upper" points then their three partners,
+# so ||p[i] - p[i + 3]|| gives (v1, v2, h) as contiguous slices
+# Left eye p1..p6 = [33, 160, 158, 133, 153, 144], right eye = [362, 385, 387, 263, 373, 380]
+EYE_INDICES = np.array([
+    [160, 158, 33, 144, 153, 133],
+    [385, 387, 362, 380, 373, 263]
+], dtype=np.intp)
+
+# Nose tip and bridge
+NOSE_INDICES = np.array([1, 4, 5, 6], dtype=np.intp)
+
+# Mouth corners and center
+MOUTH_INDICES = np.array([61, 291, 0, 17], dtype=np.intp)
+
+# Extremes of the face outline (forehead top, chin, left and right cheek), enough
+# for the region-of-interest bounding box; the padding covers the rest of the oval
+FACE_BOX_INDICES = np.array([10, 152, 234, 454], dtype=np.intp)
+
+# Rows the analysis pipeline reads; copying only these keeps the per-frame
+# protobuf-to-array cost a few microseconds instead of ~100 us for all 478
+ANALYSIS_INDICES = np.unique(np.concatenate([
+    EYE_INDICES.ravel(), NOSE_INDICES, MOUTH_INDICES
+]))
+
+# Plus the face box, for detectors that track the region of interest
+TRACKING_INDICES = np.union1d(ANALYSIS_INDICES, FACE_BOX_INDICES)
+
+_xyz = attrgetter('x', 'y', 'z')
+
+def fill_landmark_array(landmarks, out: np.ndarray, indices: np.ndarray = None) -> np.ndarray:
+    """
+    Copy protobuf landmarks (objects with x, y, z) into a preallocated (N, 3) array
+    
+    Args:
+        landmarks: Sequence of landmark objects indexed by FaceMesh index
+        out: Destination array, indexed by FaceMesh index
+        indices: Rows to copy (None copies every landmark)
+    """
+    if indices is None:
+        count = min(len(landmarks), len(out))
+        out.reshape(-1)[:count * 3] = np.fromiter(
+            chain.from_iterable(map(_xyz, islice(landmarks, count))),
+            dtype=np.float32,
+            count=count * 3
+        )
+    else:
+        out[indices] = np.fromiter(
+            chain.from_iterable(map(_xyz, (landmarks[i] for i in indices))),
+            dtype=np.float32,
+            count=len(indices) * 3
+        ).reshape(-1, 3)
+    return out
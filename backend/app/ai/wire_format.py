@@ -0,0 +1,92 @@
+"""
+Compact binary encoding of ai_update messages
+A connection first binds its session and student with ai_register; every
+update after that is a few bytes: status code, quantized score and the
+milliseconds since registration, plus any suppressed scores.
+
+Layout (little endian):
+    header   <BBHIH  version, status code, score * 10, delta ms, sample count
+    samples  <B      status code of the samples (only if sample count > 0)
+             <HH     age ms, score * 10 (repeated sample count times)
+"""
+
+import struct
+from typing import List, Optional, Tuple
+
+VERSION = 1
+
+# Codes are part of the protocol: append new statuses, never reorder
+STATUSES = ('Unknown', 'Engaged', 'Present', 'Looking Away', 'Drowsy', 'Absent', 'Left Class')
+STATUS_CODES = {status: code for code, status in enumerate(STATUSES)}
+
+HEADER = struct.Struct('<BBHIH')
+SAMPLES_STATUS = struct.Struct('<B')
+SAMPLE = struct.Struct('<HH')
+
+MAX_AGE_MS = 0xFFFF
+MAX_DELTA_MS = 0xFFFFFFFF
+
+class WireFormatError(ValueError):
+    """Raised for frames that cannot be decoded"""
+
+def quantize_score(score: float) -> int:
+    """0-100 score to tenths of a point"""
+    return max(0, min(1000, int(round(score * 10))))
+
+def encode_update(attention_score: float, status: str, delta_ms: int,
+                  samples: Optional[List[list]] = None, samples_status: Optional[str] = None) -> bytes:
+    """
+    Encode one update
+    
+    Args:
+        attention_score: Current score (0-100)
+        status: Current status (must be in STATUSES)
+        delta_ms: Milliseconds since the connection registered
+        samples: Suppressed scores as [age_ms, score]
+        samples_status: Status shared by the suppressed scores
+    """
+    samples = samples or ()
+    parts = [HEADER.pack(
+        VERSION,
+        STATUS_CODES[status],
+        quantize_score(attention_score),
+        max(0, min(MAX_DELTA_MS, int(delta_ms))),
+        len(samples)
+    )]
+    if samples:
+        parts.append(SAMPLES_STATUS.pack(STATUS_CODES[samples_status or status]))
+        parts.extend(
+            SAMPLE.pack(max(0, min(MAX_AGE_MS, int(age_ms))), quantize_score(score))
+            for age_ms, score in samples
+        )
+    return b''.join(parts)
+
+def decode_update(frame: bytes) -> Tuple[float, str, int, List[Tuple[int, float]], Optional[str]]:
+    """
+    Decode one update
+    
+    Returns:
+        Tuple of (attention_score, status, delta_ms, [(age_ms, score)], samples_status)
+    """
+    if len(frame) < HEADER.size:
+        raise WireFormatError("Frame shorter than header")
+    version, status_code, score_q, delta_ms, count = HEADER.unpack_from(frame)
+    if version != VERSION:
+        raise WireFormatError(f"Unsupported version {version}")
+    if status_code >= len(STATUSES):
+        raise WireFormatError(f"Unknown status code {status_code}")
+    
+    expected = HEADER.size + (SAMPLES_STATUS.size + count * SAMPLE.size if count else 0)
+    if len(frame) != expected:
+        raise WireFormatError(f"Expected {expected} bytes, got {len(frame)}")
+    
+    samples, samples_status = [], None
+    if count:
+        samples_code = frame[HEADER.size]
+        if samples_code >= len(STATUSES):
+            raise WireFormatError(f"Unknown status code {samples_code}")
+        samples_status = STATUSES[samples_code]
+        samples = [
+            (age_ms, q / 10) for age_ms, q in SAMPLE.iter_unpack(frame[HEADER.size + SAMPLES_STATUS.size:])
+        ]
+    return score_q / 10, STATUSES[status_code], delta_ms, samples, samples_status
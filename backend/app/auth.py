@@ -1,23 +1,22 @@
 from datetime import datetime, timedelta
 from typing import Optional
 from jose import JWTError, jwt
-from passlib.context import CryptContext
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from .config import settings
 from .database import get_db
 from .models import User
-
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+from .user_cache import user_cache
+from .password_hashing import pwd_context
 security = HTTPBearer()
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
-    """Verify a password against its hash"""
+    """Verify a password against its hash (blocking; routes use password_hasher)"""
     return pwd_context.verify(plain_password, hashed_password)
 
 def get_password_hash(password: str) -> str:
-    """Hash a password"""
+    """Hash a password (blocking; routes use password_hasher)"""
     return pwd_context.hash(password)
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
@@ -43,9 +42,20 @@ def decode_token(token: str) -> dict:
             headers={"WWW-Authenticate": "Bearer"},
         )
 
+async def load_user(db: AsyncSession, user_id: str) -> Optional[User]:
+    """Fetch a user by id, served from the user cache when possible"""
+    user = user_cache.get(user_id)
+    if user is None:
+        user = await db.get(User, user_id)
+        if user is not None:
+            # Detach so the cached copy outlives this request's session
+            db.expunge(user)
+            user_cache.put(user)
+    return user
+
 async def get_current_user(
     credentials: HTTPAuthorizationCredentials = Depends(security),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ) -> User:
     """Get the current authenticated user"""
     token = credentials.credentials
@@ -57,7 +67,7 @@ async def get_current_user(
             detail="Could not validate credentials"
         )
     
-    user = db.query(User).filter(User.id == user_id).first()
+    user = await load_user(db, user_id)
     if user is None:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
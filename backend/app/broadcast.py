@@ -0,0 +1,87 @@
+"""
+Coalesced attention broadcasts for teacher dashboards
+Keeps the latest score and status per student and sends each room's
+teachers one attention_snapshot per tick instead of one message per update
+"""
+import time
+from typing import Dict, Optional
+from .config import settings
+
+def teacher_room(session_id: str) -> str:
+    """Socket.IO room holding only the teachers of a session"""
+    return f"teachers:{session_id}"
+
+class SnapshotBroadcaster:
+    def __init__(self, interval: float = 0.5):
+        """
+        Initialize the broadcaster
+        
+        Args:
+            interval: Seconds between snapshots (0.25-0.5 gives 2-4 Hz)
+        """
+        self.interval = interval
+        # {session_id: {student_id: {'attention_score', 'status', 'updated_at'}}} changed since the last tick
+        self._dirty: Dict[str, Dict[str, dict]] = {}
+        self._running = False
+        
+        # Counters
+        self.updates = 0
+        self.snapshots = 0
+        self.students_sent = 0
+    
+    def update(self, session_id: str, student_id: str, attention_score: float, status: str,
+               updated_at: Optional[float] = None):
+        """Record a student's latest result; older unsent results are overwritten"""
+        self._dirty.setdefault(session_id, {})[student_id] = {
+            'attention_score': attention_score,
+            'status': status,
+            'updated_at': updated_at or time.time()
+        }
+        self.updates += 1
+    
+    def drop_session(self, session_id: str):
+        """Forget pending results of an ended session"""
+        self._dirty.pop(session_id, None)
+    
+    async def flush(self, sio):
+        """Send one snapshot per room with pending results"""
+        dirty, self._dirty = self._dirty, {}
+        for session_id, students in dirty.items():
+            await sio.emit('attention_snapshot', {
+                'session_id': session_id,
+                'students': students
+            }, room=teacher_room(session_id))
+            self.snapshots += 1
+            self.students_sent += len(students)
+    
+    def start(self, sio):
+        """Run the snapshot tick as a Socket.IO background task"""
+        if self._running:
+            return
+        self._running = True
+        sio.start_background_task(self._run, sio)
+    
+    def stop(self):
+        """Stop after the current tick"""
+        self._running = False
+    
+    async def _run(self, sio):
+        while self._running:
+            await sio.sleep(self.interval)
+            try:
+                await self.flush(sio)
+            except Exception as e:
+                print(f"Snapshot broadcast error: {e}")
+    
+    def stats(self) -> dict:
+        """Coalescing counters for metrics"""
+        return {
+            'interval': self.interval,
+            'pending_rooms': len(self._dirty),
+            'updates': self.updates,
+            'snapshots': self.snapshots,
+            'students_sent': self.students_sent,
+            'updates_per_student_sent': round(self.updates / self.students_sent, 2) if self.students_sent else 0.0
+        }
+
+broadcaster = SnapshotBroadcaster(settings.SNAPSHOT_INTERVAL)
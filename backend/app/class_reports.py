@@ -0,0 +1,449 @@
+"""
+Session report computation and ClassReport materialization
+Reports are computed once when a class ends and stored as JSON, so
+viewing a finished class does not depend on how long it ran
+"""
+import json
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Optional
+from sqlalchemy import and_, func, or_, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+from .config import settings
+from .database import SessionLocal
+from .models import (
+    Room, User, AttentionSample, AttentionRollup, StatusTimeline, TabSwitchEvent, ClassReport, generate_uuid
+)
+from .rollups import EPOCH, ROLLUP_RESOLUTIONS, REPORT_RESOLUTION
+from .utils import lttb
+from .ingestion import ingestor
+from .response_cache import report_cache
+
+def rollup_totals_query(session_ids: list, student_id: str = None, resolution: int = REPORT_RESOLUTION):
+    """Per session and student: weighted score total, sample count and last bucket start in one rollup tier"""
+    query = select(
+        AttentionRollup.session_id,
+        AttentionRollup.student_id,
+        func.sum(AttentionRollup.mean_score * AttentionRollup.sample_count),
+        func.sum(AttentionRollup.sample_count),
+        func.max(AttentionRollup.bucket_start)
+    ).where(
+        AttentionRollup.session_id.in_(session_ids),
+        AttentionRollup.resolution == resolution
+    )
+    if student_id:
+        query = query.where(AttentionRollup.student_id == student_id)
+    return query.group_by(AttentionRollup.session_id, AttentionRollup.student_id)
+
+def tail_samples_query(session_ids: list, cutoffs: dict, student_id: str = None):
+    """
+    Per session and student: score total and count of the samples no rollup row covers
+    
+    Args:
+        cutoffs: {(session_id, student_id): end of the student's last rollup bucket}; samples
+            before it are skipped, students without an entry keep all their samples
+    """
+    query = select(
+        AttentionSample.session_id,
+        AttentionSample.student_id,
+        func.sum(AttentionSample.attention_score),
+        func.count(AttentionSample.id)
+    ).where(
+        AttentionSample.session_id.in_(session_ids)
+    )
+    if student_id:
+        query = query.where(AttentionSample.student_id == student_id)
+    if cutoffs:
+        query = query.where(~or_(*(
+            and_(
+                AttentionSample.session_id == cutoff_session,
+                AttentionSample.student_id == cutoff_student,
+                AttentionSample.timestamp < cutoff
+            ) for (cutoff_session, cutoff_student), cutoff in cutoffs.items()
+        )))
+    return query.group_by(AttentionSample.session_id, AttentionSample.student_id)
+
+def attention_totals(db: Session, session_ids: list, student_id: str = None) -> dict:
+    """
+    {(session_id, student_id): (weighted score total, sample count)} in two grouped queries
+    
+    Closed buckets of the coarsest rollup tier, plus the samples after each student's last
+    one: a live session's latest minute, students who joined late, and sessions recorded
+    before rollups existed. A tail sample weighs as one update.
+    """
+    totals, cutoffs = {}, {}
+    if not session_ids:
+        return totals
+    
+    if REPORT_RESOLUTION:
+        for session_id, row_student, total, count, last in db.execute(
+            rollup_totals_query(session_ids, student_id)
+        ):
+            totals[(session_id, row_student)] = (total or 0.0, count or 0)
+            cutoffs[(session_id, row_student)] = last + timedelta(seconds=REPORT_RESOLUTION)
+    
+    for session_id, row_student, total, count in db.execute(tail_samples_query(session_ids, cutoffs, student_id)):
+        previous_total, previous_count = totals.get((session_id, row_student), (0.0, 0))
+        totals[(session_id, row_student)] = (previous_total + (total or 0.0), previous_count + count)
+    return totals
+
+def average_attention(db: Session, session_id: str, student_id: str = None) -> float:
+    """Average attention of a session or one of its students"""
+    totals = attention_totals(db, [session_id], student_id).values()
+    count = sum(count for _, count in totals)
+    return sum(total for total, _ in totals) / count if count else 0
+
+def student_averages(db: Session, session_id: str) -> list:
+    """(student_id, name, average attention, sample count) for every student of a session"""
+    totals = attention_totals(db, [session_id])
+    names = dict(db.execute(select(User.id, User.name).where(
+        User.id.in_([student_id for _, student_id in totals])
+    )).all()) if totals else {}
+    return [
+        (student_id, names.get(student_id), total / count if count else 0, count)
+        for (_, student_id), (total, count) in totals.items()
+    ]
+
+def session_summaries(db: Session, session_ids: list) -> dict:
+    """{session_id: (student_count, average attention)} for many sessions in grouped queries"""
+    per_session = {}
+    for (session_id, _), (total, count) in attention_totals(db, session_ids).items():
+        students, session_total, session_count = per_session.get(session_id, (0, 0.0, 0))
+        per_session[session_id] = (students + 1, session_total + total, session_count + count)
+    return {
+        session_id: (students, total / count if count else 0)
+        for session_id, (students, total, count) in per_session.items()
+    }
+
+def build_session_report(db: Session, session: Room) -> dict:
+    """Full per-student report of a session (constant number of queries)"""
+    students = student_averages(db, session.id)
+    
+    # One timeline fetch for the whole session, partitioned per student
+    timelines = {}
+    for student_id, timestamp, new_status, duration in db.query(
+        StatusTimeline.student_id,
+        StatusTimeline.timestamp,
+        StatusTimeline.new_status,
+        StatusTimeline.duration_in_previous
+    ).filter(
+        StatusTimeline.session_id == session.id
+    ).order_by(StatusTimeline.timestamp):
+        timelines.setdefault(student_id, []).append({
+            'timestamp': timestamp,
+            'status': new_status,
+            'duration': duration
+        })
+    
+    tab_switches = dict(db.query(
+        TabSwitchEvent.student_id,
+        func.count(TabSwitchEvent.id)
+    ).filter(
+        TabSwitchEvent.session_id == session.id
+    ).group_by(TabSwitchEvent.student_id).all())
+    
+    student_reports = []
+    total, count = 0.0, 0
+    for student_id, student_name, avg_attention, samples in sorted(students, key=lambda row: row[1] or ''):
+        student_reports.append({
+            'student_id': student_id,
+            'name': student_name,
+            'final_attention_score': round(avg_attention or 0, 1),
+            'status_timeline': timelines.get(student_id, []),
+            'tab_switch_count': tab_switches.get(student_id, 0)
+        })
+        total += (avg_attention or 0) * (samples or 0)
+        count += samples or 0
+    
+    return {
+        'session': {
+            'id': session.id,
+            'room_code': session.room_code,
+            'start_time': session.start_time,
+            'end_time': session.end_time
+        },
+        'students': student_reports,
+        'average_attention': round(total / count, 1) if count else 0,
+        'generated_at': datetime.utcnow()
+    }
+
+def _curve_source(bucket_seconds: int) -> Optional[int]:
+    """Rollup tier a curve is built from: the widest one nesting inside the bucket, finer than it if possible"""
+    nesting = [r for r in ROLLUP_RESOLUTIONS if bucket_seconds % r == 0]
+    finer = [r for r in nesting if r < bucket_seconds]
+    if finer:
+        return finer[-1]
+    return nesting[-1] if nesting else None
+
+def _weighted_median(values: list) -> float:
+    """Median of (value, weight) pairs"""
+    values.sort()
+    half = sum(weight for _, weight in values) / 2
+    seen = 0
+    for value, weight in values:
+        seen += weight
+        if seen >= half:
+            return value
+    return values[-1][0]
+
+class _CurveBucket:
+    __slots__ = ('count', 'total', 'min', 'max', 'values')
+    
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+        self.values = []
+    
+    def add(self, count: int, mean: float, low: float, high: float):
+        self.count += count
+        self.total += mean * count
+        self.min = low if self.min is None else min(self.min, low)
+        self.max = high if self.max is None else max(self.max, high)
+        self.values.append((mean, count))
+    
+    def point(self, start: float) -> dict:
+        return {
+            't': (EPOCH + timedelta(seconds=start)).isoformat(),
+            'mean': round(self.total / self.count, 1),
+            'min': round(self.min, 1),
+            'max': round(self.max, 1),
+            'p50': round(_weighted_median(self.values), 1),
+            'samples': self.count
+        }
+
+def curve_rollups_query(session_id: str, resolution: int):
+    """Every bucket of one rollup tier of a session"""
+    return select(
+        AttentionRollup.student_id,
+        AttentionRollup.bucket_start,
+        AttentionRollup.sample_count,
+        AttentionRollup.mean_score,
+        AttentionRollup.min_score,
+        AttentionRollup.max_score
+    ).where(
+        AttentionRollup.session_id == session_id,
+        AttentionRollup.resolution == resolution
+    )
+
+def attention_curve(db: Session, session_id: str, bucket_seconds: int, max_points: int) -> dict:
+    """
+    Per-student and class-wide attention over time
+    
+    Buckets are aligned to the epoch like the rollup tiers. They are built
+    from the widest rollup tier nesting inside the bucket, so p50 is the
+    weighted median of that tier's means; sessions without rollups use the
+    raw samples (exact p50). Series longer than max_points are reduced
+    with LTTB on the mean.
+    """
+    source = _curve_source(bucket_seconds)
+    rows = []
+    if source:
+        rows = db.execute(curve_rollups_query(session_id, source)).all()
+    if not rows:
+        source = None
+        rows = [
+            (student_id, timestamp, 1, score, score, score)
+            for student_id, timestamp, score in db.query(
+                AttentionSample.student_id,
+                AttentionSample.timestamp,
+                AttentionSample.attention_score
+            ).filter(AttentionSample.session_id == session_id)
+        ]
+    
+    students, overall = {}, {}
+    for student_id, timestamp, count, mean, low, high in rows:
+        seconds = (timestamp.replace(tzinfo=None) - EPOCH).total_seconds()
+        start = seconds - seconds % bucket_seconds
+        for buckets in (students.setdefault(student_id, {}), overall):
+            bucket = buckets.get(start)
+            if bucket is None:
+                bucket = buckets[start] = _CurveBucket()
+            bucket.add(count, mean, low, high)
+    
+    def series(buckets: dict) -> list:
+        ordered = sorted(buckets.items())
+        ordered = lttb(ordered, max_points, x=lambda item: item[0], y=lambda item: item[1].total / item[1].count)
+        return [bucket.point(start) for start, bucket in ordered]
+    
+    names = dict(db.query(User.id, User.name).filter(User.id.in_(list(students)))) if students else {}
+    return {
+        'session_id': session_id,
+        'bucket_seconds': bucket_seconds,
+        'source': f"rollup:{source}s" if source else "samples",
+        'class': series(overall),
+        'students': {
+            student_id: {'name': names.get(student_id), 'points': series(buckets)}
+            for student_id, buckets in students.items()
+        }
+    }
+
+# INSERT ... ON CONFLICT constructs of the supported backends
+UPSERTS = {
+    'postgresql': postgresql.insert,
+    'sqlite': sqlite.insert,
+}
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"Cannot serialize {type(value).__name__}")
+
+def stored_report_query(session_id: str):
+    """Latest materialized report of a session"""
+    return select(ClassReport.report_data).where(
+        ClassReport.session_id == session_id
+    ).order_by(ClassReport.generated_at.desc()).limit(1)
+
+def stored_report(db: Session, session_id: str) -> Optional[dict]:
+    """Latest materialized report of a session, if any"""
+    row = db.execute(stored_report_query(session_id)).first()
+    return json.loads(row.report_data) if row else None
+
+def generate_class_report(session_id: str) -> Optional[dict]:
+    """Flush the session's pending samples, compute its report and store it as the ClassReport"""
+    ingestor.flush(force=True, session_id=session_id)
+    
+    db = SessionLocal()
+    try:
+        session = db.query(Room).filter(Room.id == session_id).first()
+        if not session:
+            return None
+        
+        report = build_session_report(db, session)
+        report_data = json.dumps(report, default=_json_default)
+        end_time = session.end_time or datetime.utcnow()
+        
+        # One report per session (unique index): insert or replace in one statement
+        values = {
+            'generated_at': datetime.utcnow(),
+            'total_duration': int((end_time - session.start_time).total_seconds()) if session.start_time else 0,
+            'student_count': len(report['students']),
+            'average_attention': report['average_attention'],
+            'report_data': report_data
+        }
+        upsert = UPSERTS[db.bind.dialect.name](ClassReport).values(id=generate_uuid(), session_id=session_id, **values)
+        db.execute(upsert.on_conflict_do_update(index_elements=[ClassReport.session_id], set_=values))
+        db.commit()
+        
+        # Drop cached responses built before this report: the session's, its teacher's and students' lists
+        report_cache.invalidate(
+            f"session:{session_id}",
+            f"teacher:{session.teacher_id}",
+            *(f"student:{student['student_id']}" for student in report['students'])
+        )
+        return json.loads(report_data)
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+class ReportJobs:
+    def __init__(self, refresh_delay: float = 30.0):
+        """
+        Single background worker so report jobs never compete with each other
+        
+        Args:
+            refresh_delay: Seconds late data for an ended session waits before its report is
+                regenerated; more late data meanwhile rides along
+        """
+        self.refresh_delay = refresh_delay
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="class-reports")
+        # {session_id: Future} of runs queued but not started, and of the run in progress
+        self._pending = {}
+        self._running = {}
+        # Ended sessions with a late-data refresh waiting for refresh_delay
+        self._deferred = set()
+        self._lock = threading.Lock()
+        # Session the current worker thread is generating
+        self._local = threading.local()
+        self.completed = 0
+        self.failed = 0
+    
+    def schedule(self, session_id: str, refresh: bool = False) -> Future:
+        """
+        Queue report generation
+        
+        A session already queued is not queued twice, and a run in progress
+        covers the request too (it flushes and reads the session after the
+        class ended), unless refresh asks for a run that starts after now.
+        
+        Args:
+            refresh: New data or an explicit recompute since the running job started
+        
+        Returns:
+            Future of the run that covers this request (its report dict)
+        """
+        with self._lock:
+            future = self._pending.get(session_id)
+            if future is None and not refresh:
+                future = self._running.get(session_id)
+            if future is not None:
+                return future
+            future = self._pending[session_id] = Future()
+        self._executor.submit(self._run, session_id)
+        return future
+    
+    def refresh_ended(self, session_ids: set):
+        """Regenerate, once per refresh_delay, the stored reports of ended sessions that received late data"""
+        # Rows written by a job's own flush are already in the report it is computing
+        with self._lock:
+            session_ids = set(session_ids) - self._deferred - {getattr(self._local, 'session_id', None)}
+        if not session_ids:
+            return
+        db = SessionLocal()
+        try:
+            ended = db.execute(select(Room.id).where(Room.id.in_(session_ids), Room.end_time != None)).scalars().all()
+        finally:
+            db.close()
+        for session_id in ended:
+            with self._lock:
+                if session_id in self._deferred:
+                    continue
+                self._deferred.add(session_id)
+            timer = threading.Timer(self.refresh_delay, self._refresh, (session_id,))
+            timer.daemon = True
+            timer.start()
+    
+    def _refresh(self, session_id: str):
+        with self._lock:
+            self._deferred.discard(session_id)
+        self.schedule(session_id, refresh=True)
+    
+    def _run(self, session_id: str):
+        with self._lock:
+            future = self._pending.pop(session_id)
+            self._running[session_id] = future
+        self._local.session_id = session_id
+        try:
+            report = generate_class_report(session_id)
+            self.completed += 1
+            print(f"Class report generated for session {session_id}")
+            future.set_result(report)
+        except Exception as e:
+            self.failed += 1
+            print(f"Class report generation failed for session {session_id}: {e}")
+            future.set_exception(e)
+        finally:
+            self._local.session_id = None
+            with self._lock:
+                self._running.pop(session_id, None)
+    
+    def stats(self) -> dict:
+        """Job counters for metrics"""
+        with self._lock:
+            pending, running, deferred = len(self._pending), len(self._running), len(self._deferred)
+        return {
+            'pending': pending,
+            'running': running,
+            'deferred': deferred,
+            'completed': self.completed,
+            'failed': self.failed
+        }
+
+report_jobs = ReportJobs(settings.REPORT_REFRESH_DELAY)
+ingestor.on_persisted = report_jobs.refresh_ended
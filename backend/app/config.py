@@ -10,6 +10,51 @@ class Settings(BaseSettings):
     JWT_ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 10080  # 7 days (prevents frequent re-logins)
     
+    # Password hashing (runs in a thread pool, off the event loop)
+    BCRYPT_ROUNDS: int = 12  # cost factor; stored hashes with other rounds are upgraded at login
+    HASH_WORKERS: int = 0  # hashing threads; 0 = one per CPU core
+    HASH_MAX_PENDING: int = 256  # queued + running hashes before logins get 503
+    
+    # Connection pools (PostgreSQL); the async engine serves requests, the sync one background threads
+    DB_POOL_SIZE: int = 10  # connections kept open per engine
+    DB_MAX_OVERFLOW: int = 20  # extra connections allowed under burst
+    DB_POOL_TIMEOUT: float = 30.0  # seconds to wait for a free connection
+    DB_POOL_RECYCLE: int = 1800  # seconds before a connection is replaced
+    
+    # Write-behind ingestion of AI attention samples
+    INGEST_BATCH_SIZE: int = 500  # flush when this many samples are queued
+    INGEST_FLUSH_INTERVAL: float = 1.0  # seconds between time-based flushes
+    INGEST_MAX_QUEUE: int = 50000  # samples beyond this are dropped
+    
+    # Downsampling of stored attention data (live broadcasts stay per-frame)
+    SAMPLE_BUCKET_SECONDS: float = 1.0  # one AttentionSample (mean) per bucket; 0 stores every update
+    ROLLUP_RESOLUTIONS: str = "10,60"  # AttentionRollup tiers in seconds (the samples are the finest tier); empty disables rollups
+    
+    # Authenticated user cache (HTTP requests and socket connects)
+    USER_CACHE_TTL: float = 60.0  # seconds a cached user is trusted; 0 disables the cache
+    USER_CACHE_MAX_ENTRIES: int = 10000  # least recently used users are evicted beyond this
+    SOCKET_TRUST_JWT_CLAIMS: bool = False  # take user id and role from the token on socket connect, no DB lookup
+    
+    # Teacher dashboards receive one attention_snapshot per room per tick
+    SNAPSHOT_INTERVAL: float = 0.5  # seconds (2 Hz)
+    LIVE_STATS_INTERVAL: float = 5.0  # seconds between live_stats (room aggregates) events
+    
+    # Multi-worker Socket.IO: shared message queue and presence store (empty = single worker, in memory)
+    REDIS_URL: str = ""  # e.g. redis://localhost:6379/0
+    REDIS_KEY_PREFIX: str = "focusmate"  # shared by every worker of one deployment
+    PRESENCE_TTL: float = 30.0  # seconds without a heartbeat before a worker's sockets are dropped from presence
+    
+    # Raw data exports (/reports/session/{id}/export)
+    EXPORT_BATCH_SIZE: int = 5000  # rows fetched per server-side cursor batch
+    
+    # Attention curves (/reports/session/{id}/curve)
+    CURVE_MAX_POINTS: int = 500  # longer series are downsampled (LTTB)
+    
+    # Report response cache (ETag / 304), invalidated when a session gets new data or a new report
+    REPORT_CACHE_MAX_BYTES: int = 32 * 1024 * 1024  # total cached body size; 0 disables
+    REPORT_CACHE_MAX_AGE: int = 300  # seconds browsers may reuse an ended session's report without asking
+    REPORT_REFRESH_DELAY: float = 30.0  # late data for an ended session regenerates its report at most this often
+    
     class Config:
         env_file = ".env"
 
@@ -1,24 +1,63 @@
 from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from .config import settings
 
+is_sqlite = "sqlite" in settings.DATABASE_URL
+
+def _pool_options() -> dict:
+    """Pool sizing shared by both engines (SQLite keeps SQLAlchemy's defaults)"""
+    if is_sqlite:
+        return {}
+    return {
+        'pool_size': settings.DB_POOL_SIZE,
+        'max_overflow': settings.DB_MAX_OVERFLOW,
+        'pool_timeout': settings.DB_POOL_TIMEOUT,
+        'pool_recycle': settings.DB_POOL_RECYCLE,
+        'pool_pre_ping': True
+    }
+
+def async_database_url(url: str):
+    """The same database through its asyncio driver (aiosqlite / asyncpg), plus driver connect args"""
+    url = make_url(url)
+    connect_args = {}
+    if url.get_backend_name() == "sqlite":
+        return url.set(drivername="sqlite+aiosqlite"), connect_args
+
+    # asyncpg takes ssl as a connect argument instead of libpq's sslmode
+    sslmode = url.query.get("sslmode")
+    if sslmode:
+        url = url.difference_update_query(["sslmode"])
+        if sslmode != "disable":
+            connect_args['ssl'] = sslmode
+    return url.set(drivername="postgresql+asyncpg"), connect_args
+
+# Synchronous engine: background threads (ingestion, report jobs, exports) and migrations
 engine = create_engine(
     settings.DATABASE_URL,
-    connect_args={"check_same_thread": False} if "sqlite" in settings.DATABASE_URL else {}
+    connect_args={"check_same_thread": False} if is_sqlite else {},
+    **_pool_options()
 )
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Asyncio engine: HTTP routes and socket handlers, so queries never block the event loop
+_async_url, _async_connect_args = async_database_url(settings.DATABASE_URL)
+async_engine = create_async_engine(_async_url, connect_args=_async_connect_args, **_pool_options())
+
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
 Base = declarative_base()
 
-def get_db():
-    db = SessionLocal()
-    try:
+async def get_db():
+    async with AsyncSessionLocal() as db:
         yield db
-    finally:
-        db.close()
 
 def init_db():
-    """Initialize database tables"""
+    """Initialize database tables and apply pending migrations"""
+    from . import models  # registers the tables on Base
+    from .migrations import run_migrations
     Base.metadata.create_all(bind=engine)
+    run_migrations(engine)
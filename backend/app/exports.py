@@ -0,0 +1,98 @@
+"""
+Streaming export of raw session data
+Rows are read through a server-side cursor in batches and written out as
+CSV or NDJSON chunks, so memory stays flat however long the session ran
+"""
+import csv
+import io
+import json
+import zlib
+from datetime import datetime
+from typing import Iterator, Optional
+from sqlalchemy import select
+from .config import settings
+from .database import SessionLocal
+from .models import AttentionSample, StatusTimeline
+
+# {name: (model, exported columns)}
+EXPORTS = {
+    'samples': (AttentionSample, ('student_id', 'timestamp', 'attention_score', 'status')),
+    'timeline': (StatusTimeline, ('student_id', 'timestamp', 'previous_status', 'new_status', 'duration_in_previous')),
+}
+
+FORMATS = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+}
+
+CHUNK_BYTES = 64 * 1024
+
+def _value(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+def export_query(session_id: str, table: str, start: Optional[datetime] = None, end: Optional[datetime] = None):
+    """Exported columns of a session's rows, optionally within [start, end)"""
+    model, columns = EXPORTS[table]
+    query = select(*(getattr(model, column) for column in columns)).where(model.session_id == session_id)
+    if start:
+        query = query.where(model.timestamp >= start)
+    if end:
+        query = query.where(model.timestamp < end)
+    # (student_id, timestamp) follows the composite index, so the database never sorts the session
+    return query.order_by(model.student_id, model.timestamp)
+
+def _rows(session_id: str, table: str, start: Optional[datetime], end: Optional[datetime]) -> Iterator[tuple]:
+    db = SessionLocal()
+    try:
+        yield from db.execute(
+            export_query(session_id, table, start, end).execution_options(yield_per=settings.EXPORT_BATCH_SIZE)
+        )
+    finally:
+        db.close()
+
+def _encode(table: str, fmt: str, rows: Iterator[tuple]) -> Iterator[str]:
+    """Rows to text, in pieces of about CHUNK_BYTES"""
+    columns = EXPORTS[table][1]
+    buffer = io.StringIO()
+    if fmt == 'csv':
+        writer = csv.writer(buffer)
+        writer.writerow(columns)
+        write = lambda row: writer.writerow([_value(value) for value in row])
+    else:
+        write = lambda row: buffer.write(
+            json.dumps({column: _value(value) for column, value in zip(columns, row)}) + "\n"
+        )
+    
+    for row in rows:
+        write(row)
+        if buffer.tell() >= CHUNK_BYTES:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+def stream_export(session_id: str, table: str, fmt: str, start: Optional[datetime] = None,
+                  end: Optional[datetime] = None, compress: bool = False) -> Iterator[bytes]:
+    """
+    Stream a session's raw rows
+    
+    Args:
+        session_id: Session to export
+        table: Key of EXPORTS
+        fmt: Key of FORMATS
+        start: Only rows at or after this time
+        end: Only rows before this time
+        compress: Gzip the stream
+    """
+    chunks = (text.encode() for text in _encode(table, fmt, _rows(session_id, table, start, end)))
+    if not compress:
+        yield from chunks
+        return
+    
+    gzip = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits 31: gzip container
+    for chunk in chunks:
+        data = gzip.compress(chunk)
+        if data:
+            yield data
+    yield gzip.flush()
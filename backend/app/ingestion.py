@@ -0,0 +1,291 @@
+"""
+Write-behind persistence for AI attention updates
+Samples are queued in memory, folded into downsampled buckets and
+bulk-inserted from a background thread so the Socket.IO event loop
+never waits on the database
+"""
+import threading
+import time
+from collections import Counter, deque
+from datetime import datetime
+from typing import Callable, Optional
+from sqlalchemy import insert
+from sqlalchemy.exc import IntegrityError
+from .config import settings
+from .database import SessionLocal
+from .models import AttentionSample, StatusTimeline, AttentionRollup
+from .rollups import RollupAggregator, ROLLUP_RESOLUTIONS
+from .response_cache import report_cache
+
+class AttentionIngestor:
+    def __init__(self, batch_size: int = 500, flush_interval: float = 1.0, max_queue: int = 50000,
+                 rollups: RollupAggregator = None):
+        """Initialize the ingestion queue"""
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_queue = max_queue
+        self.rollups = rollups or RollupAggregator(0, [])
+        # Called from the writing thread with the ids of sessions that just got rows
+        self.on_persisted: Optional[Callable[[set], None]] = None
+        
+        self._queue = deque()
+        self._transitions = deque()
+        # {(session_id, student_id): (new_status, timestamp)} of the latest transition not yet written
+        self._latest_transitions = {}
+        # (session_id, student_id) pairs the database refused (unknown ids); their updates are dropped
+        self._rejected = set()
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        
+        # Counters
+        self.enqueued = 0
+        self.persisted = 0
+        self.samples_written = 0
+        self.rollups_written = 0
+        self.dropped = 0
+        self.rejected = 0
+        self.flushes = 0
+        self.failed_flushes = 0
+        self.last_flush_ms = 0.0
+        self.max_flush_ms = 0.0
+        self.total_flush_ms = 0.0
+    
+    def enqueue(self, session_id: str, student_id: str, attention_score: float,
+                status: str, timestamp: Optional[datetime] = None) -> bool:
+        """Queue one sample for persistence. Returns False if the queue is full or the ids were refused."""
+        with self._lock:
+            if (session_id, student_id) in self._rejected:
+                self.rejected += 1
+                return False
+            if len(self._queue) >= self.max_queue:
+                self.dropped += 1
+                return False
+            self._queue.append((
+                session_id,
+                student_id,
+                float(attention_score),
+                status,
+                timestamp or datetime.utcnow()
+            ))
+            self.enqueued += 1
+            depth = len(self._queue)
+        
+        if depth >= self.batch_size:
+            self._wakeup.set()
+        return True
+    
+    def enqueue_transition(self, session_id: str, student_id: str, previous_status: Optional[str],
+                           new_status: str, duration_in_previous: Optional[int],
+                           timestamp: Optional[datetime] = None):
+        """Queue one StatusTimeline row (transitions are rare and only dropped for refused ids)"""
+        timestamp = timestamp or datetime.utcnow()
+        with self._lock:
+            if (session_id, student_id) in self._rejected:
+                return
+            self._transitions.append({
+                'session_id': session_id,
+                'student_id': student_id,
+                'previous_status': previous_status,
+                'new_status': new_status,
+                'duration_in_previous': duration_in_previous,
+                'timestamp': timestamp
+            })
+            self._latest_transitions[(session_id, student_id)] = (new_status, timestamp)
+    
+    def pending_status(self, session_id: str, student_id: str) -> Optional[tuple]:
+        """(new_status, timestamp) of the student's latest transition not yet in StatusTimeline, or None"""
+        with self._lock:
+            return self._latest_transitions.get((session_id, student_id))
+    
+    def start(self):
+        """Start the background flush thread"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run, name="attention-ingestor", daemon=True)
+        self._thread.start()
+    
+    def stop(self, timeout: float = 10.0):
+        """Stop the flush thread and persist everything still queued"""
+        self._stopping.set()
+        self._wakeup.set()
+        if self._thread:
+            self._thread.join(timeout)
+            self._thread = None
+        self.flush(force=True)
+    
+    def flush(self, force: bool = False, session_id: Optional[str] = None):
+        """
+        Drain the queue into the database in batches
+        
+        Args:
+            force: Also close buckets that are still open (shutdown, session end)
+            session_id: Only force the buckets of this session
+        """
+        with self._flush_lock:
+            while True:
+                with self._lock:
+                    if not self._queue and not self._transitions:
+                        break
+                    count = min(self.batch_size, len(self._queue))
+                    batch = [self._queue.popleft() for _ in range(count)]
+                    transitions = list(self._transitions)
+                    self._transitions.clear()
+                
+                samples, rollups = [], []
+                for row_session, student_id, score, status, timestamp in batch:
+                    if (row_session, student_id) in self._rejected:
+                        continue
+                    closed_samples, closed_rollups = self.rollups.add(row_session, student_id, score, status, timestamp)
+                    samples.extend(closed_samples)
+                    rollups.extend(closed_rollups)
+                updates = Counter((row[0], row[1]) for row in batch)
+                self._write_batch(updates, samples, rollups, transitions)
+                self._settle(transitions)
+            
+            # Buckets of students that stopped sending
+            samples, rollups = self.rollups.collect(force=force, session_id=session_id)
+            if samples or rollups:
+                self._write_batch(Counter(), samples, rollups, [])
+    
+    def _settle(self, transitions: list):
+        """Forget written (or dropped) transitions unless a newer one was queued meanwhile"""
+        with self._lock:
+            for row in transitions:
+                key = (row['session_id'], row['student_id'])
+                if self._latest_transitions.get(key) == (row['new_status'], row['timestamp']):
+                    del self._latest_transitions[key]
+    
+    def stats(self) -> dict:
+        """Snapshot of queue and flush counters"""
+        with self._lock:
+            depth = len(self._queue)
+            pending_transitions = len(self._transitions)
+        return {
+            'queue_depth': depth,
+            'pending_transitions': pending_transitions,
+            'max_queue': self.max_queue,
+            'enqueued': self.enqueued,
+            'persisted': self.persisted,
+            'samples_written': self.samples_written,
+            'rollups_written': self.rollups_written,
+            'open_buckets': self.rollups.open_buckets(),
+            'dropped': self.dropped,
+            'rejected': self.rejected,
+            'rejected_students': len(self._rejected),
+            'flushes': self.flushes,
+            'failed_flushes': self.failed_flushes,
+            'last_flush_ms': round(self.last_flush_ms, 2),
+            'max_flush_ms': round(self.max_flush_ms, 2),
+            'avg_flush_ms': round(self.total_flush_ms / self.flushes, 2) if self.flushes else 0.0
+        }
+    
+    def _run(self):
+        """Flush on size threshold (wakeup) or every flush_interval seconds"""
+        while not self._stopping.is_set():
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"Ingestion flush error: {e}")
+    
+    def _write_batch(self, updates: Counter, samples: list, rollups: list, transitions: list):
+        """
+        Bulk insert downsampled samples, rollup buckets and status transitions
+        
+        Args:
+            updates: Queued updates behind these rows, per (session_id, student_id)
+        """
+        started = time.perf_counter()
+        try:
+            self._insert(samples, rollups, transitions)
+            self._written(updates, samples, rollups, transitions)
+        except IntegrityError as e:
+            # Unknown session or student ids: retry per student so only their rows are lost
+            print(f"Attention batch refused ({e.orig}), retrying per student")
+            self._write_per_student(updates, samples, rollups, transitions)
+        except Exception as e:
+            self.failed_flushes += 1
+            self.dropped += sum(updates.values())
+            print(f"Failed to persist {sum(updates.values())} attention updates: {e}")
+        
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        self.flushes += 1
+        self.last_flush_ms = elapsed_ms
+        self.total_flush_ms += elapsed_ms
+        self.max_flush_ms = max(self.max_flush_ms, elapsed_ms)
+    
+    def _write_per_student(self, updates: Counter, samples: list, rollups: list, transitions: list):
+        groups = {}
+        for kind, rows in (('samples', samples), ('rollups', rollups), ('transitions', transitions)):
+            for row in rows:
+                group = groups.setdefault((row['session_id'], row['student_id']), {
+                    'samples': [], 'rollups': [], 'transitions': []
+                })
+                group[kind].append(row)
+        for key in updates:
+            groups.setdefault(key, {'samples': [], 'rollups': [], 'transitions': []})
+        
+        for key, rows in groups.items():
+            group_updates = Counter({key: updates[key]}) if key in updates else Counter()
+            try:
+                self._insert(rows['samples'], rows['rollups'], rows['transitions'])
+                self._written(group_updates, rows['samples'], rows['rollups'], rows['transitions'])
+            except IntegrityError:
+                self._reject(*key)
+                self.dropped += updates[key]
+                print(f"Dropping attention data of unknown session/student {key[0]}/{key[1]}")
+            except Exception as e:
+                self.failed_flushes += 1
+                self.dropped += updates[key]
+                print(f"Failed to persist {updates[key]} attention updates: {e}")
+    
+    def _insert(self, samples: list, rollups: list, transitions: list):
+        """One transaction for all rows"""
+        db = SessionLocal()
+        try:
+            if samples:
+                db.execute(insert(AttentionSample), samples)
+            if rollups:
+                db.execute(insert(AttentionRollup), rollups)
+            if transitions:
+                db.execute(insert(StatusTimeline), transitions)
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+    
+    def _written(self, updates: Counter, samples: list, rollups: list, transitions: list):
+        self.persisted += sum(updates.values())
+        self.samples_written += len(samples)
+        self.rollups_written += len(rollups)
+        
+        # Late data for a session makes its cached report responses stale
+        session_ids = {row['session_id'] for row in samples + rollups + transitions}
+        report_cache.invalidate(*(f"session:{session_id}" for session_id in session_ids))
+        if session_ids and self.on_persisted:
+            try:
+                self.on_persisted(session_ids)
+            except Exception as e:
+                print(f"Ingestion listener error: {e}")
+    
+    def _reject(self, session_id: str, student_id: str):
+        """Drop further updates for ids the database refused, and their open buckets"""
+        with self._lock:
+            if len(self._rejected) >= 10000:
+                self._rejected.clear()
+            self._rejected.add((session_id, student_id))
+        self.rollups.discard(session_id, student_id)
+
+ingestor = AttentionIngestor(
+    batch_size=settings.INGEST_BATCH_SIZE,
+    flush_interval=settings.INGEST_FLUSH_INTERVAL,
+    max_queue=settings.INGEST_MAX_QUEUE,
+    rollups=RollupAggregator(settings.SAMPLE_BUCKET_SECONDS, ROLLUP_RESOLUTIONS)
+)
@@ -3,7 +3,7 @@ Database initialization script
 Creates all tables and indexes
 """
 from .database import engine, Base, init_db
-from .models import User, Room, RoomParticipant, AttentionSample, StatusTimeline, TabSwitchEvent, ClassReport
+from .models import User, Room, RoomParticipant, AttentionSample, StatusTimeline, TabSwitchEvent, ClassReport, AttentionRollup
 
 def create_tables():
     """Create all database tables"""
@@ -11,12 +11,8 @@ def create_tables():
     init_db()
     print("Database tables created successfully!")
     
-    # Create indexes
-    print("Creating indexes...")
-    from sqlalchemy import Index
-    
-    # Indexes are already defined in models via index=True
-    # Additional composite indexes can be added here if needed
+    # Single-column indexes come from index=True in the models;
+    # composite indexes are applied by the versioned migrations in init_db
     
     print("Database initialization complete!")
 
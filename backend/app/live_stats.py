@@ -0,0 +1,213 @@
+"""
+Live per-room attention aggregates
+Fed by every ai_update and updated in O(1): per-student running mean and
+time in each status, per-room current average and status histogram.
+Reads come straight from memory, never from the database.
+"""
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, Optional
+from .config import settings
+from .broadcast import teacher_room
+
+class StudentStats:
+    __slots__ = ('samples', 'mean', 'score', 'status', 'status_since', 'time_in_status', 'present')
+    
+    def __init__(self):
+        self.samples = 0
+        self.mean = 0.0
+        self.score = None
+        self.status = None
+        self.status_since = None
+        self.time_in_status: Dict[str, float] = {}
+        self.present = False
+
+class RoomStats:
+    __slots__ = ('students', 'score_sum', 'present', 'status_counts', 'samples', 'mean', 'updated_at')
+    
+    def __init__(self):
+        self.students: Dict[str, StudentStats] = {}
+        # Over students currently present: sum of their latest scores and their current statuses
+        self.score_sum = 0.0
+        self.present = 0
+        self.status_counts: Dict[str, int] = {}
+        # Every update of the session
+        self.samples = 0
+        self.mean = 0.0
+        self.updated_at = None
+
+class LiveStats:
+    def __init__(self, interval: float = 5.0):
+        """
+        Initialize the aggregator
+        
+        Args:
+            interval: Seconds between live_stats socket events
+        """
+        self.interval = interval
+        # Only touched from the event loop
+        self._rooms: Dict[str, RoomStats] = {}
+        self._changed = set()
+        self._running = False
+        # {session_id: teacher_id} of live rooms, so reads can be authorized without the database
+        self._owners: Dict[str, str] = {}
+        # Recently ended sessions (oldest first); updates still in flight for them are ignored
+        self._ended = OrderedDict()
+        self.max_ended = 10000
+    
+    def set_owner(self, session_id: str, teacher_id: str):
+        """Remember the teacher a live room belongs to"""
+        if session_id not in self._ended:
+            self._owners[session_id] = teacher_id
+    
+    def is_ended(self, session_id: str) -> bool:
+        """Whether this worker saw the session end"""
+        return session_id in self._ended
+    
+    def owner(self, session_id: str) -> Optional[str]:
+        """Teacher of a live room, if known to this worker"""
+        return self._owners.get(session_id)
+    
+    def update(self, session_id: str, student_id: str, attention_score: float, status: str, timestamp: datetime):
+        """Fold one result into the student's and the room's aggregates"""
+        room = self._rooms.get(session_id)
+        if room is None:
+            if session_id in self._ended:
+                return
+            room = self._rooms[session_id] = RoomStats()
+        student = room.students.get(student_id)
+        if student is None:
+            student = room.students[student_id] = StudentStats()
+        
+        # Running means (Welford style, no stored samples)
+        student.samples += 1
+        student.mean += (attention_score - student.mean) / student.samples
+        room.samples += 1
+        room.mean += (attention_score - room.mean) / room.samples
+        
+        if student.present:
+            room.score_sum += attention_score - student.score
+            if status != student.status:
+                self._close_status(student, timestamp)
+                self._count(room, student.status, -1)
+                self._count(room, status, 1)
+                student.status, student.status_since = status, timestamp
+        else:
+            student.present = True
+            room.present += 1
+            room.score_sum += attention_score
+            self._count(room, status, 1)
+            student.status, student.status_since = status, timestamp
+        
+        student.score = attention_score
+        room.updated_at = timestamp
+        self._changed.add(session_id)
+    
+    def leave(self, session_id: str, student_id: str, timestamp: Optional[datetime] = None):
+        """Take a student out of the room's current figures; their history is kept"""
+        room = self._rooms.get(session_id)
+        student = room.students.get(student_id) if room else None
+        if student is None or not student.present:
+            return
+        self._close_status(student, timestamp or datetime.utcnow())
+        self._count(room, student.status, -1)
+        room.score_sum -= student.score
+        room.present -= 1
+        student.present = False
+        student.status = student.status_since = None
+        self._changed.add(session_id)
+    
+    def drop_session(self, session_id: str):
+        """Forget an ended session and ignore its late updates"""
+        self._rooms.pop(session_id, None)
+        self._owners.pop(session_id, None)
+        self._changed.discard(session_id)
+        self._ended[session_id] = True
+        while len(self._ended) > self.max_ended:
+            self._ended.popitem(last=False)
+    
+    def snapshot(self, session_id: str, now: Optional[datetime] = None) -> Optional[dict]:
+        """Current aggregates of a room, or None if it has received no updates"""
+        room = self._rooms.get(session_id)
+        if room is None:
+            return None
+        now = now or datetime.utcnow()
+        
+        students = {}
+        for student_id, student in room.students.items():
+            time_in_status = dict(student.time_in_status)
+            if student.present:
+                # Include the ongoing status up to now
+                ongoing = max(0.0, (now - student.status_since).total_seconds())
+                time_in_status[student.status] = time_in_status.get(student.status, 0.0) + ongoing
+            students[student_id] = {
+                'present': student.present,
+                'attention_score': student.score,
+                'status': student.status,
+                'mean_attention': round(student.mean, 1),
+                'samples': student.samples,
+                'time_in_status': {status: round(seconds, 1) for status, seconds in time_in_status.items()}
+            }
+        
+        return {
+            'session_id': session_id,
+            'present': room.present,
+            'current_average': round(room.score_sum / room.present, 1) if room.present else None,
+            'session_mean': round(room.mean, 1),
+            'samples': room.samples,
+            'status_counts': dict(room.status_counts),
+            'students': students,
+            'updated_at': room.updated_at
+        }
+    
+    def _close_status(self, student: StudentStats, timestamp: datetime):
+        elapsed = max(0.0, (timestamp - student.status_since).total_seconds())
+        student.time_in_status[student.status] = student.time_in_status.get(student.status, 0.0) + elapsed
+    
+    def _count(self, room: RoomStats, status: str, delta: int):
+        count = room.status_counts.get(status, 0) + delta
+        if count:
+            room.status_counts[status] = count
+        else:
+            room.status_counts.pop(status, None)
+    
+    async def flush(self, sio):
+        """Send live_stats to the teachers of every room that changed"""
+        changed, self._changed = self._changed, set()
+        now = datetime.utcnow()
+        for session_id in changed:
+            stats = self.snapshot(session_id, now)
+            if stats is None:
+                continue
+            stats['updated_at'] = stats['updated_at'].isoformat() if stats['updated_at'] else None
+            await sio.emit('live_stats', stats, room=teacher_room(session_id))
+    
+    def start(self, sio):
+        """Run the periodic live_stats event as a Socket.IO background task"""
+        if self._running:
+            return
+        self._running = True
+        sio.start_background_task(self._run, sio)
+    
+    def stop(self):
+        """Stop after the current tick"""
+        self._running = False
+    
+    async def _run(self, sio):
+        while self._running:
+            await sio.sleep(self.interval)
+            try:
+                await self.flush(sio)
+            except Exception as e:
+                print(f"Live stats broadcast error: {e}")
+    
+    def stats(self) -> dict:
+        """Aggregator size for metrics"""
+        return {
+            'interval': self.interval,
+            'rooms': len(self._rooms),
+            'ended': len(self._ended),
+            'students': sum(len(room.students) for room in self._rooms.values())
+        }
+
+live_stats = LiveStats(settings.LIVE_STATS_INTERVAL)
@@ -2,9 +2,19 @@ from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 import socketio
 import os
-from .database import init_db
+from .config import settings
+from .database import init_db, async_engine
 from .routers import auth, room, reports
 from .websocket import register_socket_events
+from .ingestion import ingestor
+from .status_cache import status_cache
+from .user_cache import user_cache
+from .presence import presence
+from .broadcast import broadcaster
+from .live_stats import live_stats
+from .class_reports import report_jobs
+from .password_hashing import password_hasher
+from .response_cache import report_cache
 
 app = FastAPI(title="FocusMate API", version="1.0.0")
 
@@ -48,9 +58,16 @@ for route in app.routes:
         print(f"  {route.methods} {route.path}")
 
 # Socket.IO server
+# With REDIS_URL set, emits to rooms and sids reach clients connected to any worker
+client_manager = None
+if settings.REDIS_URL:
+    client_manager = socketio.AsyncRedisManager(settings.REDIS_URL, channel=f"{settings.REDIS_KEY_PREFIX}:socketio")
+    print("📡 Socket.IO message queue: Redis")
+
 sio = socketio.AsyncServer(
     async_mode='asgi',
-    cors_allowed_origins=allowed_origins
+    cors_allowed_origins=allowed_origins,
+    client_manager=client_manager
 )
 
 # Register WebSocket events
@@ -63,8 +80,23 @@ async def startup_event():
     """Initialize database on startup"""
     init_db()
     print("Database initialized")
+    ingestor.start()
+    print("Attention ingestion started")
+    broadcaster.start(sio)
+    live_stats.start(sio)
+    presence.start(sio)
     print("WebSocket server ready")
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Flush queued attention samples before exit"""
+    broadcaster.stop()
+    live_stats.stop()
+    presence.stop()
+    ingestor.stop()
+    print("Attention ingestion flushed")
+    await async_engine.dispose()
+
 @app.get("/")
 async def root():
     return {"message": "FocusMate API", "status": "running"}
@@ -72,3 +104,18 @@ async def root():
 @app.get("/health")
 async def health():
     return {"status": "healthy"}
+
+@app.get("/metrics")
+async def metrics():
+    """Internal counters for the real-time pipeline"""
+    return {
+        "ingestion": ingestor.stats(),
+        "status_cache": status_cache.stats(),
+        "user_cache": user_cache.stats(),
+        "presence": await presence.stats(),
+        "broadcast": broadcaster.stats(),
+        "live_stats": live_stats.stats(),
+        "report_jobs": report_jobs.stats(),
+        "password_hashing": password_hasher.stats(),
+        "report_cache": report_cache.stats()
+    }
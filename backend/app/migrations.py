@@ -0,0 +1,198 @@
+"""
+Versioned schema migrations
+create_all only creates missing tables, so changes to existing tables
+(indexes first of all) are applied here, once, in version order. Applied
+versions are recorded in schema_migrations.
+
+Check that the hot queries use their indexes: python -m app.migrations --explain
+(the statements are built by the app's own query functions, see hot_queries;
+tests/test_migrations.py runs the same check)
+"""
+import sys
+from datetime import datetime
+from typing import List
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.expression import ClauseElement, Executable
+
+# (version, description, statements); append only, never edit an applied migration.
+# A statement is SQL, or (dialect name, SQL) to run on that backend only.
+MIGRATIONS = [
+    (1, "composite indexes for per-student lookups and the teacher session list", [
+        "CREATE INDEX IF NOT EXISTS ix_attention_samples_session_student_time "
+        "ON attention_samples (session_id, student_id, timestamp)",
+        "CREATE INDEX IF NOT EXISTS ix_status_timeline_session_student_time "
+        "ON status_timeline (session_id, student_id, timestamp)",
+        "CREATE INDEX IF NOT EXISTS ix_tab_switch_events_session_student "
+        "ON tab_switch_events (session_id, student_id)",
+        "CREATE INDEX IF NOT EXISTS ix_room_participants_room_student "
+        "ON room_participants (room_id, student_id)",
+        "CREATE INDEX IF NOT EXISTS ix_rooms_teacher_start "
+        "ON rooms (teacher_id, start_time, id)",
+        "CREATE INDEX IF NOT EXISTS ix_class_reports_session "
+        "ON class_reports (session_id)",
+    ]),
+    (2, "composite index for rollup reads by session, tier and student", [
+        "CREATE INDEX IF NOT EXISTS ix_attention_rollups_session_resolution_student "
+        "ON attention_rollups (session_id, resolution, student_id, bucket_start)",
+    ]),
+    (3, "one text format for rooms.start_time on SQLite, so keyset cursors compare correctly", [
+        # CURRENT_TIMESTAMP defaults were stored without the microseconds SQLAlchemy writes
+        ("sqlite", "UPDATE rooms SET start_time = start_time || '.000000' WHERE length(start_time) = 19"),
+    ]),
+    (4, "one ClassReport per session, so report generation can upsert", [
+        # Keep the latest report of each session
+        "DELETE FROM class_reports WHERE EXISTS ("
+        "SELECT 1 FROM class_reports newer WHERE newer.session_id = class_reports.session_id "
+        "AND (newer.generated_at > class_reports.generated_at "
+        "OR (newer.generated_at = class_reports.generated_at AND newer.id > class_reports.id)))",
+        "DROP INDEX IF EXISTS ix_class_reports_session",
+        "CREATE UNIQUE INDEX IF NOT EXISTS ix_class_reports_session ON class_reports (session_id)",
+    ]),
+]
+
+# pg_advisory_lock key held while a worker applies migrations
+MIGRATION_LOCK_KEY = 7146389201
+
+def _create_version_table(conn):
+    conn.execute(text(
+        "CREATE TABLE IF NOT EXISTS schema_migrations ("
+        "version INTEGER PRIMARY KEY, description VARCHAR NOT NULL, applied_at TIMESTAMP NOT NULL)"
+    ))
+
+def run_migrations(engine: Engine) -> List[int]:
+    """
+    Apply pending migrations, each in its own transaction; returns the versions applied
+    
+    Workers starting together apply each migration once: PostgreSQL holds an advisory
+    lock for the run, SQLite takes its write lock (BEGIN IMMEDIATE) per migration, and
+    every version is re-checked under the lock.
+    """
+    applied = []
+    with engine.connect() as conn:
+        postgres = conn.dialect.name == "postgresql"
+        if postgres:
+            conn.execute(text("SELECT pg_advisory_lock(:key)"), {'key': MIGRATION_LOCK_KEY})
+            conn.commit()
+        try:
+            _begin(conn)
+            _create_version_table(conn)
+            conn.commit()
+            for version, description, statements in MIGRATIONS:
+                _begin(conn)
+                try:
+                    done = conn.execute(
+                        text("SELECT 1 FROM schema_migrations WHERE version = :v"), {'v': version}
+                    ).first()
+                    if not done:
+                        for statement in statements:
+                            if isinstance(statement, tuple):
+                                dialect, statement = statement
+                                if dialect != conn.dialect.name:
+                                    continue
+                            conn.execute(text(statement))
+                        conn.execute(
+                            text("INSERT INTO schema_migrations (version, description, applied_at) VALUES (:v, :d, :t)"),
+                            {'v': version, 'd': description, 't': datetime.utcnow()}
+                        )
+                    conn.commit()
+                except Exception:
+                    conn.rollback()
+                    raise
+                if not done:
+                    applied.append(version)
+                    print(f"Applied migration {version}: {description}")
+        finally:
+            if postgres:
+                conn.execute(text("SELECT pg_advisory_unlock(:key)"), {'key': MIGRATION_LOCK_KEY})
+                conn.commit()
+    return applied
+
+def _begin(conn):
+    """Open the next transaction; on SQLite with the write lock, so concurrent workers queue up"""
+    if conn.dialect.name == "sqlite":
+        conn.exec_driver_sql("BEGIN IMMEDIATE")
+
+class Explain(Executable, ClauseElement):
+    """EXPLAIN (SQLite: EXPLAIN QUERY PLAN) of a statement, with its parameters bound as usual"""
+    inherit_cache = False
+    
+    def __init__(self, statement):
+        self.statement = statement
+
+@compiles(Explain)
+def _compile_explain(element, compiler, **kw):
+    prefix = "EXPLAIN QUERY PLAN " if compiler.dialect.name == "sqlite" else "EXPLAIN "
+    sql = compiler.process(element.statement, **kw)
+    # The rows are plan lines, not the statement's columns: no result type processing
+    compiler._result_columns = []
+    return prefix + sql
+
+def hot_queries() -> list:
+    """(label, statement, index it should use) for the hot queries, built by the same functions the app runs"""
+    from .class_reports import (
+        rollup_totals_query, tail_samples_query, curve_rollups_query, stored_report_query
+    )
+    from .exports import export_query
+    from .status_cache import last_status_query
+    from .routers.reports import teacher_sessions_query, participant_query, student_tab_switches_query
+    from .routers.room import active_participant_query
+    
+    session, student, teacher = 'explain-session', 'explain-student', 'explain-teacher'
+    resolution = 60
+    return [
+        ("last status of a student", last_status_query(session, student),
+         "ix_status_timeline_session_student_time"),
+        ("samples export", export_query(session, 'samples'),
+         "ix_attention_samples_session_student_time"),
+        ("timeline export", export_query(session, 'timeline'),
+         "ix_status_timeline_session_student_time"),
+        ("rollup totals of a student", rollup_totals_query([session], student, resolution),
+         "ix_attention_rollups_session_resolution_student"),
+        ("per-student rollup totals", rollup_totals_query([session], None, resolution),
+         "ix_attention_rollups_session_resolution_student"),
+        ("samples after the rollups", tail_samples_query([session], {(session, student): datetime.utcnow()}),
+         "ix_attention_samples_session_student_time"),
+        ("attention curve", curve_rollups_query(session, resolution),
+         "ix_attention_rollups_session_resolution_student"),
+        ("tab switches of a student", student_tab_switches_query(session, student),
+         "ix_tab_switch_events_session_student"),
+        ("participant lookup", active_participant_query(session, student),
+         "ix_room_participants_room_student"),
+        ("curve access check", participant_query(session, student),
+         "ix_room_participants_room_student"),
+        ("teacher session list", teacher_sessions_query(teacher, 21, (datetime.utcnow(), session)),
+         "ix_rooms_teacher_start"),
+        ("stored report", stored_report_query(session),
+         "ix_class_reports_session"),
+    ]
+
+def explain(conn, statement) -> str:
+    """Query plan as text"""
+    rows = conn.execute(Explain(statement)).fetchall()
+    # The plan text is the last column on both backends
+    return "\n".join(str(row[-1]) for row in rows)
+
+def check_indexes(engine: Engine) -> bool:
+    """EXPLAIN every hot query and report whether it uses its index"""
+    ok = True
+    with engine.connect() as conn:
+        if conn.dialect.name == "postgresql":
+            # Small tables are always seq scanned; ask which index the planner would pick
+            conn.execute(text("SET enable_seqscan = off"))
+        
+        for label, statement, index in hot_queries():
+            plan = explain(conn, statement)
+            uses_index = index in plan
+            ok = ok and uses_index
+            print(f"{'OK     ' if uses_index else 'MISSING'} {label}: {index}")
+            if not uses_index:
+                print("        " + plan.replace("\n", "\n        "))
+    return ok
+
+if __name__ == "__main__":
+    from .database import engine, init_db
+    init_db()
+    if "--explain" in sys.argv:
+        sys.exit(0 if check_indexes(engine) else 1)
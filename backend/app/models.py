@@ -2,6 +2,7 @@ from sqlalchemy import Column, String, DateTime, Boolean, Float, Integer, Foreig
 from sqlalchemy.sql import func
 from .database import Base
 import uuid
+from datetime import datetime
 
 def generate_uuid():
     return str(uuid.uuid4())
@@ -22,7 +23,8 @@ class Room(Base):
     id = Column(String, primary_key=True, default=generate_uuid)
     room_code = Column(String, unique=True, nullable=False, index=True)
     teacher_id = Column(String, ForeignKey("users.id"), nullable=False)
-    start_time = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
+    # Written by the app (like end_time) so SQLite stores one text format and keyset cursors compare correctly
+    start_time = Column(DateTime(timezone=True), nullable=False, default=datetime.utcnow, server_default=func.now())
     end_time = Column(DateTime(timezone=True), nullable=True)
     lock_mode_enabled = Column(Boolean, default=False)
     is_active = Column(Boolean, default=True)
@@ -77,3 +79,17 @@ class ClassReport(Base):
     student_count = Column(Integer, nullable=False)
     average_attention = Column(Float, nullable=False)
     report_data = Column(Text, nullable=False)  # JSON string
+
+class AttentionRollup(Base):
+    __tablename__ = "attention_rollups"
+    
+    id = Column(String, primary_key=True, default=generate_uuid)
+    session_id = Column(String, ForeignKey("rooms.id"), nullable=False, index=True)
+    student_id = Column(String, ForeignKey("users.id"), nullable=False)
+    resolution = Column(Integer, nullable=False)  # bucket width in seconds
+    bucket_start = Column(DateTime(timezone=True), nullable=False)
+    sample_count = Column(Integer, nullable=False)
+    mean_score = Column(Float, nullable=False)
+    min_score = Column(Float, nullable=False)
+    max_score = Column(Float, nullable=False)
+    last_status = Column(String, nullable=False)
@@ -0,0 +1,92 @@
+"""
+bcrypt hashing off the event loop
+Hashes run in a bounded thread pool (bcrypt releases the GIL, so logins
+use every core) behind an admission limit, so a login burst queues
+briefly or is turned away instead of stalling live classrooms
+"""
+import asyncio
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Tuple
+from passlib.context import CryptContext
+from .config import settings
+
+# Hashes made with other rounds still verify, and are flagged for rehash
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=settings.BCRYPT_ROUNDS)
+
+class HasherBusy(Exception):
+    """Raised when the admission limit is reached"""
+
+class PasswordHasher:
+    def __init__(self, workers: int = 0, max_pending: int = 256):
+        """
+        Initialize the hasher
+        
+        Args:
+            workers: Hashing threads (0 = one per CPU core)
+            max_pending: Hashes queued or running before new ones are rejected
+        """
+        self.workers = workers or os.cpu_count() or 1
+        self.max_pending = max_pending
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="bcrypt")
+        
+        # Only touched from the event loop
+        self.pending = 0
+        self.peak_pending = 0
+        
+        # Counters
+        self.completed = 0
+        self.rejected = 0
+        self.rehashed = 0
+        self.wait_seconds = 0.0
+        self.hash_seconds = 0.0
+    
+    async def _run(self, fn, *args):
+        if self.pending >= self.max_pending:
+            self.rejected += 1
+            raise HasherBusy()
+        self.pending += 1
+        self.peak_pending = max(self.peak_pending, self.pending)
+        queued_at = time.perf_counter()
+        
+        def timed():
+            started_at = time.perf_counter()
+            result = fn(*args)
+            return result, started_at, time.perf_counter()
+        
+        try:
+            result, started_at, finished_at = await asyncio.get_running_loop().run_in_executor(self._executor, timed)
+        finally:
+            self.pending -= 1
+        self.completed += 1
+        self.wait_seconds += started_at - queued_at
+        self.hash_seconds += finished_at - started_at
+        return result
+    
+    async def hash(self, password: str) -> str:
+        """Hash a new password"""
+        return await self._run(pwd_context.hash, password)
+    
+    async def verify_and_update(self, password: str, password_hash: str) -> Tuple[bool, Optional[str]]:
+        """Verify a password; also returns a new hash when the stored one uses outdated parameters"""
+        valid, new_hash = await self._run(pwd_context.verify_and_update, password, password_hash)
+        if new_hash:
+            self.rehashed += 1
+        return valid, new_hash
+    
+    def stats(self) -> dict:
+        """Pool and queue counters for metrics"""
+        return {
+            'workers': self.workers,
+            'pending': self.pending,
+            'peak_pending': self.peak_pending,
+            'max_pending': self.max_pending,
+            'completed': self.completed,
+            'rejected': self.rejected,
+            'rehashed': self.rehashed,
+            'avg_wait_ms': round(self.wait_seconds / self.completed * 1000, 1) if self.completed else 0.0,
+            'avg_hash_ms': round(self.hash_seconds / self.completed * 1000, 1) if self.completed else 0.0
+        }
+
+password_hasher = PasswordHasher(settings.HASH_WORKERS, settings.HASH_MAX_PENDING)
@@ -0,0 +1,431 @@
+"""
+Presence registry for live classroom sessions
+Tracks which socket each user is connected from in each session, with a
+reverse index so disconnects and targeted sends never scan other sessions.
+The in-memory store serves a single worker; the Redis store is shared by
+every worker behind the Socket.IO message queue.
+"""
+import uuid
+from abc import ABC, abstractmethod
+from typing import Dict, List, Optional, Tuple
+from .config import settings
+
+class PresenceStore(ABC):
+    """
+    Interface of a presence store (all methods are coroutines)
+    
+    join/leave/disconnect/drop_session must be atomic per call, since
+    several workers may update the same session concurrently.
+    """
+    
+    @abstractmethod
+    async def join(self, session_id: str, user_id: str, sid: str, role: Optional[str] = None) -> Optional[str]:
+        """
+        Record that a user joined a session from a socket
+        
+        Returns:
+            The user's previous sid in this session if it was replaced (e.g. a reconnect), else None
+        """
+    
+    @abstractmethod
+    async def leave(self, session_id: str, user_id: str) -> Optional[str]:
+        """Remove a user from one session. Returns the sid they were joined from."""
+    
+    @abstractmethod
+    async def disconnect(self, sid: str) -> Tuple[Optional[str], List[str]]:
+        """
+        Remove a socket from every session it joined
+        
+        Returns:
+            Tuple of (user_id, session ids the user was present in from this socket)
+        """
+    
+    @abstractmethod
+    async def drop_session(self, session_id: str) -> Dict[str, str]:
+        """Forget an ended session. Returns its {user_id: sid} map."""
+    
+    @abstractmethod
+    async def sid_for(self, session_id: str, user_id: str) -> Optional[str]:
+        """Socket a user is connected from in a session, if present"""
+    
+    @abstractmethod
+    async def users(self, session_id: str) -> Dict[str, str]:
+        """Copy of a session's {user_id: sid} map"""
+    
+    @abstractmethod
+    async def count(self, session_id: str, role: Optional[str] = None) -> int:
+        """Number of users present in a session, optionally of one role"""
+    
+    @abstractmethod
+    async def room_counts(self) -> Dict[str, int]:
+        """{session_id: users present} for every live session"""
+    
+    @abstractmethod
+    async def stats(self) -> dict:
+        """Registry sizes for metrics"""
+    
+    def start(self, sio):
+        """Start background upkeep, if the store needs any"""
+    
+    def stop(self):
+        """Stop background upkeep"""
+
+class MemoryPresenceStore(PresenceStore):
+    def __init__(self):
+        """Initialize empty maps (only touched from the event loop, so no lock)"""
+        # Forward: {session_id: {user_id: sid}}
+        self._sessions: Dict[str, Dict[str, str]] = {}
+        # Reverse: {sid: (user_id, {session_id})}
+        self._sids: Dict[str, tuple] = {}
+        # {sid: role} for per-role room counts
+        self._roles: Dict[str, Optional[str]] = {}
+    
+    async def join(self, session_id: str, user_id: str, sid: str, role: Optional[str] = None) -> Optional[str]:
+        users = self._sessions.setdefault(session_id, {})
+        previous = users.get(user_id)
+        users[user_id] = sid
+        
+        entry = self._sids.get(sid)
+        if entry is None:
+            entry = (user_id, set())
+            self._sids[sid] = entry
+        entry[1].add(session_id)
+        self._roles[sid] = role
+        
+        if previous is not None and previous != sid:
+            self._forget_session(previous, session_id)
+            return previous
+        return None
+    
+    async def leave(self, session_id: str, user_id: str) -> Optional[str]:
+        users = self._sessions.get(session_id)
+        if not users:
+            return None
+        sid = users.pop(user_id, None)
+        if not users:
+            del self._sessions[session_id]
+        if sid is not None:
+            self._forget_session(sid, session_id)
+        return sid
+    
+    async def disconnect(self, sid: str) -> Tuple[Optional[str], List[str]]:
+        entry = self._sids.pop(sid, None)
+        self._roles.pop(sid, None)
+        if entry is None:
+            return None, []
+        
+        user_id, session_ids = entry
+        left = []
+        for session_id in session_ids:
+            users = self._sessions.get(session_id)
+            # Only if the user has not rejoined from a newer socket meanwhile
+            if users and users.get(user_id) == sid:
+                del users[user_id]
+                if not users:
+                    del self._sessions[session_id]
+                left.append(session_id)
+        return user_id, left
+    
+    async def drop_session(self, session_id: str) -> Dict[str, str]:
+        users = self._sessions.pop(session_id, {})
+        for sid in users.values():
+            self._forget_session(sid, session_id)
+        return users
+    
+    async def sid_for(self, session_id: str, user_id: str) -> Optional[str]:
+        users = self._sessions.get(session_id)
+        return users.get(user_id) if users else None
+    
+    async def users(self, session_id: str) -> Dict[str, str]:
+        return dict(self._sessions.get(session_id, {}))
+    
+    async def count(self, session_id: str, role: Optional[str] = None) -> int:
+        users = self._sessions.get(session_id)
+        if not users:
+            return 0
+        if role is None:
+            return len(users)
+        return sum(1 for sid in users.values() if self._roles.get(sid) == role)
+    
+    async def room_counts(self) -> Dict[str, int]:
+        return {session_id: len(users) for session_id, users in self._sessions.items()}
+    
+    async def stats(self) -> dict:
+        return {
+            'backend': 'memory',
+            'sessions': len(self._sessions),
+            'sockets': len(self._sids),
+            'users_present': sum(len(users) for users in self._sessions.values()),
+            'room_counts': await self.room_counts()
+        }
+    
+    def _forget_session(self, sid: str, session_id: str):
+        """Drop one session from a socket's reverse entry"""
+        entry = self._sids.get(sid)
+        if entry is None:
+            return
+        entry[1].discard(session_id)
+        if not entry[1]:
+            del self._sids[sid]
+            self._roles.pop(sid, None)
+
+# Redis layout, under a common prefix:
+#   {prefix}:session:{session_id}   hash user_id -> sid
+#   {prefix}:sid:{sid}              hash user_id, role
+#   {prefix}:sid:{sid}:sessions     set of session ids joined from the socket
+#   {prefix}:sessions               set of live session ids
+#   {prefix}:worker:{worker_id}     alive marker, expires unless the worker heartbeats
+#   {prefix}:worker:{worker_id}:sids  set of sockets connected to the worker
+#   {prefix}:workers                set of worker ids that have heartbeated
+# Each mutation is one Lua script so concurrent workers see it atomically.
+
+_JOIN = """
+local prefix, session_id, user_id, sid, role, worker_id = ARGV[1], ARGV[2], ARGV[3], ARGV[4], ARGV[5], ARGV[6]
+local session_key = prefix .. ':session:' .. session_id
+local previous = redis.call('HGET', session_key, user_id)
+redis.call('HSET', session_key, user_id, sid)
+redis.call('HSET', prefix .. ':sid:' .. sid, 'user_id', user_id, 'role', role)
+redis.call('SADD', prefix .. ':sid:' .. sid .. ':sessions', session_id)
+redis.call('SADD', prefix .. ':sessions', session_id)
+redis.call('SADD', prefix .. ':worker:' .. worker_id .. ':sids', sid)
+if previous and previous ~= sid then
+    local previous_sessions = prefix .. ':sid:' .. previous .. ':sessions'
+    redis.call('SREM', previous_sessions, session_id)
+    if redis.call('SCARD', previous_sessions) == 0 then
+        redis.call('DEL', prefix .. ':sid:' .. previous)
+    end
+    return previous
+end
+return false
+"""
+
+_LEAVE = """
+local prefix, session_id, user_id = ARGV[1], ARGV[2], ARGV[3]
+local session_key = prefix .. ':session:' .. session_id
+local sid = redis.call('HGET', session_key, user_id)
+if not sid then
+    return false
+end
+redis.call('HDEL', session_key, user_id)
+if redis.call('HLEN', session_key) == 0 then
+    redis.call('SREM', prefix .. ':sessions', session_id)
+end
+local sid_sessions = prefix .. ':sid:' .. sid .. ':sessions'
+redis.call('SREM', sid_sessions, session_id)
+if redis.call('SCARD', sid_sessions) == 0 then
+    redis.call('DEL', prefix .. ':sid:' .. sid)
+end
+return sid
+"""
+
+# Removes a socket from every session it joined; appends those session ids to left
+_REMOVE_SID = """
+local function remove_sid(prefix, sid, left)
+    local sid_key = prefix .. ':sid:' .. sid
+    local user_id = redis.call('HGET', sid_key, 'user_id')
+    local session_ids = redis.call('SMEMBERS', sid_key .. ':sessions')
+    redis.call('DEL', sid_key, sid_key .. ':sessions')
+    if not user_id then
+        return false
+    end
+    for _, session_id in ipairs(session_ids) do
+        local session_key = prefix .. ':session:' .. session_id
+        if redis.call('HGET', session_key, user_id) == sid then
+            redis.call('HDEL', session_key, user_id)
+            if redis.call('HLEN', session_key) == 0 then
+                redis.call('SREM', prefix .. ':sessions', session_id)
+            end
+            table.insert(left, session_id)
+        end
+    end
+    return user_id
+end
+"""
+
+_DISCONNECT = _REMOVE_SID + """
+local prefix, sid, worker_id = ARGV[1], ARGV[2], ARGV[3]
+redis.call('SREM', prefix .. ':worker:' .. worker_id .. ':sids', sid)
+local left = {}
+local user_id = remove_sid(prefix, sid, left)
+if not user_id then
+    return {}
+end
+return {user_id, left}
+"""
+
+# Sockets of a worker whose alive marker expired (crashed or killed); flat user_id, session_id pairs
+_REAP = _REMOVE_SID + """
+local prefix, worker_id = ARGV[1], ARGV[2]
+local worker_key = prefix .. ':worker:' .. worker_id
+if redis.call('EXISTS', worker_key) == 1 then
+    return {}
+end
+local gone = {}
+for _, sid in ipairs(redis.call('SMEMBERS', worker_key .. ':sids')) do
+    local left = {}
+    local user_id = remove_sid(prefix, sid, left)
+    if user_id then
+        for _, session_id in ipairs(left) do
+            table.insert(gone, user_id)
+            table.insert(gone, session_id)
+        end
+    end
+end
+redis.call('DEL', worker_key .. ':sids')
+redis.call('SREM', prefix .. ':workers', worker_id)
+return gone
+"""
+
+_DROP_SESSION = """
+local prefix, session_id = ARGV[1], ARGV[2]
+local session_key = prefix .. ':session:' .. session_id
+local members = redis.call('HGETALL', session_key)
+redis.call('DEL', session_key)
+redis.call('SREM', prefix .. ':sessions', session_id)
+for i = 2, #members, 2 do
+    local sid_sessions = prefix .. ':sid:' .. members[i] .. ':sessions'
+    redis.call('SREM', sid_sessions, session_id)
+    if redis.call('SCARD', sid_sessions) == 0 then
+        redis.call('DEL', prefix .. ':sid:' .. members[i])
+    end
+end
+return members
+"""
+
+_COUNT_ROLE = """
+local prefix, session_id, role = ARGV[1], ARGV[2], ARGV[3]
+local count = 0
+for _, sid in ipairs(redis.call('HVALS', prefix .. ':session:' .. session_id)) do
+    if redis.call('HGET', prefix .. ':sid:' .. sid, 'role') == role then
+        count = count + 1
+    end
+end
+return count
+"""
+
+class RedisPresenceStore(PresenceStore):
+    def __init__(self, client, prefix: str = 'focusmate:presence', ttl: float = 30.0,
+                 worker_id: Optional[str] = None):
+        """
+        Initialize the store
+        
+        Args:
+            client: redis.asyncio.Redis created with decode_responses=True (or a compatible
+                stand-in such as fakeredis.aioredis.FakeRedis)
+            prefix: Key prefix shared by every worker of one deployment
+            ttl: Seconds without a heartbeat after which a worker's sockets are removed
+            worker_id: Identifies this worker's sockets (a new one per process by default)
+        """
+        self.client = client
+        self.prefix = prefix
+        self.ttl = ttl
+        self.worker_id = worker_id or uuid.uuid4().hex
+        self._running = False
+        self.reaped = 0
+        self._join = client.register_script(_JOIN)
+        self._leave = client.register_script(_LEAVE)
+        self._disconnect = client.register_script(_DISCONNECT)
+        self._drop_session = client.register_script(_DROP_SESSION)
+        self._count_role = client.register_script(_COUNT_ROLE)
+        self._reap = client.register_script(_REAP)
+    
+    async def join(self, session_id: str, user_id: str, sid: str, role: Optional[str] = None) -> Optional[str]:
+        previous = await self._join(args=[self.prefix, session_id, user_id, sid, role or '', self.worker_id])
+        return previous or None
+    
+    async def leave(self, session_id: str, user_id: str) -> Optional[str]:
+        return await self._leave(args=[self.prefix, session_id, user_id]) or None
+    
+    async def disconnect(self, sid: str) -> Tuple[Optional[str], List[str]]:
+        result = await self._disconnect(args=[self.prefix, sid, self.worker_id])
+        if not result:
+            return None, []
+        user_id, left = result
+        return user_id, list(left)
+    
+    async def drop_session(self, session_id: str) -> Dict[str, str]:
+        members = await self._drop_session(args=[self.prefix, session_id])
+        return dict(zip(members[::2], members[1::2]))
+    
+    async def sid_for(self, session_id: str, user_id: str) -> Optional[str]:
+        return await self.client.hget(f"{self.prefix}:session:{session_id}", user_id)
+    
+    async def users(self, session_id: str) -> Dict[str, str]:
+        return await self.client.hgetall(f"{self.prefix}:session:{session_id}")
+    
+    async def count(self, session_id: str, role: Optional[str] = None) -> int:
+        if role is None:
+            return await self.client.hlen(f"{self.prefix}:session:{session_id}")
+        return await self._count_role(args=[self.prefix, session_id, role])
+    
+    async def room_counts(self) -> Dict[str, int]:
+        session_ids = list(await self.client.smembers(f"{self.prefix}:sessions"))
+        pipe = self.client.pipeline(transaction=False)
+        for session_id in session_ids:
+            pipe.hlen(f"{self.prefix}:session:{session_id}")
+        return dict(zip(session_ids, await pipe.execute()))
+    
+    async def stats(self) -> dict:
+        counts = await self.room_counts()
+        return {
+            'backend': 'redis',
+            'worker_id': self.worker_id,
+            'workers': await self.client.scard(f"{self.prefix}:workers"),
+            'reaped': self.reaped,
+            'sessions': len(counts),
+            'users_present': sum(counts.values()),
+            'room_counts': counts
+        }
+    
+    async def heartbeat(self) -> List[Tuple[str, str]]:
+        """
+        Mark this worker alive, then remove the sockets of workers whose marker expired
+        
+        Returns:
+            (user_id, session_id) pairs that were removed
+        """
+        pipe = self.client.pipeline(transaction=False)
+        pipe.set(f"{self.prefix}:worker:{self.worker_id}", 1, px=int(self.ttl * 1000))
+        pipe.sadd(f"{self.prefix}:workers", self.worker_id)
+        await pipe.execute()
+        
+        gone = []
+        for worker_id in await self.client.smembers(f"{self.prefix}:workers"):
+            if worker_id == self.worker_id:
+                continue
+            result = await self._reap(args=[self.prefix, worker_id])
+            gone.extend(zip(result[::2], result[1::2]))
+        self.reaped += len(gone)
+        return gone
+    
+    def start(self, sio):
+        """Heartbeat as a Socket.IO background task, telling rooms about users of dead workers"""
+        if self._running:
+            return
+        self._running = True
+        sio.start_background_task(self._run, sio)
+    
+    def stop(self):
+        """Stop after the current tick"""
+        self._running = False
+    
+    async def _run(self, sio):
+        while self._running:
+            try:
+                for user_id, session_id in await self.heartbeat():
+                    await sio.emit('student_left', {
+                        'user_id': user_id,
+                        'session_id': session_id
+                    }, room=session_id)
+            except Exception as e:
+                print(f"Presence heartbeat error: {e}")
+            await sio.sleep(self.ttl / 3)
+
+def create_presence_store(redis_url: str = '', prefix: str = 'focusmate:presence', ttl: float = 30.0) -> PresenceStore:
+    """In-memory store for a single worker, Redis store when a URL is configured"""
+    if not redis_url:
+        return MemoryPresenceStore()
+    from redis import asyncio as aioredis
+    return RedisPresenceStore(aioredis.from_url(redis_url, decode_responses=True), prefix, ttl)
+
+presence = create_presence_store(settings.REDIS_URL, f"{settings.REDIS_KEY_PREFIX}:presence", settings.PRESENCE_TTL)
@@ -0,0 +1,150 @@
+"""
+Response cache for report endpoints
+Stores serialized JSON bodies with a strong ETag, bounded by total bytes
+(least recently used evicted first). Entries carry tags such as
+"session:<id>" so new data for a session drops every response built from it.
+"""
+import hashlib
+import json
+import threading
+from collections import OrderedDict, deque
+from typing import Hashable, Iterable, Optional, Tuple
+from fastapi import Request, Response
+from fastapi.encoders import jsonable_encoder
+from .config import settings
+
+class ResponseCache:
+    def __init__(self, max_bytes: int = 32 * 1024 * 1024):
+        """
+        Initialize the cache
+        
+        Args:
+            max_bytes: Total size of cached bodies (0 disables caching)
+        """
+        self.max_bytes = max_bytes
+        # {key: (body, etag, tags)}
+        self._entries = OrderedDict()
+        # {tag: {key}}
+        self._tags = {}
+        self._bytes = 0
+        self._lock = threading.Lock()
+        # Bumped by every invalidated tag; recent (generation, tag) pairs let put()
+        # refuse a body whose inputs were invalidated while it was being computed
+        self.generation = 0
+        self._recent = deque(maxlen=4096)
+        
+        # Counters
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+        self.evictions = 0
+        self.invalidations = 0
+    
+    def get(self, key: Hashable) -> Optional[Tuple[bytes, str]]:
+        """Cached (body, etag), or None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0], entry[1]
+    
+    def put(self, key: Hashable, body: bytes, etag: str, tags: Iterable[str], generation: Optional[int] = None):
+        """Store a body; oldest entries are evicted to stay within max_bytes"""
+        if len(body) > self.max_bytes:
+            return
+        tags = frozenset(tags)
+        with self._lock:
+            if generation is not None and self._invalidated_since(generation, tags):
+                return
+            self._remove(key)
+            self._entries[key] = (body, etag, tags)
+            self._bytes += len(body)
+            for tag in tags:
+                self._tags.setdefault(tag, set()).add(key)
+            while self._bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+    
+    def invalidate(self, *tags: str):
+        """Drop every entry carrying one of the tags"""
+        with self._lock:
+            for tag in tags:
+                self.generation += 1
+                self._recent.append((self.generation, tag))
+                keys = self._tags.pop(tag, None)
+                if not keys:
+                    continue
+                for key in list(keys):
+                    self._remove(key)
+                self.invalidations += 1
+    
+    def _invalidated_since(self, generation: int, tags: frozenset) -> bool:
+        if generation == self.generation:
+            return False
+        if not self._recent or self._recent[0][0] > generation + 1:
+            # Older than the log: cannot tell, assume it was
+            return True
+        return any(seen > generation and tag in tags for seen, tag in self._recent)
+    
+    def _remove(self, key: Hashable):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        self._bytes -= len(entry[0])
+        for tag in entry[2]:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+    
+    def stats(self) -> dict:
+        """Cache counters for metrics"""
+        with self._lock:
+            entries, size = len(self._entries), self._bytes
+        lookups = self.hits + self.misses
+        return {
+            'entries': entries,
+            'bytes': size,
+            'max_bytes': self.max_bytes,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / lookups, 3) if lookups else 0.0,
+            'not_modified': self.not_modified,
+            'evictions': self.evictions,
+            'invalidations': self.invalidations
+        }
+    
+    def _response(self, request: Optional[Request], body: bytes, etag: str, cache_control: str) -> Response:
+        headers = {'ETag': etag, 'Cache-Control': cache_control}
+        if request is not None:
+            candidates = [tag.strip() for tag in request.headers.get('if-none-match', '').split(',')]
+            if etag in candidates or '*' in candidates:
+                self.not_modified += 1
+                return Response(status_code=304, headers=headers)
+        return Response(content=body, media_type='application/json', headers=headers)
+    
+    def lookup(self, request: Optional[Request], key: Hashable, cache_control: str) -> Optional[Response]:
+        """Cached response (304 if the client already has it), or None on a miss"""
+        cached = self.get(key)
+        if cached is None:
+            return None
+        return self._response(request, cached[0], cached[1], cache_control)
+    
+    def store(self, request: Optional[Request], key: Hashable, tags: Iterable[str], value,
+              cache_control: str, generation: int) -> Response:
+        """
+        Serialize a value, cache it and build its response
+        
+        Args:
+            generation: self.generation read before the value was computed
+        """
+        body = json.dumps(jsonable_encoder(value)).encode()
+        etag = '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+        self.put(key, body, etag, tags, generation)
+        return self._response(request, body, etag, cache_control)
+
+report_cache = ResponseCache(settings.REPORT_CACHE_MAX_BYTES)
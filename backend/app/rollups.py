@@ -0,0 +1,157 @@
+"""
+Downsampling and rollup tiers for attention data
+Per-frame updates are folded into fixed-width time buckets (mean/min/max)
+before they reach the database
+"""
+from datetime import datetime, timedelta
+from typing import List, Optional, Tuple
+from .config import settings
+
+EPOCH = datetime(1970, 1, 1)
+
+def parse_resolutions(value: str) -> List[int]:
+    """Parse a comma-separated list of bucket widths in seconds"""
+    resolutions = sorted({int(part) for part in value.split(',') if part.strip()})
+    return [r for r in resolutions if r > 0]
+
+ROLLUP_RESOLUTIONS = parse_resolutions(settings.ROLLUP_RESOLUTIONS)
+
+# Reports read the coarsest tier; None means rollups are disabled
+REPORT_RESOLUTION: Optional[int] = ROLLUP_RESOLUTIONS[-1] if ROLLUP_RESOLUTIONS else None
+
+class Bucket:
+    __slots__ = ('start', 'count', 'total', 'min', 'max', 'last_status')
+    
+    def __init__(self, start: float, score: float, status: str):
+        self.start = start
+        self.count = 1
+        self.total = score
+        self.min = score
+        self.max = score
+        self.last_status = status
+    
+    def add(self, score: float, status: str):
+        self.count += 1
+        self.total += score
+        if score < self.min:
+            self.min = score
+        if score > self.max:
+            self.max = score
+        self.last_status = status
+
+class RollupAggregator:
+    def __init__(self, sample_seconds: float, resolutions: List[int], grace_seconds: float = 2.0):
+        """
+        Initialize bucket tables
+        
+        Args:
+            sample_seconds: Width of the downsampled AttentionSample buckets (0 disables downsampling)
+            resolutions: Widths of the AttentionRollup tiers in seconds
+            grace_seconds: How long an idle bucket stays open after its end
+        """
+        self.sample_seconds = sample_seconds
+        self.resolutions = resolutions
+        self.grace_seconds = grace_seconds
+        
+        # {(session_id, student_id, width): Bucket}; width None is the sample tier
+        self._open = {}
+    
+    def add(self, session_id: str, student_id: str, score: float, status: str,
+            timestamp: datetime) -> Tuple[list, list]:
+        """
+        Fold one update into every tier
+        
+        Returns:
+            Tuple of (AttentionSample rows, AttentionRollup rows) for buckets that closed
+        """
+        samples, rollups = [], []
+        seconds = (timestamp - EPOCH).total_seconds()
+        
+        if self.sample_seconds > 0:
+            closed = self._fold(session_id, student_id, None, self.sample_seconds, seconds, score, status)
+            if closed:
+                samples.append(closed)
+        else:
+            samples.append(self._sample_row(session_id, student_id, Bucket(seconds, score, status)))
+        
+        for width in self.resolutions:
+            closed = self._fold(session_id, student_id, width, width, seconds, score, status)
+            if closed:
+                rollups.append(closed)
+        
+        return samples, rollups
+    
+    def collect(self, now: Optional[datetime] = None, force: bool = False,
+                session_id: Optional[str] = None) -> Tuple[list, list]:
+        """
+        Close buckets whose window (plus grace) has passed, or all of them when forced
+        
+        Args:
+            session_id: Limit forcing to one session's buckets (others still close on time)
+        """
+        now_seconds = ((now or datetime.utcnow()) - EPOCH).total_seconds()
+        samples, rollups = [], []
+        for key in list(self._open):
+            key_session, student_id, width = key
+            bucket = self._open[key]
+            bucket_width = self.sample_seconds if width is None else width
+            forced = force and (session_id is None or key_session == session_id)
+            if forced or bucket.start + bucket_width + self.grace_seconds <= now_seconds:
+                del self._open[key]
+                if width is None:
+                    samples.append(self._sample_row(key_session, student_id, bucket))
+                else:
+                    rollups.append(self._rollup_row(key_session, student_id, width, bucket))
+        return samples, rollups
+    
+    def discard(self, session_id: str, student_id: str):
+        """Drop a student's open buckets without writing them"""
+        for width in [None] + self.resolutions:
+            self._open.pop((session_id, student_id, width), None)
+    
+    def open_buckets(self, session_id: Optional[str] = None) -> int:
+        """Number of open buckets, optionally of one session"""
+        if session_id is None:
+            return len(self._open)
+        return sum(1 for key in self._open if key[0] == session_id)
+    
+    def _fold(self, session_id, student_id, width_key, width, seconds, score, status) -> Optional[dict]:
+        """Add to the current bucket; return the previous bucket's row if this update closed it"""
+        key = (session_id, student_id, width_key)
+        start = seconds - (seconds % width)
+        bucket = self._open.get(key)
+        if bucket and bucket.start >= start:
+            # Same bucket, or a late update that belongs to an already closed one
+            bucket.add(score, status)
+            return None
+        
+        self._open[key] = Bucket(start, score, status)
+        if not bucket:
+            return None
+        if width_key is None:
+            return self._sample_row(session_id, student_id, bucket)
+        return self._rollup_row(session_id, student_id, width_key, bucket)
+    
+    @staticmethod
+    def _sample_row(session_id: str, student_id: str, bucket: Bucket) -> dict:
+        return {
+            'session_id': session_id,
+            'student_id': student_id,
+            'attention_score': bucket.total / bucket.count,
+            'status': bucket.last_status,
+            'timestamp': EPOCH + timedelta(seconds=bucket.start)
+        }
+    
+    @staticmethod
+    def _rollup_row(session_id: str, student_id: str, width: int, bucket: Bucket) -> dict:
+        return {
+            'session_id': session_id,
+            'student_id': student_id,
+            'resolution': width,
+            'bucket_start': EPOCH + timedelta(seconds=bucket.start),
+            'sample_count': bucket.count,
+            'mean_score': bucket.total / bucket.count,
+            'min_score': bucket.min,
+            'max_score': bucket.max,
+            'last_status': bucket.last_status
+        }
@@ -1,17 +1,26 @@
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from ..database import get_db
 from ..models import User
 from ..schemas import UserRegister, UserLogin, Token, UserResponse
-from ..auth import get_password_hash, verify_password, create_access_token, get_current_user
+from ..auth import create_access_token, get_current_user
+from ..password_hashing import password_hasher, HasherBusy
 
 router = APIRouter(prefix="/auth", tags=["authentication"])
 
+def _busy() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="Too many sign-ins at once, please retry",
+        headers={"Retry-After": "1"}
+    )
+
 @router.post("/register", response_model=UserResponse, status_code=status.HTTP_201_CREATED)
-async def register(user_data: UserRegister, db: Session = Depends(get_db)):
+async def register(user_data: UserRegister, db: AsyncSession = Depends(get_db)):
     """Register a new user (teacher or student)"""
     # Check if user already exists
-    existing_user = db.query(User).filter(User.email == user_data.email).first()
+    existing_user = await db.scalar(select(User).where(User.email == user_data.email))
     if existing_user:
         raise HTTPException(
             status_code=status.HTTP_409_CONFLICT,
@@ -26,7 +35,10 @@ async def register(user_data: UserRegister, db: Session = Depends(get_db)):
         )
     
     # Create new user
-    hashed_password = get_password_hash(user_data.password)
+    try:
+        hashed_password = await password_hasher.hash(user_data.password)
+    except HasherBusy:
+        raise _busy()
     new_user = User(
         email=user_data.email,
         password_hash=hashed_password,
@@ -35,16 +47,16 @@ async def register(user_data: UserRegister, db: Session = Depends(get_db)):
     )
     
     db.add(new_user)
-    db.commit()
-    db.refresh(new_user)
+    await db.commit()
+    await db.refresh(new_user)
     
     return new_user
 
 @router.post("/login", response_model=Token)
-async def login(credentials: UserLogin, db: Session = Depends(get_db)):
+async def login(credentials: UserLogin, db: AsyncSession = Depends(get_db)):
     """Login and receive JWT token"""
     # Find user
-    user = db.query(User).filter(User.email == credentials.email).first()
+    user = await db.scalar(select(User).where(User.email == credentials.email))
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -52,12 +64,21 @@ async def login(credentials: UserLogin, db: Session = Depends(get_db)):
         )
     
     # Verify password
-    if not verify_password(credentials.password, user.password_hash):
+    try:
+        valid, new_hash = await password_hasher.verify_and_update(credentials.password, user.password_hash)
+    except HasherBusy:
+        raise _busy()
+    if not valid:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid email or password"
         )
     
+    # Stored hash used older cost parameters: upgrade it (the update also evicts the cached user)
+    if new_hash:
+        user.password_hash = new_hash
+        await db.commit()
+    
     # Create access token
     access_token = create_access_token(data={"sub": user.id, "role": user.role})
     
@@ -1,14 +1,90 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from sqlalchemy import func
+import asyncio
+import base64
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select, and_, or_
+from sqlalchemy.ext.asyncio import AsyncSession
 from ..database import get_db
-from ..models import Room, User, AttentionSample, StatusTimeline, TabSwitchEvent, ClassReport
+from ..models import Room, RoomParticipant, User, AttentionSample, StatusTimeline, TabSwitchEvent, ClassReport
 from ..auth import get_current_user, get_current_teacher, get_current_student
-import json
+from ..class_reports import (
+    average_attention, build_session_report, stored_report, session_summaries, report_jobs, attention_curve
+)
+from ..config import settings
+from ..response_cache import report_cache
+from ..exports import FORMATS, stream_export
 from datetime import datetime
 
 router = APIRouter(prefix="/reports", tags=["reports"])
 
+def _encode_cursor(start_time: datetime, session_id: str) -> str:
+    """Opaque keyset cursor: the last row's (start_time, id)"""
+    return base64.urlsafe_b64encode(f"{start_time.isoformat()}|{session_id}".encode()).decode()
+
+def _decode_cursor(cursor: str):
+    try:
+        start_time, session_id = base64.urlsafe_b64decode(cursor.encode()).decode().split('|', 1)
+        return datetime.fromisoformat(start_time), session_id
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+# Ended-session reports change only on late data or recompute; lists are always revalidated (ETag)
+REPORT_CACHE_CONTROL = f"private, max-age={settings.REPORT_CACHE_MAX_AGE}"
+LIST_CACHE_CONTROL = "private, no-cache"
+
+BUCKET_UNITS = {'s': 1, 'm': 60, 'h': 3600}
+
+def _parse_bucket(value: str) -> int:
+    """'30s', '5m', '1h' or plain seconds"""
+    value = value.strip().lower()
+    unit = BUCKET_UNITS.get(value[-1:], None)
+    number = value[:-1] if unit else value
+    try:
+        seconds = int(number) * (unit or 1)
+    except ValueError:
+        seconds = 0
+    if seconds <= 0:
+        raise HTTPException(status_code=400, detail="Invalid bucket, use e.g. 30s, 5m or 1h")
+    return seconds
+
+def teacher_sessions_query(teacher_id: str, limit: int, after: Optional[tuple] = None):
+    """One page of a teacher's ended sessions, newest first, with their stored report summary"""
+    query = select(
+        Room.id,
+        Room.room_code,
+        Room.start_time,
+        Room.end_time,
+        ClassReport.student_count,
+        ClassReport.average_attention
+    ).outerjoin(
+        ClassReport, ClassReport.session_id == Room.id
+    ).where(
+        Room.teacher_id == teacher_id,
+        Room.end_time != None
+    )
+    if after:
+        after_start, after_id = after
+        query = query.where(or_(
+            Room.start_time < after_start,
+            and_(Room.start_time == after_start, Room.id < after_id)
+        ))
+    return query.order_by(Room.start_time.desc(), Room.id.desc()).limit(limit)
+
+def participant_query(session_id: str, student_id: str):
+    """Whether a student ever joined a session"""
+    return select(RoomParticipant.id).where(
+        RoomParticipant.room_id == session_id,
+        RoomParticipant.student_id == student_id
+    ).limit(1)
+
+def student_tab_switches_query(session_id: str, student_id: str):
+    """A student's tab switches in a session"""
+    return select(TabSwitchEvent).where(
+        TabSwitchEvent.session_id == session_id,
+        TabSwitchEvent.student_id == student_id
+    )
+
 @router.get("/test")
 async def test_reports():
     """Test endpoint to verify reports router is working"""
@@ -17,133 +93,181 @@ async def test_reports():
 @router.get("/teacher/{teacher_id}/sessions")
 async def get_teacher_sessions(
     teacher_id: str,
+    request: Request,
+    limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = None,
     current_user: User = Depends(get_current_teacher),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
-    """Get all sessions for a teacher"""
+    """Get a teacher's ended sessions, newest first (keyset pagination via next_cursor)"""
     print(f"📊 Reports: Getting sessions for teacher {teacher_id}")
     print(f"📊 Current user: {current_user.id if current_user else 'None'}")
     
     if current_user.id != teacher_id:
         raise HTTPException(status_code=403, detail="Not authorized")
     
-    sessions = db.query(Room).filter(
-        Room.teacher_id == teacher_id,
-        Room.end_time != None
-    ).order_by(Room.start_time.desc()).all()
+    key = ('teacher_sessions', teacher_id, limit, cursor)
+    cached = report_cache.lookup(request, key, LIST_CACHE_CONTROL)
+    if cached:
+        return cached
+    generation = report_cache.generation
+    
+    # Summary metrics come from the materialized report when there is one
+    after = _decode_cursor(cursor) if cursor else None
+    rows = (await db.execute(teacher_sessions_query(teacher_id, limit + 1, after))).all()
+    
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    
+    # Sessions without a report yet: one grouped query for the page, and queue their reports
+    missing = [row.id for row in rows if row.student_count is None]
+    summaries = await db.run_sync(session_summaries, missing)
+    for session_id in missing:
+        report_jobs.schedule(session_id)
     
     result = []
-    for session in sessions:
-        # Calculate summary metrics
-        avg_attention = db.query(func.avg(AttentionSample.attention_score)).filter(
-            AttentionSample.session_id == session.id
-        ).scalar() or 0
-        
-        student_count = db.query(func.count(func.distinct(AttentionSample.student_id))).filter(
-            AttentionSample.session_id == session.id
-        ).scalar() or 0
+    for row in rows:
+        if row.student_count is None:
+            student_count, avg_attention = summaries.get(row.id, (0, 0))
+        else:
+            student_count, avg_attention = row.student_count, row.average_attention
         
         result.append({
-            'id': session.id,
-            'room_code': session.room_code,
-            'start_time': session.start_time,
-            'end_time': session.end_time,
-            'duration': (session.end_time - session.start_time).total_seconds() if session.end_time else 0,
+            'id': row.id,
+            'room_code': row.room_code,
+            'start_time': row.start_time,
+            'end_time': row.end_time,
+            'duration': (row.end_time - row.start_time).total_seconds() if row.end_time else 0,
             'student_count': student_count,
-            'average_attention': round(avg_attention, 1)
+            'average_attention': round(avg_attention or 0, 1)
         })
     
-    return {'sessions': result}
+    next_cursor = _encode_cursor(rows[-1].start_time, rows[-1].id) if has_more else None
+    return report_cache.store(
+        request, key, [f"teacher:{teacher_id}"], {'sessions': result, 'next_cursor': next_cursor},
+        LIST_CACHE_CONTROL, generation
+    )
 
 @router.get("/session/{session_id}")
 async def get_session_report(
     session_id: str,
+    request: Request,
+    recompute: bool = False,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
-    """Get detailed report for a session"""
-    session = db.query(Room).filter(Room.id == session_id).first()
+    """Get detailed report for a session (stored ClassReport once the class has ended)"""
+    key = ('session_report', session_id, current_user.role)
+    if not recompute:
+        cached = report_cache.lookup(request, key, REPORT_CACHE_CONTROL)
+        if cached:
+            return cached
+    generation = report_cache.generation
+    
+    session = await db.get(Room, session_id)
     if not session:
         raise HTTPException(status_code=404, detail="Session not found")
+    # Regeneration occupies the single report worker: only the session's teacher may ask for it
+    if recompute and session.teacher_id != current_user.id:
+        raise HTTPException(status_code=403, detail="Not authorized")
     
-    # Get all students in session
-    students = db.query(AttentionSample.student_id, User.name).join(
-        User, AttentionSample.student_id == User.id
-    ).filter(
-        AttentionSample.session_id == session_id
-    ).distinct().all()
-    
-    student_reports = []
-    for student_id, student_name in students:
-        # Get attention samples
-        samples = db.query(AttentionSample).filter(
-            AttentionSample.session_id == session_id,
-            AttentionSample.student_id == student_id
-        ).all()
-        
-        avg_attention = sum(s.attention_score for s in samples) / len(samples) if samples else 0
-        
-        # Get status timeline
-        timeline = db.query(StatusTimeline).filter(
-            StatusTimeline.session_id == session_id,
-            StatusTimeline.student_id == student_id
-        ).order_by(StatusTimeline.timestamp).all()
-        
-        # Get tab switches
-        tab_switches = db.query(TabSwitchEvent).filter(
-            TabSwitchEvent.session_id == session_id,
-            TabSwitchEvent.student_id == student_id
-        ).count()
-        
-        student_reports.append({
-            'student_id': student_id,
-            'name': student_name,
-            'final_attention_score': round(avg_attention, 1),
-            'status_timeline': [
-                {
-                    'timestamp': t.timestamp,
-                    'status': t.new_status,
-                    'duration': t.duration_in_previous
-                } for t in timeline
-            ],
-            'tab_switch_count': tab_switches
-        })
+    # Live class: nothing is materialized yet, and nothing is cached
+    if session.end_time is None:
+        return await db.run_sync(build_session_report, session)
     
-    return {
-        'session': {
-            'id': session.id,
-            'room_code': session.room_code,
-            'start_time': session.start_time,
-            'end_time': session.end_time
-        },
-        'students': student_reports
-    }
+    report = None if recompute else await db.run_sync(stored_report, session_id)
+    if report is None:
+        # Report job has not finished yet, or a fresh report was requested: wait for the job
+        # (one worker generates reports, so this never races the end-of-session run)
+        report = await asyncio.wrap_future(report_jobs.schedule(session_id, refresh=recompute))
+        generation = report_cache.generation
+    return report_cache.store(request, key, [f"session:{session_id}"], report, REPORT_CACHE_CONTROL, generation)
+
+@router.get("/session/{session_id}/curve")
+async def get_session_curve(
+    session_id: str,
+    request: Request,
+    bucket: str = '30s',
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """Bucketed attention over time (mean, min, max, p50) per student and for the class"""
+    bucket_seconds = _parse_bucket(bucket)
+    session = await db.get(Room, session_id)
+    if not session:
+        raise HTTPException(status_code=404, detail="Session not found")
+    # The session's teacher, or a student who took part in it
+    if session.teacher_id != current_user.id and not await db.scalar(participant_query(session_id, current_user.id)):
+        raise HTTPException(status_code=403, detail="Not authorized")
+    
+    # Live class: the curve still grows, so it is not cached
+    if session.end_time is None:
+        return await db.run_sync(attention_curve, session_id, bucket_seconds, settings.CURVE_MAX_POINTS)
+    
+    key = ('session_curve', session_id, bucket_seconds)
+    cached = report_cache.lookup(request, key, REPORT_CACHE_CONTROL)
+    if cached:
+        return cached
+    generation = report_cache.generation
+    curve = await db.run_sync(attention_curve, session_id, bucket_seconds, settings.CURVE_MAX_POINTS)
+    return report_cache.store(request, key, [f"session:{session_id}"], curve, REPORT_CACHE_CONTROL, generation)
+
+@router.get("/session/{session_id}/export")
+async def export_session(
+    session_id: str,
+    table: str = Query('samples', pattern="^(samples|timeline)$"),
+    format: str = Query('csv', pattern="^(csv|ndjson)$"),
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    gzip: bool = False,
+    current_user: User = Depends(get_current_teacher),
+    db: AsyncSession = Depends(get_db)
+):
+    """Stream a session's raw attention samples or status timeline as CSV or NDJSON"""
+    session = await db.get(Room, session_id)
+    if not session:
+        raise HTTPException(status_code=404, detail="Session not found")
+    if session.teacher_id != current_user.id:
+        raise HTTPException(status_code=403, detail="Not authorized")
+    
+    filename = f"{session.room_code}-{table}.{format}" + (".gz" if gzip else "")
+    
+    # The stream reads through its own DB session, in the threadpool, batch by batch
+    return StreamingResponse(
+        stream_export(session_id, table, format, start, end, gzip),
+        media_type='application/gzip' if gzip else FORMATS[format],
+        headers={'Content-Disposition': f'attachment; filename="{filename}"'}
+    )
 
 @router.get("/student/{student_id}/sessions")
 async def get_student_sessions(
     student_id: str,
+    request: Request,
     current_user: User = Depends(get_current_student),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Get all sessions for a student"""
     if current_user.id != student_id:
         raise HTTPException(status_code=403, detail="Not authorized")
     
+    key = ('student_sessions', student_id)
+    cached = report_cache.lookup(request, key, LIST_CACHE_CONTROL)
+    if cached:
+        return cached
+    generation = report_cache.generation
+    
     # Get sessions where student participated
-    sessions = db.query(Room).join(
+    sessions = (await db.scalars(select(Room).join(
         AttentionSample, Room.id == AttentionSample.session_id
-    ).filter(
+    ).where(
         AttentionSample.student_id == student_id,
         Room.end_time != None
-    ).distinct().order_by(Room.start_time.desc()).all()
+    ).distinct().order_by(Room.start_time.desc()))).all()
     
     result = []
     for session in sessions:
         # Calculate student's average attention
-        avg_attention = db.query(func.avg(AttentionSample.attention_score)).filter(
-            AttentionSample.session_id == session.id,
-            AttentionSample.student_id == student_id
-        ).scalar() or 0
+        avg_attention = await db.run_sync(average_attention, session.id, student_id)
         
         result.append({
             'id': session.id,
@@ -153,44 +277,59 @@ async def get_student_sessions(
             'my_attention_score': round(avg_attention, 1)
         })
     
-    return {'sessions': result}
+    return report_cache.store(
+        request, key, [f"student:{student_id}"], {'sessions': result}, LIST_CACHE_CONTROL, generation
+    )
 
 @router.get("/student/{student_id}/session/{session_id}")
 async def get_student_session_report(
     student_id: str,
     session_id: str,
+    request: Request,
     current_user: User = Depends(get_current_student),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Get detailed report for a student's session"""
     if current_user.id != student_id:
         raise HTTPException(status_code=403, detail="Not authorized")
     
-    session = db.query(Room).filter(Room.id == session_id).first()
+    key = ('student_session_report', session_id, student_id)
+    cached = report_cache.lookup(request, key, REPORT_CACHE_CONTROL)
+    if cached:
+        return cached
+    generation = report_cache.generation
+    
+    session = await db.get(Room, session_id)
     if not session:
         raise HTTPException(status_code=404, detail="Session not found")
     
-    # Get attention samples
-    samples = db.query(AttentionSample).filter(
-        AttentionSample.session_id == session_id,
-        AttentionSample.student_id == student_id
-    ).all()
-    
-    avg_attention = sum(s.attention_score for s in samples) / len(samples) if samples else 0
-    
-    # Get status timeline
-    timeline = db.query(StatusTimeline).filter(
-        StatusTimeline.session_id == session_id,
-        StatusTimeline.student_id == student_id
-    ).order_by(StatusTimeline.timestamp).all()
+    # Score and timeline come from the stored report when the class has one
+    report = await db.run_sync(stored_report, session_id) if session.end_time else None
+    entry = next((s for s in report['students'] if s['student_id'] == student_id), None) if report else None
+    if entry:
+        avg_attention = entry['final_attention_score']
+        status_timeline = entry['status_timeline']
+    else:
+        avg_attention = await db.run_sync(average_attention, session_id, student_id)
+        status_timeline = [
+            {
+                'timestamp': timestamp,
+                'status': new_status,
+                'duration': duration
+            } for timestamp, new_status, duration in await db.execute(select(
+                StatusTimeline.timestamp,
+                StatusTimeline.new_status,
+                StatusTimeline.duration_in_previous
+            ).where(
+                StatusTimeline.session_id == session_id,
+                StatusTimeline.student_id == student_id
+            ).order_by(StatusTimeline.timestamp))
+        ]
     
     # Get tab switches
-    tab_switches = db.query(TabSwitchEvent).filter(
-        TabSwitchEvent.session_id == session_id,
-        TabSwitchEvent.student_id == student_id
-    ).all()
+    tab_switches = (await db.scalars(student_tab_switches_query(session_id, student_id))).all()
     
-    return {
+    result = {
         'session': {
             'id': session.id,
             'room_code': session.room_code,
@@ -198,13 +337,7 @@ async def get_student_session_report(
             'end_time': session.end_time
         },
         'final_attention_score': round(avg_attention, 1),
-        'status_timeline': [
-            {
-                'timestamp': t.timestamp,
-                'status': t.new_status,
-                'duration': t.duration_in_previous
-            } for t in timeline
-        ],
+        'status_timeline': status_timeline,
         'tab_switch_events': [
             {
                 'timestamp': t.timestamp,
@@ -212,3 +345,7 @@ async def get_student_session_report(
             } for t in tab_switches
         ]
     }
+    
+    if session.end_time is None:
+        return result
+    return report_cache.store(request, key, [f"session:{session_id}"], result, REPORT_CACHE_CONTROL, generation)
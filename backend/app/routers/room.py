@@ -1,23 +1,35 @@
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
 from datetime import datetime
 from ..database import get_db
 from ..models import Room, RoomParticipant, User
 from ..schemas import RoomCreate, RoomResponse, RoomJoin
 from ..auth import get_current_teacher, get_current_student, get_current_user
 from ..utils import generate_room_code
+from ..class_reports import report_jobs
+from ..live_stats import live_stats
+from ..response_cache import report_cache
 
 router = APIRouter(prefix="/room", tags=["rooms"])
 
+def active_participant_query(room_id: str, student_id: str):
+    """A student's current (not yet left) participation in a room"""
+    return select(RoomParticipant).where(
+        RoomParticipant.room_id == room_id,
+        RoomParticipant.student_id == student_id,
+        RoomParticipant.left_at == None
+    )
+
 @router.post("/create", response_model=RoomResponse, status_code=status.HTTP_201_CREATED)
 async def create_room(
     current_user: User = Depends(get_current_teacher),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Create a new classroom session (teachers only)"""
     # Generate unique room code
     room_code = generate_room_code()
-    while db.query(Room).filter(Room.room_code == room_code).first():
+    while await db.scalar(select(Room.id).where(Room.room_code == room_code)):
         room_code = generate_room_code()
     
     # Create room
@@ -29,8 +41,9 @@ async def create_room(
     )
     
     db.add(new_room)
-    db.commit()
-    db.refresh(new_room)
+    await db.commit()
+    await db.refresh(new_room)
+    live_stats.set_owner(new_room.id, current_user.id)
     
     return new_room
 
@@ -38,14 +51,14 @@ async def create_room(
 async def join_room(
     room_data: RoomJoin,
     current_user: User = Depends(get_current_student),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Join a classroom session (students only)"""
     # Find room
-    room = db.query(Room).filter(
+    room = await db.scalar(select(Room).where(
         Room.room_code == room_data.room_code,
         Room.is_active == True
-    ).first()
+    ))
     
     if not room:
         raise HTTPException(
@@ -54,11 +67,7 @@ async def join_room(
         )
     
     # Check if already joined
-    existing = db.query(RoomParticipant).filter(
-        RoomParticipant.room_id == room.id,
-        RoomParticipant.student_id == current_user.id,
-        RoomParticipant.left_at == None
-    ).first()
+    existing = await db.scalar(active_participant_query(room.id, current_user.id))
     
     if existing:
         return {"message": "Already in room", "room_id": room.id}
@@ -70,7 +79,7 @@ async def join_room(
     )
     
     db.add(participant)
-    db.commit()
+    await db.commit()
     
     return {"message": "Joined room successfully", "room_id": room.id}
 
@@ -78,14 +87,10 @@ async def join_room(
 async def leave_room(
     room_id: str,
     current_user: User = Depends(get_current_student),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Leave a classroom session"""
-    participant = db.query(RoomParticipant).filter(
-        RoomParticipant.room_id == room_id,
-        RoomParticipant.student_id == current_user.id,
-        RoomParticipant.left_at == None
-    ).first()
+    participant = await db.scalar(active_participant_query(room_id, current_user.id))
     
     if not participant:
         raise HTTPException(
@@ -94,7 +99,7 @@ async def leave_room(
         )
     
     participant.left_at = datetime.utcnow()
-    db.commit()
+    await db.commit()
     
     return {"message": "Left room successfully"}
 
@@ -102,19 +107,19 @@ async def leave_room(
 async def get_room_students(
     room_id: str,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Get all students in a room"""
-    room = db.query(Room).filter(Room.id == room_id).first()
+    room = await db.get(Room, room_id)
     if not room:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Room not found")
     
-    participants = db.query(RoomParticipant, User).join(
+    participants = (await db.execute(select(RoomParticipant, User).join(
         User, RoomParticipant.student_id == User.id
-    ).filter(
+    ).where(
         RoomParticipant.room_id == room_id,
         RoomParticipant.left_at == None
-    ).all()
+    ))).all()
     
     students = [
         {
@@ -128,17 +133,41 @@ async def get_room_students(
     
     return {"students": students}
 
+@router.get("/{room_id}/live-stats")
+async def get_live_stats(
+    room_id: str,
+    current_user: User = Depends(get_current_teacher),
+    db: AsyncSession = Depends(get_db)
+):
+    """Current attention aggregates of the teacher's live room (in memory, no DB access once the owner is known)"""
+    owner = live_stats.owner(room_id)
+    if owner is None:
+        # Room created on another worker or before a restart: look its teacher up once
+        room = (await db.execute(select(Room.teacher_id, Room.end_time).where(Room.id == room_id))).first()
+        if room is None:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Room not found")
+        owner = room.teacher_id
+        if room.end_time is None:
+            live_stats.set_owner(room_id, owner)
+    if owner != current_user.id:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized")
+    
+    stats = live_stats.snapshot(room_id)
+    if stats is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="No live data for this room")
+    return stats
+
 @router.get("/{room_id}/teacher")
 async def get_room_teacher(
     room_id: str,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Get room teacher info"""
-    room = db.query(Room).filter(Room.id == room_id).first()
+    room = await db.get(Room, room_id)
     if not room:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Room not found")
     
-    teacher = db.query(User).filter(User.id == room.teacher_id).first()
+    teacher = await db.get(User, room.teacher_id)
     return {
         "id": teacher.id,
         "name": teacher.name,
@@ -150,13 +179,13 @@ async def toggle_lockmode(
     room_id: str,
     enabled: bool,
     current_user: User = Depends(get_current_teacher),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Toggle LockMode for a room (teachers only)"""
-    room = db.query(Room).filter(
+    room = await db.scalar(select(Room).where(
         Room.id == room_id,
         Room.teacher_id == current_user.id
-    ).first()
+    ))
     
     if not room:
         raise HTTPException(
@@ -165,7 +194,7 @@ async def toggle_lockmode(
         )
     
     room.lock_mode_enabled = enabled
-    db.commit()
+    await db.commit()
     
     return {"message": "LockMode updated", "lock_mode_enabled": enabled}
 
@@ -173,13 +202,13 @@ async def toggle_lockmode(
 async def end_session(
     room_id: str,
     current_user: User = Depends(get_current_teacher),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """End a classroom session (teachers only)"""
-    room = db.query(Room).filter(
+    room = await db.scalar(select(Room).where(
         Room.id == room_id,
         Room.teacher_id == current_user.id
-    ).first()
+    ))
     
     if not room:
         raise HTTPException(
@@ -191,14 +220,16 @@ async def end_session(
     room.end_time = datetime.utcnow()
     
     # Mark all participants as left
-    participants = db.query(RoomParticipant).filter(
+    await db.execute(update(RoomParticipant).where(
         RoomParticipant.room_id == room_id,
         RoomParticipant.left_at == None
-    ).all()
+    ).values(left_at=datetime.utcnow()))
     
-    for participant in participants:
-        participant.left_at = datetime.utcnow()
+    await db.commit()
+    report_cache.invalidate(f"teacher:{current_user.id}")
+    live_stats.drop_session(room_id)
     
-    db.commit()
+    # Materialize the ClassReport in the background
+    report_jobs.schedule(room_id)
     
     return {"message": "Session ended successfully"}
@@ -0,0 +1,114 @@
+"""
+In-process table of each student's current attention status
+Lets ai_update detect status transitions without querying StatusTimeline
+"""
+import threading
+from datetime import datetime
+from typing import Optional, Tuple
+from sqlalchemy import select
+from .database import SessionLocal
+from .models import StatusTimeline
+from .ingestion import AttentionIngestor, ingestor
+
+def last_status_query(session_id: str, student_id: str):
+    """Latest StatusTimeline row of a student"""
+    return select(StatusTimeline.new_status, StatusTimeline.timestamp).where(
+        StatusTimeline.session_id == session_id,
+        StatusTimeline.student_id == student_id
+    ).order_by(StatusTimeline.timestamp.desc()).limit(1)
+
+class StatusCache:
+    def __init__(self, ingestor: Optional[AttentionIngestor] = None):
+        """
+        Initialize empty status table
+        
+        Args:
+            ingestor: Write-behind queue whose unwritten transitions are newer than StatusTimeline
+        """
+        self.ingestor = ingestor
+        # {(session_id, student_id): (status, since)}; status is None when no timeline exists yet
+        self._entries = {}
+        # {session_id: set(student_id)} so a whole session can be dropped at once
+        self._by_session = {}
+        self._lock = threading.Lock()
+        self.loads = 0
+    
+    def is_loaded(self, session_id: str, student_id: str) -> bool:
+        """Check whether the student's status is already cached"""
+        return (session_id, student_id) in self._entries
+    
+    def load(self, session_id: str, student_id: str):
+        """Fill the entry from the latest transition, queued or in StatusTimeline (first touch only)"""
+        # A reconnect can come before the disconnected socket's last transition was written
+        pending = self.ingestor.pending_status(session_id, student_id) if self.ingestor else None
+        last = None
+        if pending is None:
+            db = SessionLocal()
+            try:
+                last = db.execute(last_status_query(session_id, student_id)).first()
+            finally:
+                db.close()
+        
+        entry = (None, None)
+        if pending:
+            entry = pending
+        elif last:
+            since = last.timestamp.replace(tzinfo=None) if last.timestamp else None
+            entry = (last.new_status, since)
+        
+        with self._lock:
+            # Another update may have filled the entry while we were loading
+            if (session_id, student_id) not in self._entries:
+                self._entries[(session_id, student_id)] = entry
+                self._by_session.setdefault(session_id, set()).add(student_id)
+                self.loads += 1
+    
+    def transition(self, session_id: str, student_id: str, status: str,
+                   timestamp: Optional[datetime] = None) -> Optional[Tuple[Optional[str], Optional[int]]]:
+        """
+        Record the latest status for a student
+        
+        Returns:
+            (previous_status, duration_in_previous) if the status changed, otherwise None
+        """
+        timestamp = timestamp or datetime.utcnow()
+        key = (session_id, student_id)
+        with self._lock:
+            previous, since = self._entries.get(key, (None, None))
+            if previous == status:
+                return None
+            
+            self._entries[key] = (status, timestamp)
+            self._by_session.setdefault(session_id, set()).add(student_id)
+        
+        duration = None
+        if previous is not None and since is not None:
+            duration = max(0, int((timestamp - since).total_seconds()))
+        return previous, duration
+    
+    def drop_student(self, session_id: str, student_id: str):
+        """Forget a student's entry (e.g. on disconnect)"""
+        with self._lock:
+            self._entries.pop((session_id, student_id), None)
+            students = self._by_session.get(session_id)
+            if students:
+                students.discard(student_id)
+                if not students:
+                    del self._by_session[session_id]
+    
+    def drop_session(self, session_id: str):
+        """Forget every entry of an ended session"""
+        with self._lock:
+            for student_id in self._by_session.pop(session_id, ()):
+                self._entries.pop((session_id, student_id), None)
+    
+    def stats(self) -> dict:
+        """Entry counts for metrics"""
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'sessions': len(self._by_session),
+                'db_loads': self.loads
+            }
+
+status_cache = StatusCache(ingestor)
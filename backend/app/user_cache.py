@@ -0,0 +1,96 @@
+"""
+TTL- and size-bounded cache of authenticated users
+Saves a users-table lookup on every HTTP request and socket connect
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+from sqlalchemy import event
+from .config import settings
+from .models import User
+
+class UserCache:
+    def __init__(self, ttl_seconds: float = 60.0, max_entries: int = 10000):
+        """
+        Initialize the cache
+        
+        Args:
+            ttl_seconds: How long a cached user is trusted before it is re-read (0 disables caching)
+            max_entries: Least recently used users are evicted beyond this
+        """
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        
+        # {user_id: (expires_at, User)}; User objects are detached from their session
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        
+        # Counters
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+    
+    def get(self, user_id: str) -> Optional[User]:
+        """Return the cached user, or None if missing or expired"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None or entry[0] <= now:
+                if entry is not None:
+                    del self._entries[user_id]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(user_id)
+            self.hits += 1
+            return entry[1]
+    
+    def put(self, user: User):
+        """Cache a user loaded from the database (must already be detached)"""
+        if self.ttl_seconds <= 0:
+            return
+        with self._lock:
+            self._entries[user.id] = (time.monotonic() + self.ttl_seconds, user)
+            self._entries.move_to_end(user.id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+    
+    def invalidate(self, user_id: str):
+        """Forget a user whose row changed"""
+        with self._lock:
+            if self._entries.pop(user_id, None) is not None:
+                self.invalidations += 1
+    
+    def clear(self):
+        """Forget every user"""
+        with self._lock:
+            self._entries.clear()
+    
+    def stats(self) -> dict:
+        """Hit/miss counters for metrics"""
+        with self._lock:
+            size = len(self._entries)
+        lookups = self.hits + self.misses
+        return {
+            'entries': size,
+            'max_entries': self.max_entries,
+            'ttl_seconds': self.ttl_seconds,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / lookups, 3) if lookups else 0.0,
+            'evictions': self.evictions,
+            'invalidations': self.invalidations
+        }
+
+user_cache = UserCache(
+    ttl_seconds=settings.USER_CACHE_TTL,
+    max_entries=settings.USER_CACHE_MAX_ENTRIES
+)
+
+@event.listens_for(User, "after_update")
+@event.listens_for(User, "after_delete")
+def _invalidate_changed_user(mapper, connection, target):
+    """Any ORM update or delete of a user drops its cached copy in this process"""
+    user_cache.invalidate(target.id)
@@ -5,3 +5,46 @@ def generate_room_code(length: int = 6) -> str:
     """Generate a random room code"""
     characters = string.ascii_uppercase + string.digits
     return ''.join(random.choice(characters) for _ in range(length))
+
+def lttb(points: list, threshold: int, x=lambda p: p[0], y=lambda p: p[1]) -> list:
+    """
+    Largest-Triangle-Three-Buckets downsampling
+    
+    Keeps the first and last point and, from each of threshold - 2 equal
+    buckets in between, the point forming the largest triangle with the
+    previously kept point and the next bucket's average, which preserves
+    the visual shape of the series.
+    
+    Args:
+        points: Points sorted by x
+        threshold: Number of points to keep
+        x: Function giving a point's x value
+        y: Function giving a point's y value
+    """
+    if threshold >= len(points) or threshold < 3:
+        return list(points)
+    
+    sampled = [points[0]]
+    every = (len(points) - 2) / (threshold - 2)
+    a = 0
+    for i in range(threshold - 2):
+        # Average of the next bucket (the last point for the final bucket)
+        next_start = int((i + 1) * every) + 1
+        next_end = min(int((i + 2) * every) + 1, len(points))
+        next_bucket = points[next_start:next_end]
+        avg_x = sum(x(p) for p in next_bucket) / len(next_bucket)
+        avg_y = sum(y(p) for p in next_bucket) / len(next_bucket)
+        
+        start = int(i * every) + 1
+        end = int((i + 1) * every) + 1
+        ax, ay = x(points[a]), y(points[a])
+        best, best_area = start, -1.0
+        for j in range(start, end):
+            area = abs((ax - avg_x) * (y(points[j]) - ay) - (ax - x(points[j])) * (avg_y - ay))
+            if area > best_area:
+                best, best_area = j, area
+        sampled.append(points[best])
+        a = best
+    
+    sampled.append(points[-1])
+    return sampled
@@ -1,22 +1,28 @@
 """
 WebSocket event handlers for real-time communication
 """
+import asyncio
 import socketio
-from sqlalchemy.orm import Session
-from .database import SessionLocal
-from .models import User, Room
-from .auth import decode_token
+from datetime import datetime, timedelta
+from sqlalchemy.ext.asyncio import AsyncSession
+from .database import AsyncSessionLocal
+from .models import User
+from .auth import decode_token, load_user
+from .config import settings
+from .ingestion import ingestor
+from .status_cache import status_cache
+from .presence import presence
+from .broadcast import broadcaster, teacher_room
+from .live_stats import live_stats
+from .ai.wire_format import decode_update, WireFormatError
+from .class_reports import report_jobs
 
-# Active sessions: {session_id: {user_id: sid}}
-active_sessions = {}
-
-async def get_user_from_token(token: str, db: Session) -> User:
+async def get_user_from_token(token: str, db: AsyncSession) -> User:
     """Get user from JWT token"""
     try:
         payload = decode_token(token)
         user_id = payload.get("sub")
-        user = db.query(User).filter(User.id == user_id).first()
-        return user
+        return await load_user(db, user_id)
     except:
         return None
 
@@ -27,30 +33,37 @@ def register_socket_events(sio: socketio.AsyncServer):
     async def connect(sid, environ, auth):
         """Handle client connection"""
         print(f"Client connected: {sid}")
-        if auth and 'token' in auth:
-            db = SessionLocal()
+        if auth and 'token' in auth and settings.SOCKET_TRUST_JWT_CLAIMS:
+            # The signed token already carries the user id and role
             try:
+                payload = decode_token(auth['token'])
+            except Exception:
+                payload = {}
+            if payload.get('sub') and payload.get('role'):
+                await sio.save_session(sid, {'user_id': payload['sub'], 'role': payload['role']})
+                print(f"User authenticated from token claims: {payload['sub']}")
+        elif auth and 'token' in auth:
+            async with AsyncSessionLocal() as db:
                 user = await get_user_from_token(auth['token'], db)
                 if user:
                     # Store user info in session
                     await sio.save_session(sid, {'user_id': user.id, 'role': user.role})
                     print(f"User authenticated: {user.email}")
-            finally:
-                db.close()
     
     @sio.event
     async def disconnect(sid):
         """Handle client disconnection"""
         print(f"Client disconnected: {sid}")
-        session = await sio.get_session(sid)
-        if session:
-            user_id = session.get('user_id')
-            # Remove from active sessions
-            for session_id, users in active_sessions.items():
-                if user_id in users:
-                    del users[user_id]
-                    # Notify others in the session
-                    await sio.emit('student_left', {'user_id': user_id}, room=session_id)
+        # Only the sessions this socket joined (reverse index, no scan)
+        user_id, left_sessions = await presence.disconnect(sid)
+        for session_id in left_sessions:
+            status_cache.drop_student(session_id, user_id)
+            live_stats.leave(session_id, user_id)
+            # Notify others in the session
+            await sio.emit('student_left', {
+                'user_id': user_id,
+                'session_id': session_id
+            }, room=session_id)
     
     @sio.event
     async def join_session(sid, data):
@@ -65,10 +78,14 @@ def register_socket_events(sio: socketio.AsyncServer):
         # Join Socket.IO room
         await sio.enter_room(sid, session_id)
         
-        # Track in active sessions
-        if session_id not in active_sessions:
-            active_sessions[session_id] = {}
-        active_sessions[session_id][user_id] = sid
+        # Track presence (replaces the user's older socket, e.g. after a reconnect)
+        previous_sid = await presence.join(session_id, user_id, sid, session.get('role'))
+        if previous_sid:
+            await sio.leave_room(previous_sid, session_id)
+        
+        # Teachers also get the coalesced attention snapshots
+        if session.get('role') == 'teacher':
+            await sio.enter_room(sid, teacher_room(session_id))
         
         # Notify others
         await sio.emit('student_joined', {
@@ -88,12 +105,14 @@ def register_socket_events(sio: socketio.AsyncServer):
         session_id = data.get('session_id')
         user_id = session.get('user_id')
         
-        # Leave Socket.IO room
+        # Leave Socket.IO rooms
         await sio.leave_room(sid, session_id)
+        if session.get('role') == 'teacher':
+            await sio.leave_room(sid, teacher_room(session_id))
         
-        # Remove from active sessions
-        if session_id in active_sessions and user_id in active_sessions[session_id]:
-            del active_sessions[session_id][user_id]
+        # Remove from presence
+        await presence.leave(session_id, user_id)
+        live_stats.leave(session_id, user_id)
         
         # Notify others
         await sio.emit('student_left', {
@@ -132,8 +151,8 @@ def register_socket_events(sio: socketio.AsyncServer):
         student_id = data.get('student_id')
         
         # Send to specific student
-        if session_id in active_sessions and student_id in active_sessions[session_id]:
-            target_sid = active_sessions[session_id][student_id]
+        target_sid = await presence.sid_for(session_id, student_id)
+        if target_sid:
             await sio.emit('student_muted', {'muted': True}, room=target_sid)
         
         return {'status': 'sent'}
@@ -149,8 +168,8 @@ def register_socket_events(sio: socketio.AsyncServer):
         student_id = data.get('student_id')
         
         # Send to specific student
-        if session_id in active_sessions and student_id in active_sessions[session_id]:
-            target_sid = active_sessions[session_id][student_id]
+        target_sid = await presence.sid_for(session_id, student_id)
+        if target_sid:
             await sio.emit('camera_off', {'camera_off': True}, room=target_sid)
         
         return {'status': 'sent'}
@@ -166,67 +185,91 @@ def register_socket_events(sio: socketio.AsyncServer):
         student_id = data.get('student_id')
         
         # Send to specific student
-        if session_id in active_sessions and student_id in active_sessions[session_id]:
-            target_sid = active_sessions[session_id][student_id]
+        target_sid = await presence.sid_for(session_id, student_id)
+        if target_sid:
             await sio.emit('student_kicked', {}, room=target_sid)
             await sio.disconnect(target_sid)
         
         return {'status': 'kicked'}
     
     @sio.event
-    async def ai_update(sid, data):
-        """Handle AI attention updates"""
-        from datetime import datetime
-        from .models import AttentionSample, StatusTimeline
-        
+    async def ai_register(sid, data):
+        """Bind a connection to one student so it can send binary ai_update frames"""
         session_id = data.get('session_id')
         student_id = data.get('student_id')
-        attention_score = data.get('attention_score')
-        status = data.get('status')
-        
-        # Store attention sample in database
-        db = SessionLocal()
-        try:
-            # Create attention sample
-            sample = AttentionSample(
-                session_id=session_id,
-                student_id=student_id,
-                attention_score=attention_score,
-                status=status
-            )
-            db.add(sample)
-            
-            # Check for status change
-            last_timeline = db.query(StatusTimeline).filter(
-                StatusTimeline.session_id == session_id,
-                StatusTimeline.student_id == student_id
-            ).order_by(StatusTimeline.timestamp.desc()).first()
-            
-            if not last_timeline or last_timeline.new_status != status:
-                # Status changed - create timeline entry
-                duration = None
-                if last_timeline:
-                    duration = int((datetime.utcnow() - last_timeline.timestamp).total_seconds())
-                
-                timeline_entry = StatusTimeline(
-                    session_id=session_id,
-                    student_id=student_id,
-                    previous_status=last_timeline.new_status if last_timeline else None,
-                    new_status=status,
-                    duration_in_previous=duration
-                )
-                db.add(timeline_entry)
+        if not session_id or not student_id:
+            return {'error': 'Invalid registration'}
+        
+        session = await sio.get_session(sid) or {}
+        session['ai_binding'] = (session_id, student_id, datetime.utcnow())
+        await sio.save_session(sid, session)
+        return {'status': 'registered'}
+    
+    @sio.event
+    async def ai_update(sid, data):
+        """Handle AI attention updates (JSON dict, or binary frame after ai_register)"""
+        now = datetime.utcnow()
+        
+        if isinstance(data, (bytes, bytearray)):
+            session = await sio.get_session(sid) or {}
+            binding = session.get('ai_binding')
+            if not binding:
+                return {'error': 'Not registered'}
+            session_id, student_id, registered_at = binding
+            try:
+                attention_score, status, delta_ms, samples, samples_status = decode_update(data)
+            except WireFormatError as e:
+                return {'error': str(e)}
+            # Client clock relative to registration, never ahead of ours
+            now = min(now, registered_at + timedelta(milliseconds=delta_ms))
+        else:
+            session_id = data.get('session_id')
+            student_id = data.get('student_id')
+            attention_score = data.get('attention_score')
+            status = data.get('status')
+            samples = data.get('samples') or ()
+            samples_status = data.get('samples_status')
+        
+        if not session_id or not student_id or attention_score is None or not status:
+            return {'error': 'Invalid update'}
+        
+        # Clients keep sending until they have torn down; their frames would only churn the stored report
+        if live_stats.is_ended(session_id):
+            return {'error': 'Session ended'}
+        
+        # Fill the last-status entry from the DB once per student, off the event loop
+        if not status_cache.is_loaded(session_id, student_id):
+            await asyncio.to_thread(status_cache.load, session_id, student_id)
+        
+        updates = []
+        
+        # Scores the client suppressed since its last message, as [age_ms, score]
+        samples_status = samples_status or status
+        for age_ms, score in samples:
+            updates.append((score, samples_status, now - timedelta(milliseconds=age_ms)))
+        updates.append((attention_score, status, now))
+        
+        for score, update_status, timestamp in updates:
+            # Queue for write-behind persistence (never blocks the event loop)
+            ingestor.enqueue(session_id, student_id, score, update_status, timestamp)
+            live_stats.update(session_id, student_id, score, update_status, timestamp)
             
-            db.commit()
-        finally:
-            db.close()
+            # Timeline rows are written only on real status transitions
+            change = status_cache.transition(session_id, student_id, update_status, timestamp)
+            if change:
+                previous_status, duration = change
+                ingestor.enqueue_transition(session_id, student_id, previous_status, update_status, duration, timestamp)
         
-        # Broadcast to session (teacher and student)
+        # Teachers get the latest result in the next attention_snapshot
+        broadcaster.update(session_id, student_id, attention_score, status)
+        
+        # The student gets only their own update
+        student_sid = await presence.sid_for(session_id, student_id) or sid
         await sio.emit('attention_update', {
             'student_id': student_id,
             'attention_score': attention_score,
             'status': status
-        }, room=session_id)
+        }, room=student_sid)
         
         return {'status': 'broadcasted'}
     
@@ -260,9 +303,14 @@ def register_socket_events(sio: socketio.AsyncServer):
         # Notify all participants
         await sio.emit('session_ended', {'session_id': session_id}, room=session_id)
         
-        # Clean up active sessions
-        if session_id in active_sessions:
-            del active_sessions[session_id]
+        # Clean up presence
+        await presence.drop_session(session_id)
+        status_cache.drop_session(session_id)
+        broadcaster.drop_session(session_id)
+        live_stats.drop_session(session_id)
+        
+        # Same job as the REST end_session; a session already queued is not queued twice
+        report_jobs.schedule(session_id)
         
         return {'status': 'ended'}
     
@@ -273,8 +321,8 @@ def register_socket_events(sio: socketio.AsyncServer):
         target_id = data.get('target_id')
         session_id = data.get('session_id')
         
-        if session_id in active_sessions and target_id in active_sessions[session_id]:
-            target_sid = active_sessions[session_id][target_id]
+        target_sid = await presence.sid_for(session_id, target_id)
+        if target_sid:
             await sio.emit('webrtc_offer', {
                 'from_id': data.get('from_id'),
                 'offer': data.get('offer')
@@ -286,8 +334,8 @@ def register_socket_events(sio: socketio.AsyncServer):
         target_id = data.get('target_id')
         session_id = data.get('session_id')
         
-        if session_id in active_sessions and target_id in active_sessions[session_id]:
-            target_sid = active_sessions[session_id][target_id]
+        target_sid = await presence.sid_for(session_id, target_id)
+        if target_sid:
             await sio.emit('webrtc_answer', {
                 'from_id': data.get('from_id'),
                 'answer': data.get('answer')
@@ -299,8 +347,8 @@ def register_socket_events(sio: socketio.AsyncServer):
         target_id = data.get('target_id')
         session_id = data.get('session_id')
         
-        if session_id in active_sessions and target_id in active_sessions[session_id]:
-            target_sid = active_sessions[session_id][target_id]
+        target_sid = await presence.sid_for(session_id, target_id)
+        if target_sid:
             await sio.emit('webrtc_ice_candidate', {
                 'from_id': data.get('from_id'),
                 'candidate': data.get('candidate')
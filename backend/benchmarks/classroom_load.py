@@ -0,0 +1,288 @@
+"""
+Load test: simulated classrooms against socket_app
+Registers and logs in a teacher per room and its students over HTTP,
+creates and joins the rooms, then keeps every student streaming
+ai_update at the given rate, firing tab_switch now and then and answering
+the teacher's WebRTC offers. The student count is raised step by step;
+after each step the harness measures for --duration seconds and prints
+event latency (ack round trip, p50/p99), DB commit rate and server
+CPU/RSS for that connection count.
+
+By default a local server is started (uvicorn app.main:socket_app, fresh
+SQLite file, BCRYPT_ROUNDS=4 so setup is not dominated by hashing). Use
+--url to target a running server; pass --server-pid as well to get its
+CPU/RSS (read from /proc, Linux only).
+
+The harness itself is one process: on a small machine give it its own
+cores (or run it elsewhere) so it does not compete with the server.
+
+Needs the asyncio Socket.IO client: pip install "python-socketio[asyncio_client]"
+
+Run from backend/: python -m benchmarks.classroom_load --students-per-room 30 --steps 60,300,900
+"""
+import argparse
+import asyncio
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+import aiohttp
+import socketio
+
+STATUSES = ('Engaged', 'Present', 'Looking Away', 'Drowsy')
+CLOCK_TICKS = os.sysconf('SC_CLK_TCK') if hasattr(os, 'sysconf') else 100
+
+def percentile(values: list, p: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))]
+
+class Metrics:
+    def __init__(self):
+        self.reset()
+    
+    def reset(self):
+        self.latencies = {}
+        self.errors = 0
+        self.started = time.perf_counter()
+    
+    def record(self, event: str, seconds: float):
+        self.latencies.setdefault(event, []).append(seconds * 1000)
+
+def process_usage(pid: int):
+    """(cpu seconds, rss bytes) of a process from /proc, or None"""
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            fields = f.read().rsplit(')', 1)[1].split()
+        with open(f"/proc/{pid}/statm") as f:
+            rss_pages = int(f.read().split()[1])
+    except (OSError, IndexError, ValueError):
+        return None
+    cpu = (int(fields[11]) + int(fields[12])) / CLOCK_TICKS
+    return cpu, rss_pages * os.sysconf('SC_PAGE_SIZE')
+
+class LocalServer:
+    def __init__(self, port: int):
+        self.port = port
+        self.url = f"http://127.0.0.1:{port}"
+        self.process = None
+    
+    async def start(self):
+        database = os.path.join(tempfile.mkdtemp(prefix="classroom-load-"), "load.db")
+        env = dict(os.environ, DATABASE_URL=f"sqlite:///{database}", BCRYPT_ROUNDS="4")
+        self.process = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "app.main:socket_app", "--port", str(self.port), "--log-level", "warning"],
+            env=env, stdout=subprocess.DEVNULL
+        )
+        async with aiohttp.ClientSession() as http:
+            for _ in range(100):
+                try:
+                    async with http.get(f"{self.url}/health") as response:
+                        if response.status == 200:
+                            return
+                except aiohttp.ClientError:
+                    pass
+                await asyncio.sleep(0.2)
+        raise RuntimeError("Server did not start")
+    
+    def stop(self):
+        if self.process:
+            self.process.terminate()
+            self.process.wait()
+
+async def create_user(http, url: str, role: str, semaphore) -> tuple:
+    """Register and log in a synthetic user; returns (user_id, token)"""
+    email = f"load-{role}-{uuid.uuid4().hex[:12]}@example.com"
+    async with semaphore:
+        async with http.post(f"{url}/auth/register", json={
+            'email': email, 'password': 'load-test-pw', 'role': role, 'name': f"Load {role}"
+        }) as response:
+            user = await response.json()
+        async with http.post(f"{url}/auth/login", json={'email': email, 'password': 'load-test-pw'}) as response:
+            token = (await response.json())['access_token']
+    return user['id'], token
+
+async def connect(url: str, token: str) -> socketio.AsyncClient:
+    client = socketio.AsyncClient(reconnection=False)
+    await client.connect(url, auth={'token': token}, transports=['websocket'])
+    return client
+
+class Teacher:
+    def __init__(self, metrics: Metrics):
+        self.metrics = metrics
+        self.snapshots = 0
+    
+    async def start(self, http, url: str, semaphore):
+        self.user_id, token = await create_user(http, url, 'teacher', semaphore)
+        async with http.post(f"{url}/room/create", headers={'Authorization': f"Bearer {token}"}) as response:
+            room = await response.json()
+        self.room_id, self.room_code = room['id'], room['room_code']
+        
+        self.sio = await connect(url, token)
+        self.sio.on('student_joined', self._offer)
+        self.sio.on('webrtc_answer', self._answered)
+        self.sio.on('attention_snapshot', self._snapshot)
+        await self.sio.call('join_session', {'session_id': self.room_id})
+    
+    async def _offer(self, data):
+        # Signaling round trip: offer relayed to the student, answer relayed back
+        await self.sio.emit('webrtc_offer', {
+            'session_id': self.room_id,
+            'target_id': data['user_id'],
+            'from_id': self.user_id,
+            'offer': {'type': 'offer', 'sdp': 'v=0 ' + 'x' * 1500, 'sent': time.perf_counter()}
+        })
+    
+    async def _answered(self, data):
+        self.metrics.record('webrtc', time.perf_counter() - data['answer']['sent'])
+    
+    async def _snapshot(self, data):
+        self.snapshots += 1
+
+class Student:
+    def __init__(self, metrics: Metrics, teacher: Teacher, fps: float, tab_switch_interval: float):
+        self.metrics = metrics
+        self.teacher = teacher
+        self.fps = fps
+        self.tab_switch_interval = tab_switch_interval
+        self.running = True
+    
+    async def start(self, http, url: str, semaphore):
+        self.user_id, token = await create_user(http, url, 'student', semaphore)
+        async with http.post(f"{url}/room/join", json={'room_code': self.teacher.room_code},
+                             headers={'Authorization': f"Bearer {token}"}) as response:
+            await response.json()
+        
+        self.sio = await connect(url, token)
+        self.sio.on('webrtc_offer', self._answer)
+        await self.sio.call('join_session', {'session_id': self.teacher.room_id})
+        self.task = asyncio.ensure_future(self._stream())
+    
+    async def _answer(self, data):
+        await self.sio.emit('webrtc_ice_candidate', {
+            'session_id': self.teacher.room_id, 'target_id': data['from_id'], 'from_id': self.user_id,
+            'candidate': {'candidate': 'candidate:1 1 udp 2122260223 10.0.0.1 50000 typ host'}
+        })
+        await self.sio.emit('webrtc_answer', {
+            'session_id': self.teacher.room_id, 'target_id': data['from_id'], 'from_id': self.user_id,
+            'answer': {'type': 'answer', 'sdp': 'v=0', 'sent': data['offer']['sent']}
+        })
+    
+    async def _call(self, event: str, data: dict):
+        started = time.perf_counter()
+        try:
+            await self.sio.call(event, data, timeout=10)
+            self.metrics.record(event, time.perf_counter() - started)
+        except Exception:
+            self.metrics.errors += 1
+    
+    async def _stream(self):
+        interval = 1 / self.fps
+        # Spread students over the frame interval
+        await asyncio.sleep(random.random() * interval)
+        next_tab_switch = time.perf_counter() + random.expovariate(1 / self.tab_switch_interval)
+        score = random.uniform(40, 95)
+        while self.running:
+            score = min(100.0, max(0.0, score + random.uniform(-5, 5)))
+            await self._call('ai_update', {
+                'session_id': self.teacher.room_id,
+                'student_id': self.user_id,
+                'attention_score': round(score, 1),
+                'status': STATUSES[int(score < 70) + int(score < 50) + int(score < 30)]
+            })
+            if time.perf_counter() >= next_tab_switch:
+                await self._call('tab_switch', {'session_id': self.teacher.room_id, 'was_blocked': False})
+                next_tab_switch = time.perf_counter() + random.expovariate(1 / self.tab_switch_interval)
+            await asyncio.sleep(interval)
+    
+    async def stop(self):
+        self.running = False
+        self.task.cancel()
+        await self.sio.disconnect()
+
+async def server_metrics(http, url: str) -> dict:
+    async with http.get(f"{url}/metrics") as response:
+        return await response.json()
+
+async def measure(args, http, url: str, pid, baseline_rss, metrics: Metrics, students: int, rooms: int):
+    """One measurement window at the current connection count"""
+    before = await server_metrics(http, url)
+    usage_before = process_usage(pid) if pid else None
+    metrics.reset()
+    await asyncio.sleep(args.duration)
+    elapsed = time.perf_counter() - metrics.started
+    after = await server_metrics(http, url)
+    usage_after = process_usage(pid) if pid else None
+    
+    def latency(event):
+        values = metrics.latencies.get(event, [])
+        return f"{percentile(values, 50):7.1f} {percentile(values, 99):7.1f}"
+    
+    ingestion_before, ingestion_after = before['ingestion'], after['ingestion']
+    commits = (ingestion_after['flushes'] - ingestion_before['flushes']) / elapsed
+    updates = len(metrics.latencies.get('ai_update', [])) / elapsed
+    if usage_before and usage_after:
+        cpu = (usage_after[0] - usage_before[0]) / elapsed * 100
+        rss = usage_after[1] / 1e6
+        # Growth over the idle server, per socket
+        per_connection = (usage_after[1] - baseline_rss) / (students + rooms) / 1024 if baseline_rss else 0.0
+        resources = f"{cpu:6.1f} {rss:8.1f} {per_connection:8.1f}"
+    else:
+        resources = f"{'-':>6} {'-':>8} {'-':>8}"
+    print(f"{students:8d} {rooms:5d} {updates:9.1f} {latency('ai_update')} {latency('tab_switch')} "
+          f"{latency('webrtc')} {commits:8.2f} {resources} {metrics.errors:6d}")
+
+async def main(args):
+    server = None
+    url, pid = args.url, args.server_pid
+    if not url:
+        server = LocalServer(args.port)
+        await server.start()
+        url, pid = server.url, server.process.pid
+    
+    idle = process_usage(pid) if pid else None
+    baseline_rss = idle[1] if idle else None
+    metrics = Metrics()
+    teachers, students = [], []
+    semaphore = asyncio.Semaphore(args.setup_concurrency)
+    print(f"Target {url}: {args.students_per_room} students/room, {args.fps} updates/s per student")
+    print(f"{'students':>8} {'rooms':>5} {'updates/s':>9} {'ai_update p50/p99 ms':>15} "
+          f"{'tab_switch p50/p99':>15} {'webrtc p50/p99':>15} {'commits/s':>8} "
+          f"{'cpu %':>6} {'rss MB':>8} {'KB/conn':>8} {'errors':>6}")
+    try:
+        async with aiohttp.ClientSession() as http:
+            for target in (int(step) for step in args.steps.split(',')):
+                while len(students) < target:
+                    if len(students) >= len(teachers) * args.students_per_room:
+                        teacher = Teacher(metrics)
+                        await teacher.start(http, url, semaphore)
+                        teachers.append(teacher)
+                    batch = min(target - len(students), len(teachers) * args.students_per_room - len(students))
+                    new = [Student(metrics, teachers[-1], args.fps, args.tab_switch_interval) for _ in range(batch)]
+                    await asyncio.gather(*(student.start(http, url, semaphore) for student in new))
+                    students.extend(new)
+                await measure(args, http, url, pid, baseline_rss, metrics, len(students), len(teachers))
+        for student in students:
+            await student.stop()
+        for teacher in teachers:
+            await teacher.sio.disconnect()
+    finally:
+        if server:
+            server.stop()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--url', help="Running server to test (default: start a local one)")
+    parser.add_argument('--server-pid', type=int, help="PID of --url's server, for CPU/RSS")
+    parser.add_argument('--port', type=int, default=8765, help="Port of the local server")
+    parser.add_argument('--steps', default="30,150,300", help="Comma-separated total student counts")
+    parser.add_argument('--students-per-room', type=int, default=30)
+    parser.add_argument('--fps', type=float, default=2.0, help="ai_update messages per student per second")
+    parser.add_argument('--tab-switch-interval', type=float, default=60.0, help="Mean seconds between tab_switch")
+    parser.add_argument('--duration', type=float, default=20.0, help="Seconds measured per step")
+    parser.add_argument('--setup-concurrency', type=int, default=50, help="Concurrent register/login requests")
+    asyncio.run(main(parser.parse_args()))
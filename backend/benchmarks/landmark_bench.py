@@ -0,0 +1,79 @@
+"""
+Micro-benchmark: per-frame landmark extraction and metric cost
+Compares the old list-of-protobuf + per-point np.array path with the
+preallocated (N, 3) array path used by FaceDetector/AttentionAnalyzer.
+
+Run from backend/: python -m benchmarks.landmark_bench
+"""
+import random
+import timeit
+import numpy as np
+
+from app.ai.attention_analyzer import AttentionAnalyzer
+from app.ai.landmarks import NUM_LANDMARKS, ANALYSIS_INDICES, TRACKING_INDICES, fill_landmark_array
+
+class Landmark:
+    """Stand-in for a mediapipe NormalizedLandmark"""
+    __slots__ = ('x', 'y', 'z')
+    
+    def __init__(self, x, y, z):
+        self.x, self.y, self.z = x, y, z
+
+def legacy_frame_cost(landmarks):
+    """The pre-vectorization detector dict + EAR + head pose"""
+    def pick(indices):
+        return [landmarks[i] for i in indices]
+    
+    data = {
+        'all_landmarks': landmarks,
+        'left_eye': pick([33, 160, 158, 133, 153, 144]),
+        'right_eye': pick([362, 385, 387, 263, 373, 380]),
+        'nose': pick([1, 4, 5, 6]),
+        'mouth': pick([61, 291, 0, 17])
+    }
+    
+    def eye_aspect_ratio(eye_points):
+        v1 = np.linalg.norm(np.array([eye_points[1].x, eye_points[1].y]) -
+                            np.array([eye_points[5].x, eye_points[5].y]))
+        v2 = np.linalg.norm(np.array([eye_points[2].x, eye_points[2].y]) -
+                            np.array([eye_points[4].x, eye_points[4].y]))
+        h = np.linalg.norm(np.array([eye_points[0].x, eye_points[0].y]) -
+                           np.array([eye_points[3].x, eye_points[3].y]))
+        return (v1 + v2) / (2.0 * h) if h > 0 else 0
+    
+    ear = (eye_aspect_ratio(data['left_eye']) + eye_aspect_ratio(data['right_eye'])) / 2.0
+    head_pose = abs(data['nose'][0].x - 0.5) * 180
+    return ear, head_pose
+
+def main(frames: int = 20000):
+    rng = random.Random(42)
+    landmarks = [Landmark(rng.random(), rng.random(), rng.random()) for _ in range(NUM_LANDMARKS)]
+    analyzer = AttentionAnalyzer()
+    points = np.zeros((NUM_LANDMARKS, 3), dtype=np.float32)
+    
+    fill_landmark_array(landmarks, points, ANALYSIS_INDICES)
+    legacy_ear, _ = legacy_frame_cost(landmarks)
+    assert abs(legacy_ear - analyzer._calculate_eye_aspect_ratio(points)) < 1e-4
+    
+    legacy_metrics = timeit.timeit(lambda: legacy_frame_cost(landmarks), number=frames)
+    vector_metrics = timeit.timeit(
+        lambda: (analyzer._calculate_eye_aspect_ratio(points), analyzer._estimate_head_pose(points)),
+        number=frames
+    )
+    conversion = timeit.timeit(lambda: fill_landmark_array(landmarks, points, ANALYSIS_INDICES), number=frames)
+    tracking_conversion = timeit.timeit(lambda: fill_landmark_array(landmarks, points, TRACKING_INDICES), number=frames)
+    full_conversion = timeit.timeit(lambda: fill_landmark_array(landmarks, points), number=frames // 10) * 10
+    
+    def per_frame(total):
+        return total / frames * 1e6
+    
+    print(f"Frames: {frames}")
+    print(f"Legacy dict + EAR + head pose:       {per_frame(legacy_metrics):8.2f} us/frame")
+    print(f"Array fill (analysis rows):          {per_frame(conversion):8.2f} us/frame")
+    print(f"Array fill (+ face box, track_roi):  {per_frame(tracking_conversion):8.2f} us/frame")
+    print(f"Vectorized EAR + head pose:          {per_frame(vector_metrics):8.2f} us/frame")
+    print(f"Array fill (all {NUM_LANDMARKS}, extract_all):   {per_frame(full_conversion):8.2f} us/frame")
+    print(f"Speedup (fill + metrics vs legacy):  {legacy_metrics / (conversion + vector_metrics):.1f}x")
+
+if __name__ == "__main__":
+    main()
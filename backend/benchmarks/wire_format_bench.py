@@ -0,0 +1,70 @@
+"""
+Micro-benchmark: JSON vs binary ai_update messages
+Measures payload and Socket.IO packet bytes, payload decode cost and the
+full server-side packet parse per update, for a plain heartbeat and for
+a message carrying suppressed scores.
+
+Run from backend/: python -m benchmarks.wire_format_bench
+"""
+import json
+import timeit
+import uuid
+from datetime import datetime
+from socketio import packet
+
+from app.ai.wire_format import encode_update, decode_update
+
+def json_message(samples):
+    message = {
+        'attention_score': 73.4,
+        'status': 'Engaged',
+        'student_id': str(uuid.uuid4()),
+        'session_id': str(uuid.uuid4()),
+        'timestamp': datetime.utcnow().isoformat()
+    }
+    if samples:
+        message['samples'] = samples
+        message['samples_status'] = 'Engaged'
+    return message
+
+def wire_size(encoded) -> int:
+    """Bytes on the wire for an encoded Socket.IO packet (text + binary attachments)"""
+    if isinstance(encoded, list):
+        return len(encoded[0].encode()) + sum(len(part) for part in encoded[1:])
+    return len(encoded.encode())
+
+def parse_json(encoded: str):
+    data = packet.Packet(encoded_packet=encoded).data[1]
+    return data['attention_score'], data['status'], data.get('samples') or ()
+
+def parse_binary(encoded: list):
+    pkt = packet.Packet(encoded_packet=encoded[0])
+    for attachment in encoded[1:]:
+        pkt.add_attachment(attachment)
+    return decode_update(pkt.data[1])
+
+def main(updates: int = 20000):
+    print(f"Updates: {updates}")
+    for label, samples in (('heartbeat', []), ('9 suppressed scores', [[i * 100, 70.0 + i] for i in range(9, 0, -1)])):
+        as_json = packet.Packet(packet.EVENT, data=['ai_update', json_message(samples)]).encode()
+        as_binary = packet.Packet(packet.EVENT, data=[
+            'ai_update', encode_update(73.4, 'Engaged', 123456, samples, 'Engaged')
+        ]).encode()
+        
+        assert parse_binary(as_binary)[0] == parse_json(as_json)[0]
+        json_parse = timeit.timeit(lambda: parse_json(as_json), number=updates)
+        binary_parse = timeit.timeit(lambda: parse_binary(as_binary), number=updates)
+        json_payload = json.dumps(json_message(samples))
+        binary_payload = encode_update(73.4, 'Engaged', 123456, samples, 'Engaged')
+        json_decode = timeit.timeit(lambda: json.loads(json_payload), number=updates)
+        binary_decode = timeit.timeit(lambda: decode_update(binary_payload), number=updates)
+        
+        print(f"\n[{label}]")
+        print(f"JSON   payload {len(json_payload):5d} B  packet {wire_size(as_json):5d} B  "
+              f"decode {json_decode / updates * 1e6:6.2f} us  packet parse {json_parse / updates * 1e6:6.2f} us")
+        print(f"Binary payload {len(binary_payload):5d} B  packet {wire_size(as_binary):5d} B  "
+              f"decode {binary_decode / updates * 1e6:6.2f} us  packet parse {binary_parse / updates * 1e6:6.2f} us")
+        print(f"Packet bytes saved: {1 - wire_size(as_binary) / wire_size(as_json):.0%}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+"""
+Test setup: a fresh SQLite database per test run, created before the app is imported
+"""
+import os
+import sys
+import tempfile
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+_database = os.path.join(tempfile.mkdtemp(prefix="focusmate-tests-"), "test.db")
+os.environ["DATABASE_URL"] = f"sqlite:///{_database}"
+os.environ.pop("REDIS_URL", None)
+
+import pytest
+from sqlalchemy import event
+from app.database import SessionLocal, engine, init_db
+from app.models import User, Room
+
+# Enforce foreign keys like PostgreSQL does
+@event.listens_for(engine, "connect")
+def _foreign_keys(connection, record):
+    connection.execute("PRAGMA foreign_keys = ON")
+
+init_db()
+
+@pytest.fixture
+def db():
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+
+@pytest.fixture
+def make_user(db):
+    def make(role: str = 'student', name: str = 'Test User'):
+        user = User(email=f"{os.urandom(6).hex()}@example.com", password_hash='x', role=role, name=name)
+        db.add(user)
+        db.commit()
+        return user
+    return make
+
+@pytest.fixture
+def make_room(db, make_user):
+    def make(teacher=None, **values):
+        room = Room(room_code=os.urandom(4).hex(), teacher_id=(teacher or make_user('teacher')).id, **values)
+        db.add(room)
+        db.commit()
+        return room
+    return make
@@ -0,0 +1,40 @@
+from datetime import datetime, timedelta
+from app.ingestion import AttentionIngestor
+from app.models import AttentionSample, StatusTimeline
+from app.rollups import RollupAggregator
+
+def test_forced_flush_closes_only_the_ended_session(make_room, make_user):
+    ended, live = make_room(), make_room()
+    student = make_user()
+    ingestor = AttentionIngestor(rollups=RollupAggregator(1, [10, 60], grace_seconds=3600))
+    
+    now = datetime.utcnow()
+    for second in range(5):
+        ingestor.enqueue(ended.id, student.id, 50.0, 'Engaged', now + timedelta(seconds=second))
+    # The live session is last in the batch
+    ingestor.enqueue(live.id, student.id, 80.0, 'Engaged', now)
+    
+    ingestor.flush(force=True, session_id=ended.id)
+    
+    assert ingestor.rollups.open_buckets(ended.id) == 0
+    assert ingestor.rollups.open_buckets(live.id) == 3
+
+def test_unknown_ids_only_drop_their_own_rows(db, make_room, make_user):
+    room = make_room()
+    students = [make_user() for _ in range(3)]
+    ingestor = AttentionIngestor(rollups=RollupAggregator(0, []))
+    
+    now = datetime.utcnow()
+    for student in students:
+        ingestor.enqueue(room.id, student.id, 70.0, 'Engaged', now)
+        ingestor.enqueue_transition(room.id, student.id, None, 'Engaged', None, now)
+    ingestor.enqueue('no-such-session', students[0].id, 10.0, 'Drowsy', now)
+    ingestor.enqueue(room.id, 'no-such-student', 10.0, 'Drowsy', now)
+    ingestor.flush(force=True)
+    
+    assert ingestor.persisted == 3
+    assert ingestor.dropped == 2
+    assert db.query(AttentionSample).filter(AttentionSample.session_id == room.id).count() == 3
+    assert db.query(StatusTimeline).filter(StatusTimeline.session_id == room.id).count() == 3
+    # Later updates for refused ids never reach the database
+    assert not ingestor.enqueue(room.id, 'no-such-student', 10.0, 'Drowsy', now)
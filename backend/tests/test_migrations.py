@@ -0,0 +1,35 @@
+import os
+import tempfile
+import threading
+from sqlalchemy import create_engine, text
+from app.database import Base, engine
+from app.migrations import MIGRATIONS, check_indexes, run_migrations
+
+def test_hot_queries_use_their_indexes():
+    assert check_indexes(engine)
+
+def test_workers_starting_together_apply_each_migration_once():
+    path = os.path.join(tempfile.mkdtemp(prefix="focusmate-migrations-"), "workers.db")
+    fresh = create_engine(f"sqlite:///{path}", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(bind=fresh)
+    
+    start = threading.Barrier(4)
+    applied, errors = [], []
+    
+    def worker():
+        start.wait()
+        try:
+            applied.extend(run_migrations(fresh))
+        except Exception as e:
+            errors.append(e)
+    
+    threads = [threading.Thread(target=worker) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    
+    assert errors == []
+    assert sorted(applied) == [version for version, _, _ in MIGRATIONS]
+    with fresh.connect() as conn:
+        assert conn.execute(text("SELECT count(*) FROM schema_migrations")).scalar() == len(MIGRATIONS)
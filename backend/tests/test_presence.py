@@ -0,0 +1,45 @@
+import asyncio
+import fakeredis
+from app.presence import RedisPresenceStore
+
+def _store(server, worker_id: str) -> RedisPresenceStore:
+    client = fakeredis.aioredis.FakeRedis(server=server, decode_responses=True)
+    return RedisPresenceStore(client, 'test:presence', ttl=30.0, worker_id=worker_id)
+
+def test_join_replace_and_disconnect():
+    async def run():
+        store = _store(fakeredis.FakeServer(), 'a')
+        assert await store.join('room', 'student', 'sid-1', 'student') is None
+        await store.join('room', 'teacher', 'sid-2', 'teacher')
+        # Reconnect from a new socket replaces the old one
+        assert await store.join('room', 'student', 'sid-3', 'student') == 'sid-1'
+        assert await store.users('room') == {'student': 'sid-3', 'teacher': 'sid-2'}
+        assert await store.count('room', 'teacher') == 1
+        
+        # The replaced socket's disconnect leaves the user present
+        assert await store.disconnect('sid-1') == (None, [])
+        assert await store.disconnect('sid-3') == ('student', ['room'])
+        assert await store.room_counts() == {'room': 1}
+    
+    asyncio.run(run())
+
+def test_dead_worker_sockets_are_reaped():
+    async def run():
+        server = fakeredis.FakeServer()
+        crashed, alive = _store(server, 'crashed'), _store(server, 'alive')
+        await crashed.heartbeat()
+        await alive.heartbeat()
+        await crashed.join('room', 'student', 'sid-1', 'student')
+        await alive.join('room', 'teacher', 'sid-2', 'teacher')
+        
+        # Still heartbeating: nothing is removed
+        assert await alive.heartbeat() == []
+        
+        # The crashed worker's marker expires without a disconnect for its sockets
+        await crashed.client.delete('test:presence:worker:crashed')
+        assert await alive.heartbeat() == [('student', 'room')]
+        assert await alive.sid_for('room', 'student') is None
+        assert await alive.room_counts() == {'room': 1}
+        assert await alive.client.smembers('test:presence:workers') == {'alive'}
+    
+    asyncio.run(run())
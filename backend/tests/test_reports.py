@@ -0,0 +1,173 @@
+import asyncio
+import json
+import time
+from datetime import datetime, timedelta
+from fastapi import HTTPException
+from starlette.requests import Request
+from app.class_reports import build_session_report, generate_class_report, report_jobs, stored_report
+from app.database import AsyncSessionLocal
+from app.ingestion import AttentionIngestor, ingestor
+from app.models import ClassReport, RoomParticipant
+from app.response_cache import report_cache
+from app.rollups import ROLLUP_RESOLUTIONS, RollupAggregator
+from app.routers.reports import (
+    get_session_curve, get_session_report, get_student_session_report, get_teacher_sessions
+)
+
+def _request() -> Request:
+    return Request({'type': 'http', 'method': 'GET', 'headers': []})
+
+def _page(teacher, limit: int, cursor=None) -> dict:
+    async def call():
+        async with AsyncSessionLocal() as db:
+            response = await get_teacher_sessions(
+                teacher.id, _request(), limit=limit, cursor=cursor, current_user=teacher, db=db
+            )
+            return json.loads(response.body)
+    return asyncio.run(call())
+
+def test_session_list_pages_cover_every_session_once(db, make_user, make_room):
+    teacher = make_user('teacher')
+    now = datetime.utcnow().replace(microsecond=0)
+    rooms = [make_room(teacher) for _ in range(3)]
+    # Two sessions share a start time, so the id tie-breaker is exercised
+    starts = [now - timedelta(minutes=2), now - timedelta(minutes=1), now - timedelta(minutes=1)]
+    rooms += [make_room(teacher, start_time=start) for start in starts]
+    for room in rooms:
+        room.end_time = datetime.utcnow()
+    rooms[0].end_time = None
+    db.commit()
+    
+    seen, cursor = [], None
+    for _ in range(len(rooms)):
+        page = _page(teacher, 2, cursor)
+        seen += [session['id'] for session in page['sessions']]
+        cursor = page['next_cursor']
+        if not cursor:
+            break
+    
+    assert sorted(seen) == sorted(room.id for room in rooms[1:])
+    assert len(seen) == len(set(seen))
+
+def test_report_jobs_coalesce_and_keep_one_report(db, make_room):
+    room = make_room(end_time=datetime.utcnow())
+    
+    first = report_jobs.schedule(room.id)
+    # The end-of-session REST call and socket event both schedule the job
+    assert report_jobs.schedule(room.id) is first
+    first.result(timeout=10)
+    generate_class_report(room.id)
+    
+    assert db.query(ClassReport).filter(ClassReport.session_id == room.id).count() == 1
+
+def _wait_for_report_jobs():
+    for _ in range(200):
+        jobs = report_jobs.stats()
+        if not jobs['deferred'] and not jobs['pending'] and not jobs['running']:
+            return
+        time.sleep(0.05)
+
+def test_late_data_regenerates_an_ended_sessions_report_once(db, make_room, make_user, monkeypatch):
+    monkeypatch.setattr(report_jobs, 'refresh_delay', 0.5)
+    room = make_room(end_time=datetime.utcnow())
+    student = make_user()
+    report_jobs.schedule(room.id).result(timeout=10)
+    completed = report_jobs.stats()['completed']
+    
+    # Late frames keep trickling in over several flushes
+    earlier = datetime.utcnow() - timedelta(minutes=10)
+    for flush in range(3):
+        for second in range(20):
+            ingestor.enqueue(room.id, student.id, 40.0, 'Engaged', earlier + timedelta(seconds=flush * 20 + second))
+        ingestor.flush()
+    
+    # The flushes deferred one refresh; wait for it to run
+    _wait_for_report_jobs()
+    assert report_jobs.stats()['completed'] == completed + 1
+    db.expire_all()
+    report = stored_report(db, room.id)
+    assert [entry['student_id'] for entry in report['students']] == [student.id]
+    assert report['average_attention'] == 40.0
+
+def test_live_report_includes_students_without_a_closed_rollup(db, make_room, make_user):
+    room = make_room()
+    early, late = make_user(name='A'), make_user(name='B')
+    live_ingestor = AttentionIngestor(rollups=RollupAggregator(1, ROLLUP_RESOLUTIONS))
+    
+    # Ends just past the sample buckets' grace, so only coarser buckets are still open
+    now = datetime.utcnow() - timedelta(seconds=5)
+    for second in range(150):
+        live_ingestor.enqueue(room.id, early.id, 80.0, 'Engaged', now - timedelta(seconds=150 - second))
+    # Joined 40 s ago: no coarse bucket of theirs has closed yet
+    for second in range(40):
+        live_ingestor.enqueue(room.id, late.id, 40.0, 'Drowsy', now - timedelta(seconds=40 - second))
+    live_ingestor.flush()
+    
+    report = build_session_report(db, room)
+    assert [(entry['name'], entry['final_attention_score']) for entry in report['students']] == [
+        ('A', 80.0), ('B', 40.0)
+    ]
+    assert report['average_attention'] == round((150 * 80.0 + 40 * 40.0) / 190, 1)
+
+def test_live_report_endpoints_include_a_late_joiner(db, make_room, make_user):
+    teacher = make_user('teacher')
+    room = make_room(teacher)
+    early, late = make_user(name='A'), make_user(name='B')
+    # Every update is a sample row, so only the rollup tiers have open buckets
+    live_ingestor = AttentionIngestor(rollups=RollupAggregator(0, ROLLUP_RESOLUTIONS))
+    
+    now = datetime.utcnow()
+    for second in range(120):
+        live_ingestor.enqueue(room.id, early.id, 90.0, 'Engaged', now - timedelta(seconds=120 - second))
+    # All within the current minute: none of the late joiner's coarse buckets has closed
+    minute = now.replace(second=0, microsecond=0)
+    for step in range(20):
+        live_ingestor.enqueue(room.id, late.id, 30.0, 'Drowsy', minute + (now - minute) * step / 20)
+    live_ingestor.flush()
+    
+    async def call():
+        async with AsyncSessionLocal() as async_db:
+            report = await get_session_report(room.id, _request(), current_user=teacher, db=async_db)
+            mine = await get_student_session_report(late.id, room.id, _request(), current_user=late, db=async_db)
+            return report, mine
+    report, mine = asyncio.run(call())
+    
+    scores = {entry['student_id']: entry['final_attention_score'] for entry in report['students']}
+    assert scores == {early.id: 90.0, late.id: 30.0}
+    assert mine['final_attention_score'] == 30.0
+
+def test_only_the_teacher_can_recompute_a_report(make_room, make_user):
+    teacher = make_user('teacher')
+    room = make_room(teacher, end_time=datetime.utcnow())
+    student = make_user()
+    
+    async def recompute(user):
+        async with AsyncSessionLocal() as async_db:
+            try:
+                response = await get_session_report(room.id, _request(), recompute=True, current_user=user, db=async_db)
+            except HTTPException as e:
+                return e.status_code
+            return response.status_code
+    
+    assert asyncio.run(recompute(student)) == 403
+    assert asyncio.run(recompute(teacher)) == 200
+
+def test_curve_is_limited_to_the_class_and_cached_once_ended(db, make_room, make_user):
+    room = make_room(end_time=datetime.utcnow())
+    student, outsider = make_user(), make_user()
+    db.add(RoomParticipant(room_id=room.id, student_id=student.id))
+    db.commit()
+    
+    async def curve(user):
+        async with AsyncSessionLocal() as async_db:
+            try:
+                return await get_session_curve(room.id, _request(), current_user=user, db=async_db)
+            except HTTPException as e:
+                return e.status_code
+    
+    assert asyncio.run(curve(outsider)) == 403
+    hits = report_cache.hits
+    first, second = asyncio.run(curve(student)), asyncio.run(curve(student))
+    assert first.status_code == 200
+    assert second.headers['etag'] == first.headers['etag']
+    assert report_cache.hits == hits + 1
@@ -0,0 +1,27 @@
+from datetime import datetime, timedelta
+from app.ingestion import AttentionIngestor
+from app.rollups import RollupAggregator
+from app.status_cache import StatusCache
+
+def test_reconnect_before_flush_keeps_the_queued_status(make_room, make_user):
+    room, student = make_room(), make_user()
+    ingestor = AttentionIngestor(rollups=RollupAggregator(0, []))
+    cache = StatusCache(ingestor)
+    
+    def update(status, timestamp):
+        change = cache.transition(room.id, student.id, status, timestamp)
+        if change:
+            ingestor.enqueue_transition(room.id, student.id, change[0], status, change[1], timestamp)
+    
+    now = datetime.utcnow()
+    cache.load(room.id, student.id)
+    update('Engaged', now)
+    update('Drowsy', now + timedelta(seconds=10))
+    
+    # Disconnect and reconnect while both transitions are still queued
+    cache.drop_student(room.id, student.id)
+    cache.load(room.id, student.id)
+    assert cache.transition(room.id, student.id, 'Engaged', now + timedelta(seconds=15)) == ('Drowsy', 5)
+    
+    ingestor.flush()
+    assert ingestor.pending_status(room.id, student.id) is None
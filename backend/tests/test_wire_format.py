@@ -0,0 +1,15 @@
+import pytest
+from app.ai.wire_format import WireFormatError, decode_update, encode_update
+
+def test_round_trip():
+    frame = encode_update(72.34, 'Engaged', 1500, [[200, 70.0], [100, 71.5]], 'Present')
+    assert decode_update(frame) == (72.3, 'Engaged', 1500, [(200, 70.0), (100, 71.5)], 'Present')
+
+@pytest.mark.parametrize('frame', [
+    encode_update(50.0, 'Drowsy', 10) + b'\x00',
+    encode_update(50.0, 'Drowsy', 10, [[5, 40.0]]) + b'\x00',
+    encode_update(50.0, 'Drowsy', 10, [[5, 40.0]])[:-1],
+])
+def test_frames_of_the_wrong_length_are_refused(frame):
+    with pytest.raises(WireFormatError):
+        decode_update(frame)
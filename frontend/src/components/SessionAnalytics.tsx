@@ -1,13 +1,17 @@
 interface Props {
   students: any[];
+  liveStats?: any;
 }
 
-export default function SessionAnalytics({ students }: Props) {
-  const avgAttention = students.length > 0
-    ? students.reduce((sum, s) => sum + (s.attentionScore || 0), 0) / students.length
-    : 0;
+export default function SessionAnalytics({ students, liveStats }: Props) {
+  // Server-side room aggregates (live_stats event) when available
+  const avgAttention = liveStats?.current_average != null
+    ? liveStats.current_average
+    : students.length > 0
+      ? students.reduce((sum, s) => sum + (s.attentionScore || 0), 0) / students.length
+      : 0;
 
-  const statusCounts = students.reduce((acc, s) => {
+  const statusCounts: Record<string, number> = liveStats?.status_counts || students.reduce((acc, s) => {
     const status = s.status || 'Unknown';
     acc[status] = (acc[status] || 0) + 1;
     return acc;
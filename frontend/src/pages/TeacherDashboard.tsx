@@ -14,7 +14,8 @@ export default function TeacherDashboard() {
   const [localStream, setLocalStream] = useState<MediaStream | null>(null);
   const [students, setStudents] = useState<any[]>([]);
   const [activities, setActivities] = useState<any[]>([]);
-  const [studentFrames, setStudentFrames] = useState<Record<string, string>>({});
+  const [studentFrames] = useState<Record<string, string>>({});
+  const [liveStats, setLiveStats] = useState<any>(null);
 
   useEffect(() => {
     if (token && session) {
@@ -43,21 +44,19 @@ export default function TeacherDashboard() {
         loadStudents();
       });
 
-      socket.on('attention_update', (data: any) => {
-        console.log('Attention update received:', data);
-        setStudents(prev => prev.map(s => 
-          s.id === data.student_id 
-            ? { ...s, attentionScore: data.attention_score, status: data.status }
+      // Latest score/status of every student that changed since the previous snapshot
+      socket.on('attention_snapshot', (data: any) => {
+        const updates = data.students || {};
+        setStudents(prev => prev.map(s =>
+          updates[s.id]
+            ? { ...s, attentionScore: updates[s.id].attention_score, status: updates[s.id].status }
             : s
         ));
-        
-        // Update video frame if provided
-        if (data.video_frame) {
-          setStudentFrames(prev => ({
-            ...prev,
-            [data.student_id]: data.video_frame
-          }));
-        }
+      });
+
+      // Room aggregates (class average, status counts), every few seconds
+      socket.on('live_stats', (data: any) => {
+        setLiveStats(data);
       });
 
       socket.on('tab_switch_event', (data: any) => {
@@ -143,6 +142,7 @@ export default function TeacherDashboard() {
       setSession(null);
       setLocalStream(null);
       setStudents([]);
+      setLiveStats(null);
     } catch (error) {
       console.error('Error ending session:', error);
     }
@@ -289,7 +289,7 @@ export default function TeacherDashboard() {
           <StudentGrid students={students} sessionId={session.id} studentFrames={studentFrames} />
 
           {/* Analytics */}
-          <SessionAnalytics students={students} />
+          <SessionAnalytics students={students} liveStats={liveStats} />
         </div>
 
         {/* Sidebar */}
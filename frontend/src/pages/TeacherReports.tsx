@@ -9,19 +9,25 @@ export default function TeacherReports() {
   const [sessions, setSessions] = useState<any[]>([]);
   const [selectedSession, setSelectedSession] = useState<any>(null);
   const [loading, setLoading] = useState(true);
+  const [nextCursor, setNextCursor] = useState<string | null>(null);
 
   useEffect(() => {
     loadSessions();
   }, []);
 
-  const loadSessions = async () => {
+  const loadSessions = async (cursor?: string) => {
     try {
       const API_URL = import.meta.env.VITE_API_URL || 'http://localhost:8000';
       const response = await axios.get(
         `${API_URL}/reports/teacher/${user?.id}/sessions`,
-        { headers: { Authorization: `Bearer ${token}` } }
+        {
+          headers: { Authorization: `Bearer ${token}` },
+          params: cursor ? { cursor } : {}
+        }
       );
-      setSessions(response.data.sessions);
+      // Pages are keyed on the last session seen, so appending never duplicates
+      setSessions(prev => cursor ? [...prev, ...response.data.sessions] : response.data.sessions);
+      setNextCursor(response.data.next_cursor);
     } catch (error) {
       console.error('Error loading sessions:', error);
     } finally {
@@ -208,6 +214,17 @@ export default function TeacherReports() {
           ))}
         </div>
       )}
+
+      {nextCursor && (
+        <div className="mt-8 text-center">
+          <button
+            onClick={() => loadSessions(nextCursor)}
+            className="px-6 py-3 glass text-white rounded-lg hover:bg-gray-700"
+          >
+            Load More
+          </button>
+        </div>
+      )}
     </div>
   );
 }